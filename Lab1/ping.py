@@ -4,229 +4,621 @@ import time
 import os
 import argparse
 import threading
-from colorama import Fore, Style, init
+import itertools
+import asyncio
+import json
 import random
+import multiprocessing
+import multiprocessing.connection
 
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
 import queue
 import logging
-
-# 初始化 colorama
-init(autoreset=True)
-
-# 设置日志
-logging.basicConfig(filename='ping_results.log', level=logging.INFO,
-                    format='%(asctime)s - %(message)s')
+import logging.handlers
+import atexit
+import sys
+
+# 实验脚本从各自目录直接运行，把仓库根目录加入搜索路径以使用公共模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.scheduler import ProbeScheduler
+from common.icmp import EchoRequestTemplate
+from common.stats import RttStats
+from common.bpf import attach_filter, echo_reply_filter
+from common.buffers import BufferPool
+from common.timestamps import enable_rx_timestamps, recv_into_timestamped
+from common.resolver import resolver
+from common.transport import RawSocketTransport
+
+# 日志：测量线程只把记录放入队列，由 LogWriter 后台线程批量写入文件和终端
+results_logger = logging.getLogger('ping.results')  # 每次成功探测的 RTT，写入 ping_results.log
+console_logger = logging.getLogger('ping.console')  # 给人看的终端信息
+jsonl_logger = logging.getLogger('ping.jsonl')  # 无界面模式下的 JSON Lines 记录
+store_logger = logging.getLogger('ping.store')  # --store 的探测结果，由 LogWriter 追加到时间序列库
+log_writer = None
 
 # 并发控制
 # MAX_THREADS = 1 # 同时允许的最大线程数
 stop_flag = False  # 全局停止标志
 
-# 为每个地址保存 RTT 数据
+# 为每个地址保存 RTT 统计（RttStats），内存占用固定，不随运行时间增长
 rtt_data = {}
 
-# 计算校验和的函数，用于ICMP数据包完整性验证
-def calculate_checksum(source_string):
-    """
-    计算ICMP数据包的校验和，用于确保数据传输的完整性。
+# 每个地址保留用于实时绘图的最近样本数
+PLOT_WINDOW = 300
+
+# 创建套接字的传输：默认是真实的原始套接字，也可以用 set_transport() 换成模拟网络
+transport = RawSocketTransport()
+
+# 全局发送调度器：给出时所有探测都按它分配的时刻发送，限制总速率和每个目标的速率
+scheduler = None
+
+# RTT 历史存储：给出 --store 时每次探测的结果都追加到这个二进制时间序列库中
+store = None
+
+# 接收缓冲区的最小大小：默认数据长度下，回显应答（最长 60 字节的IP首部、ICMP首部、时间戳和数据）远小于 2 KB
+RECV_BUFFER_SIZE = 2048
 
-    :param source_string: 需要计算校验和的二进制字符串
-    :return: 计算出来的校验和值
+# 终端输出的详细程度：0 只输出统计结果，1 还输出每次探测的结果，2 还输出每个数据包的调试信息
+VERBOSITY_QUIET, VERBOSITY_NORMAL, VERBOSITY_DEBUG = 0, 1, 2
+verbosity = VERBOSITY_NORMAL
+
+# 无界面模式：不导入 matplotlib 和 colorama，终端不输出逐包信息
+headless = False
+
+# 为 True 时为每次探测和每个统计结果写一行 JSON（见 start_logging 的 jsonl_stream）
+json_output = False
+
+# 各线程的输出颜色，默认不着色；交互模式下由 init_colors() 加载 colorama 后填充
+thread_colors = ['']
+color_reset = ''
+
+
+def init_colors():
+    """
+    加载 colorama 并启用彩色输出。只在交互模式下调用，无界面模式不导入 colorama。
     """
-    sum = 0
-    count_to = (len(source_string) // 2) * 2
-    count = 0
+    global color_reset
+    from colorama import Fore, Style, init
 
-    # 以两个字节为单位计算和
-    while count < count_to:
-        this_val = source_string[count + 1] * 256 + source_string[count]
-        # this_val = (source_string[count] << 8) + source_string[count + 1]  #checksum 会出现问题
-        sum += this_val
-        sum &= 0xffffffff  # 保证和在32位内
-        count += 2
+    # 初始化 colorama
+    init(autoreset=True)
+    thread_colors[:] = [Fore.RED, Fore.GREEN, Fore.YELLOW, Fore.CYAN, Fore.MAGENTA]
+    color_reset = Style.RESET_ALL
 
-    # 如果数据是奇数长度，则补上最后一个字节
-    if count_to < len(source_string):
-        sum += source_string[len(source_string) - 1]
-        sum &= 0xffffffff
 
-    # 将高位与低位相加
-    sum = (sum >> 16) + (sum & 0xffff)
-    sum += (sum >> 16)
+# 后台批量写日志的线程
+class LogWriter:
+    """
+    从队列中取出日志记录，按记录器名称分发到对应的输出流。每次唤醒都把队列中
+    已有的记录一次取完，同一个流的记录拼接后只调用一次 write 和 flush，
+    因此磁盘和终端的 I/O 不会占用测量线程的时间。
+    """
 
-    # 取反并返回校验和
-    answer = ~sum
-    answer = answer & 0xffff
+    def __init__(self, log_queue, streams, batch_size=512, store=None):
+        """
+        :param log_queue: QueueHandler 写入的队列
+        :param streams: 记录器名称 -> (文本流, logging.Formatter)
+        :param batch_size: 一次最多写出的记录数
+        :param store: TimeSeriesStore，store_logger 的记录追加到这里
+        """
+        self.queue = log_queue
+        self.streams = streams
+        self.batch_size = batch_size
+        self.store = store
+        self._thread = threading.Thread(target=self._run, name='LogWriter', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """
+        写完队列中剩余的记录后结束线程。
+        """
+        self.queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not self._write(batch):
+                return
+
+    def _write(self, batch):
+        lines = {}
+        running = True
+        for record in batch:
+            if record is None:
+                running = False
+                continue
+            if record.name == store_logger.name:
+                self.store.append(*record.payload)
+                continue
+            formatter = self.streams[record.name][1]
+            lines.setdefault(record.name, []).append(formatter.format(record))
+
+        for name, formatted in lines.items():
+            stream = self.streams[name][0]
+            try:
+                stream.write('\n'.join(formatted) + '\n')
+                stream.flush()
+            except (OSError, ValueError):
+                pass  # 输出已关闭（例如管道另一端退出），丢弃这一批
+        return running
+
+
+# JSON Lines 记录在后台线程中才序列化
+class JsonlFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.payload, ensure_ascii=False)
+
+
+def start_logging(log_file='ping_results.log', jsonl_stream=None, batch_size=512):
+    """
+    启动队列式日志管道。之后 RTT 日志、终端输出、JSON Lines 和 --store 的时间序列库
+    都只在调用线程中入队，由 LogWriter 后台线程批量写出；程序退出时自动写完剩余记录。
 
-    answer = answer >> 8 | (answer << 8 & 0xff00)
-    return answer
+    :param log_file: RTT 日志文件
+    :param jsonl_stream: 给出时把 JSON Lines 写入这个文本流
+    :param batch_size: 一次最多写出的记录数
+    """
+    global log_writer, json_output
+    if log_writer is not None:
+        return
+
+    streams = {
+        results_logger.name: (open(log_file, 'a', encoding='utf-8'),
+                              logging.Formatter('%(asctime)s - %(message)s')),
+        # 一批记录只写一次，colorama 的 autoreset 不再对每行生效，所以每行末尾自行复位颜色
+        console_logger.name: (sys.stdout, logging.Formatter('%(message)s' + color_reset)),
+    }
+    if jsonl_stream is not None:
+        streams[jsonl_logger.name] = (jsonl_stream, JsonlFormatter())
+        json_output = True
+
+    log_queue = queue.SimpleQueue()
+    names = list(streams)
+    if store is not None:
+        names.append(store_logger.name)
+    for name in names:
+        logger = logging.getLogger(name)
+        logger.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    log_writer = LogWriter(log_queue, streams, batch_size, store)
+    log_writer.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """
+    写完队列中剩余的日志并关闭日志文件。
+    """
+    global log_writer
+    if log_writer is None:
+        return
+    writer, log_writer = log_writer, None
+    writer.stop()
+    writer.streams[results_logger.name][0].close()
 
 
-# 创建ICMP Echo Request数据包
-def create_icmp_packet(packet_id, user_data):
+# 输出给人看的终端信息
+def console(message, level=VERBOSITY_NORMAL):
+    """
+    :param message: 要输出的一行或多行文字
+    :param level: 所需的详细程度，高于 verbosity 时不输出
+    """
+    # 无界面模式下不输出，避免与 JSON Lines 混在一起
+    if headless or level > verbosity:
+        return
+    if log_writer is not None:
+        console_logger.info(message)
+    else:
+        print(message)
+
+
+# 在启用 JSON 输出时写出一条记录
+def emit(record_type, dest_addr, **fields):
+    if json_output:
+        # 只在这里组装字典，序列化留给后台线程
+        jsonl_logger.info('', extra={'payload': {'type': record_type, 'time': time.time(),
+                                                 'host': dest_addr, **fields}})
+
+# 创建ICMP Echo Request数据包模板
+def create_icmp_template(packet_id, user_data):
     """
-    创建ICMP回显请求数据包，包括计算校验和并填充头部。
+    为一个目标创建ICMP回显请求模板。头部和数据部分只构建一次，
+    之后每次探测只改写序列号和时间戳，并增量更新校验和（RFC 1624）。
+
+    数据部分的格式为：8字节大端 perf_counter_ns 发送时间戳 + 用户数据。
 
     :param packet_id: 用于标识数据包的ID
     :param user_data: 用户自定义的字符串，将作为数据部分发送
-    :return: 完整的ICMP数据包（二进制）
+    :return: EchoRequestTemplate 对象
     """
-    # ICMP头部（类型、代码、校验和、标识符、序列号）
-    # ICMP类型为8（回显请求），我们将标识符设为packet_id，序列号设为1
+    # 将用户数据编码为字节串
+    return EchoRequestTemplate(packet_id, user_data.encode('utf-8'))
 
-    # 强制使用大端序 '!'
-    header = struct.pack('!bbHHh', 8, 0, 0, packet_id, 1)
 
-    # 数据部分包含当前时间戳，用于计算往返时间
-    # data = struct.pack('d', time.time())
+# 输出发送的ICMP数据包的调试信息
+def print_icmp_packet(packet, user_data):
+    # 十六进制转换本身也有开销，不输出时直接返回
+    if headless or verbosity < VERBOSITY_DEBUG:
+        return
+    icmp_type, code, checksum, packet_id, sequence = struct.unpack_from('!BBHHH', packet)
+    console("\n----- SENDING ICMP ECHO REQUEST -----\n"
+            f"ICMP Type: {icmp_type} (Echo Request)\nID: {packet_id:#06x}\nSeq: {sequence}\n"
+            f"Checksum: {checksum:#06x}\n"
+            f"Sending Data: {user_data}\n"
+            f"Packet (hex): {packet.hex()}", VERBOSITY_DEBUG)
 
-    # 将用户数据编码为字节串
-    data = user_data.encode('utf-8')
 
+# 为每个目标分配独立的标识符。起始值随机选取：PID 相近的两个进程（例如 cron 同时启动）
+# 若从 PID 开始连续分配，标识符区间会重叠
+def _new_packet_ids():
+    return itertools.count(random.getrandbits(16))
+
+
+_packet_ids = _new_packet_ids()
+
+
+def allocate_packet_id():
+    """
+    为一个目标主机分配ICMP标识符。同一进程内的不同目标使用不同的ID，
+    这样共享套接字的接收线程才能把应答交给正确的探测。
+
+    :return: 16位ICMP标识符
+    """
+    return next(_packet_ids) & 0xFFFF
+
+
+# 从接收到的ICMP报文中提取 (标识符, 序列号)，用于匹配待决探测
+def parse_reply_key(recv_packet):
+    """
+    解析应答报文对应的探测键。回显应答直接读取ICMP头部；
+    目标不可达、重定向和超时报文则读取其中引用的原始回显请求头部。
+
+    :param recv_packet: 原始套接字收到的完整IP数据包（bytes 或 memoryview）
+    :return: (packet_id, sequence)，无法匹配时返回 None
+    """
+    # IP头部长度由IHL字段给出，不一定是20字节
+    ihl = (recv_packet[0] & 0x0F) * 4
+    if len(recv_packet) < ihl + 8:
+        return None
+
+    icmp_type = recv_packet[ihl]
+    if icmp_type == 0:
+        return struct.unpack_from('!HH', recv_packet, ihl + 4)
+
+    if icmp_type in (3, 5, 11):
+        # 差错报文在ICMP头部之后引用了原始IP头部和原始ICMP头部的前8个字节
+        inner = ihl + 8
+        if len(recv_packet) < inner + 1:
+            return None
+        inner_icmp = inner + (recv_packet[inner] & 0x0F) * 4
+        if len(recv_packet) < inner_icmp + 8 or recv_packet[inner_icmp] != 8:
+            return None
+        return struct.unpack_from('!HH', recv_packet, inner_icmp + 4)
+
+    return None
+
+
+# 应答所对应探测的目标地址（4字节网络序）
+def reply_peer(recv_packet):
+    """
+    回显应答由目标本身发出，取IP头部的源地址；差错报文由中途的路由器发出，
+    取其中引用的原始IP头部的目的地址。原始套接字会收到本机所有的ICMP报文，
+    标识符和序列号相同、但发往其他主机的探测的应答据此排除。
+
+    :param recv_packet: parse_reply_key 已确认可以匹配的完整IP数据包
+    :return: 地址的 memoryview，无法确定时返回 None
+    """
+    recv_packet = memoryview(recv_packet)
+    ihl = (recv_packet[0] & 0x0F) * 4
+    if recv_packet[ihl] == 0:
+        return recv_packet[12:16]
+    inner = ihl + 8
+    if len(recv_packet) < inner + 20:
+        return None
+    return recv_packet[inner + 16:inner + 20]
+
+
+# 目标地址的4字节网络序形式，无法转换（例如主机名）时返回 None，此时不检查应答来源
+def packed_address(dest_addr):
+    try:
+        return socket.inet_aton(dest_addr)
+    except (OSError, TypeError):
+        return None
+
+
+# 等待应答的探测
+class PendingProbe:
+    """
+    一次已发送、正在等待应答的探测。接收线程收到匹配的报文后填充结果并唤醒等待者。
+    """
+
+    def __init__(self, packet_id, sequence, dest_addr=None):
+        self.packet_id = packet_id
+        self.sequence = sequence
+        self.peer = packed_address(dest_addr)  # 只接受来自这个目标（或引用这个目标）的应答
+        self.event = threading.Event()
+        self.packet = None
+        self.addr = None
+        self.time_received = None  # perf_counter_ns 时间线上的接收时刻
+        self.buffer = None  # packet 所在的接收缓冲区，由 PingSocket.unregister 归还
+
+    def deliver(self, recv_packet, addr, time_received, buffer=None):
+        self.packet = recv_packet
+        self.addr = addr
+        self.time_received = time_received
+        self.buffer = buffer
+        self.event.set()
+
+
+# 进程内共享的原始ICMP套接字
+class PingSocket:
+    """
+    进程内共享的长期原始ICMP套接字。所有线程通过它发送回显请求，
+    由单个接收线程按 (标识符, 序列号) 把应答分发给对应的待决探测，
+    避免每次探测都创建和关闭套接字，也避免线程之间互相读走对方的应答。
+    """
+
+    def __init__(self, buffer_size=RECV_BUFFER_SIZE):
+        """
+        :param buffer_size: 接收缓冲区大小，见 reply_buffer_size()
+        """
+        # 创建SOCK_RAW套接字，使用ICMP协议
+        self.sock = transport.icmp_socket()
+        # 由内核记录接收时刻，RTT 不包含接收线程的调度延迟；不支持时退回用户态计时
+        self.kernel_timestamps = enable_rx_timestamps(self.sock)
+        # 接收线程定期醒来检查关闭标志
+        self.sock.settimeout(0.5)
+        # 接收时直接写入复用的缓冲区，解析时只使用 memoryview，不为每个报文分配新的 bytes
+        self._buffers = BufferPool(buffer_size)
+        self._pending = {}
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._receive_loop, daemon=True)
+        self._thread.start()
+
+    def register(self, packet_id, sequence, dest_addr=None):
+        """
+        在发送之前登记一个探测，保证应答不会早于登记到达。
+
+        :param dest_addr: 探测的目标IP，用于排除其他主机的应答
+        :return: PendingProbe 对象
+        """
+        probe = PendingProbe(packet_id, sequence, dest_addr)
+        with self._lock:
+            self._pending[(packet_id, sequence)] = probe
+        return probe
+
+    def unregister(self, probe):
+        with self._lock:
+            self._pending.pop((probe.packet_id, probe.sequence), None)
+        # 归还应答所在的缓冲区，之后不能再访问 probe.packet
+        buffer, probe.buffer, probe.packet = probe.buffer, None, None
+        if buffer is not None:
+            self._buffers.release(buffer)
+
+    def register_session(self, session):
+        """
+        登记一个流水线会话：该标识符下没有单独登记的应答都交给会话处理，
+        这样会话能够识别迟到和重复的应答。
+        """
+        with self._lock:
+            self._sessions[session.packet_id] = session
+
+    def unregister_session(self, session):
+        with self._lock:
+            self._sessions.pop(session.packet_id, None)
+
+    def reserve_buffer_size(self, size):
+        """
+        保证接收缓冲区至少有 size 字节；换成更大的缓冲区池后，接收线程在下一次接收前换用新的缓冲区，
+        旧缓冲区归还时被丢弃。
+        """
+        with self._lock:
+            if size > self._buffers.size:
+                self._buffers = BufferPool(size)
+
+    def send(self, packet, dest_addr):
+        # 发送数据包到目标地址，端口号在ICMP协议中通常设置为1
+        self.sock.sendto(packet, (dest_addr, 1))
+
+    def _receive_loop(self):
+        buffer = self._buffers.acquire()
+        while not self._closed:
+            if len(buffer) < self._buffers.size:
+                buffer = self._buffers.acquire()
+            try:
+                nbytes, addr, received_ns = recv_into_timestamped(self.sock, buffer, self.kernel_timestamps)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            recv_packet = memoryview(buffer)[:nbytes]
+
+            key = parse_reply_key(recv_packet)
+            if key is None:
+                continue
+            peer = reply_peer(recv_packet)
+
+            with self._lock:
+                probe = self._pending.get(key)
+                if probe is not None and probe.peer not in (None, peer):
+                    continue  # 标识符和序列号相同，但是发往其他主机的探测（例如另一个进程的）的应答
+                self._pending.pop(key, None)
+                session = self._sessions.get(key[0]) if probe is None else None
+                if session is not None and session.peer not in (None, peer):
+                    continue
+            if probe is not None:
+                # 缓冲区交给等待的线程，换一个新的继续接收
+                probe.deliver(recv_packet, addr, received_ns, buffer)
+                buffer = self._buffers.acquire()
+            elif session is not None:
+                # 会话在本线程内处理完应答，缓冲区可以直接复用
+                session.deliver(key[1], recv_packet, received_ns)
+
+    def close(self):
+        self._closed = True
+        self._thread.join()
+        self.sock.close()
+
+
+_ping_socket = None
+_ping_socket_lock = threading.Lock()
+
+
+def get_ping_socket(buffer_size=RECV_BUFFER_SIZE):
+    """
+    获取进程内共享的 PingSocket，第一次调用时创建。
+
+    :param buffer_size: 需要的接收缓冲区大小，见 reply_buffer_size()
+    :return: PingSocket 对象
+    """
+    global _ping_socket
+    with _ping_socket_lock:
+        if _ping_socket is None:
+            _ping_socket = PingSocket(buffer_size)
+        else:
+            _ping_socket.reserve_buffer_size(buffer_size)
+        return _ping_socket
 
-    # 计算校验和（注意，校验和字段初始值为0）
-    checksum = calculate_checksum(header + data)
 
-    # 将计算出的校验和填充到ICMP头部
-    header = struct.pack('!bbHHh', 8, 0, checksum, packet_id, 1)
+def reply_buffer_size(payload):
+    """
+    :param payload: 回显请求的数据部分（不含时间戳）
+    :return: 能完整容纳其回显应答的接收缓冲区大小，至少 RECV_BUFFER_SIZE
+    """
+    return max(RECV_BUFFER_SIZE, 60 + 16 + len(payload))
 
-    # 输出调试信息
-    print("\n----- SENDING ICMP ECHO REQUEST -----")
-    print(f"ICMP Type: 8 (Echo Request)\nID: {packet_id:#06x}\nSeq: 1")
-    print(f"Checksum: {checksum:#06x}")
-    print(f"Sending Data: {user_data}")
-    print(f"Packet (hex): {header.hex() + data.hex()}")
 
+def set_transport(new_transport):
+    """
+    切换创建套接字所用的传输，例如换成 common.simnet.SimulatedNetwork，
+    在没有 root 权限和网络的环境中测试和做基准测试。已创建的共享套接字会被关闭，
+    下一次探测时按新的传输重新创建。
 
-    return header + data  # 返回完整的ICMP包
+    :param new_transport: 提供 icmp_socket() 和 udp_socket() 的对象，见 common/transport.py
+    """
+    global transport, _ping_socket
+    with _ping_socket_lock:
+        transport = new_transport
+        if _ping_socket is not None:
+            _ping_socket.close()
+            _ping_socket = None
 
 
 # 发送ICMP请求并接收回复
-def send_one_ping(sock, dest_addr, packet_id, user_data):
+def send_one_ping(ping_socket, dest_addr, template, user_data, sequence=1):
     """
     向目标地址发送ICMP Echo Request数据包。
 
-    :param sock: 已经创建好的socket对象
+    :param ping_socket: 共享的 PingSocket 对象
     :param dest_addr: 目标地址（IP）
-    :param packet_id: 数据包的ID（用于匹配回显应答）
+    :param template: 目标的ICMP回显请求模板（其ID用于匹配回显应答）
     :param user_data: 用户自定义的字符串，将作为数据部分发送
-    :return: 发送的时间戳
+    :param sequence: 数据包的序列号
+    :return: (登记的探测, 发送时刻的 perf_counter_ns)
     """
-    # 创建ICMP数据包
-    packet = create_icmp_packet(packet_id, user_data)
+    # 启用限速时先等到调度器分配的发送时刻
+    slot = scheduler.wait(dest_addr) if scheduler is not None else None
+
+    # 先登记再发送，避免应答在登记之前到达
+    probe = ping_socket.register(template.packet_id, sequence, dest_addr)
 
-    # 记录发送时间
-    time_sent = time.time()
+    # 用单调时钟记录发送时间，并由模板生成本次的数据包
+    time_sent = time.perf_counter_ns()
+    packet = template.build(sequence, time_sent)
 
-    # 发送数据包到目标地址，端口号在ICMP协议中通常设置为1
-    sock.sendto(packet, (dest_addr, 1))
+    try:
+        ping_socket.send(packet, dest_addr)
+    except OSError:
+        ping_socket.unregister(probe)
+        raise
+    if slot is not None:
+        scheduler.record_send(slot, time_sent)
 
-    return time_sent
+    # 调试输出放在发送之后，不计入往返时间
+    print_icmp_packet(packet, user_data)
+    return probe, time_sent
 
 # 接收ICMP回显应答并处理
-def receive_one_ping(sock, packet_id, timeout, user_data, time_sent, thread_color):
+def receive_one_ping(probe, timeout, user_data, time_sent, thread_color):
     """
-    等待并接收ICMP回显应答数据包，并计算往返时间。
+    等待接收线程分发过来的应答，并计算往返时间。
 
-    :param sock: 创建的套接字对象
-    :param packet_id: 数据包的ID（用于匹配回显应答）
+    :param probe: send_one_ping 登记的探测
     :param timeout: 超时时间，以秒为单位
-    :param user_data: 用户自定义的字符串，将作为数据部分发送
-    :param time_sent: 发送的时间戳
+    :param user_data: 期望在应答中收到的用户数据（字节串）
+    :param time_sent: 发送时刻的 perf_counter_ns
     :param thread_color: 不同线程呈现不同的颜色
     :return: 往返时间（毫秒），或者如果超时返回 None
     """
-    # 设置套接字的超时时间
-    sock.settimeout(timeout)
-    try:
-        # 从目标地址接收响应数据包
-        recv_packet, addr = sock.recvfrom(1024)
-        time_received = time.time()
-
-        # 检查接收到的数据包长度是否足够容纳IP头部和ICMP头部（至少28字节）
-        if len(recv_packet) < 28:
-            print(thread_color + f"接收到的数据包太小: {len(recv_packet)} 字节")
-            return None
+    if not probe.event.wait(timeout):
+        console("请求超时。", VERBOSITY_DEBUG)
+        return None  # 如果超时，返回 None
 
-        # 提取并解析ICMP头部（从第21字节到第28字节）
-        icmp_header = recv_packet[20:28]  # 前20个字节是IP头部，ICMP头部从第21个字节开始
-        icmp_type, code, checksum, recv_id, sequence = struct.unpack('!bbHHh', icmp_header)
+    recv_packet = probe.packet
+    time_received = probe.time_received
 
-        # 匹配ID，并确认ICMP类型为0（表示回显应答）
-        if recv_id == packet_id and icmp_type == 0:
+    # 前面是IP头部，ICMP头部紧随其后
+    ihl = (recv_packet[0] & 0x0F) * 4
+    icmp_type, code, checksum, recv_id, sequence = struct.unpack_from('!BBHHH', recv_packet, ihl)
 
-            # # 获取发送时间（从第29字节开始）
-            # time_sent = struct.unpack('d', recv_packet[28:28 + struct.calcsize('d')])[0]
-            # 计算往返时间，并返回
+    # 接收线程已经按ID和序列号匹配过，这里确认ICMP类型为0（表示回显应答）
+    if icmp_type == 0:
 
-            received_data = recv_packet[28:].decode('utf-8')
+        # 跳过数据部分开头的8字节时间戳，直接比较字节，不复制也不解码
+        received_data = recv_packet[ihl + 16:]
 
-            # 输出接收到的数据调试信息
-            # print(thread_color + "\n----- RECEIVED ICMP ECHO REPLY -----")
-            # print(thread_color + f"ICMP Type: {icmp_type} (Echo Reply)\nID: {recv_id:#06x}\nSeq: {sequence}")
-            # print(thread_color + f"Checksum: {checksum:#06x}")
-            # print(thread_color + f"Received Data: {received_data}")
-            # print(thread_color + f"Packet (hex): {recv_packet.hex()}")
+        # 输出接收到的数据调试信息
+        # print(thread_color + "\n----- RECEIVED ICMP ECHO REPLY -----")
+        # print(thread_color + f"ICMP Type: {icmp_type} (Echo Reply)\nID: {recv_id:#06x}\nSeq: {sequence}")
+        # print(thread_color + f"Checksum: {checksum:#06x}")
+        # print(thread_color + f"Received Data: {received_data}")
+        # print(thread_color + f"Packet (hex): {recv_packet.hex()}")
 
 
-            if received_data == user_data:
-                print(thread_color + "Data Match: ✅ \n")
-                # 计算往返时间，并返回
-                return (time_received - time_sent) * 1000  # 返回毫秒
-            else:
-                print(thread_color + "Data Match: ❌ \n")
-                return None
-
-        elif icmp_type == 3:
-            # 目标不可达消息处理
-            print(thread_color + f"目标不可达，代码: {code}")
-            return None
-        elif icmp_type == 5:
-            if code == 0:
-                print("收到重定向消息：网络重定向")
-            elif code == 1:
-                print("收到重定向消息：主机重定向")
-            elif code == 2:
-                print("收到重定向消息：服务类型和网络重定向")
-            elif code == 3:
-                print("收到重定向消息：服务类型和主机重定向")
-            return None
-        elif icmp_type == 8:
-            print("收到 ICMP 回显请求，忽略。")
-            return None
-        elif icmp_type == 9:
-            print("收到路由器通告消息。")
-            return None
-        elif icmp_type == 10:
-            print("收到路由器请求消息。")
-            return None
-        elif icmp_type == 11:
-            # 超时报文处理
-            print(thread_color + f"TTL 超时，代码: {code}")
-            return None
-        elif icmp_type == 13:
-            print("收到时间戳请求消息。")
-            return None
-        elif icmp_type == 14:
-            print("收到时间戳应答消息。")
-            return None
-        elif icmp_type == 17:
-            print("收到地址掩码请求消息。")
-            return None
-        elif icmp_type == 18:
-            print("收到地址掩码应答消息。")
-            return None
+        if received_data == user_data:
+            console(thread_color + "Data Match: ✅ \n", VERBOSITY_DEBUG)
+            # 计算往返时间，并返回
+            return (time_received - time_sent) / 1e6  # 返回毫秒
         else:
-            print(thread_color + f"收到未知的 ICMP 消息，类型: {icmp_type}, 代码: {code}")
+            console(thread_color + "Data Match: ❌ \n", VERBOSITY_DEBUG)
             return None
-    except socket.timeout:
-        print("请求超时。")
-        return None  # 如果超时，返回 None
+
+    elif icmp_type == 3:
+        # 目标不可达消息处理
+        console(thread_color + f"目标不可达，代码: {code}")
+        return None
+    elif icmp_type == 5:
+        if code == 0:
+            console("收到重定向消息：网络重定向")
+        elif code == 1:
+            console("收到重定向消息：主机重定向")
+        elif code == 2:
+            console("收到重定向消息：服务类型和网络重定向")
+        elif code == 3:
+            console("收到重定向消息：服务类型和主机重定向")
+        return None
+    elif icmp_type == 11:
+        # 超时报文处理
+        console(thread_color + f"TTL 超时，代码: {code}")
+        return None
+    else:
+        console(thread_color + f"收到未知的 ICMP 消息，类型: {icmp_type}, 代码: {code}")
+        return None
 
 
 # 执行一次Ping操作
-def do_one_ping(dest_addr, thread_color, timeout=1, user_data="Ping"):
+def do_one_ping(dest_addr, thread_color, timeout=1, user_data="Ping", template=None, sequence=1):
     """
     执行一次ping操作，发送ICMP Echo Request并接收Echo Reply。
 
@@ -234,25 +626,304 @@ def do_one_ping(dest_addr, thread_color, timeout=1, user_data="Ping"):
     :param timeout: 超时时间
     :param user_data: 用户自定义的字符串，将作为数据部分发送
     :param thread_color: 不同线程呈现不同的颜色
+    :param template: 目标的ICMP回显请求模板，为 None 时使用新分配的ID创建
+    :param sequence: 本次探测的序列号
     :return: 往返时间或None（如果超时）
     """
+    if template is None:
+        template = create_icmp_template(allocate_packet_id(), user_data)
+
     try:
-        # 创建SOCK_RAW套接字，使用ICMP协议
-        sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+        ping_socket = get_ping_socket(reply_buffer_size(template.payload))
     except Exception as e:
-        print(thread_color + f"创建套接字失败: {e}")
+        console(thread_color + f"创建套接字失败: {e}", VERBOSITY_QUIET)
         return None
 
-    packet_id = os.getpid() & 0xFFFF  # 使用进程ID的低16位作为标识符
-    time_sent = send_one_ping(sock, dest_addr, packet_id, user_data)  # 发送ping请求并记录发送时间
-    delay = receive_one_ping(sock, packet_id, timeout, user_data, time_sent, thread_color)  # 接收ping回复
+    try:
+        probe, time_sent = send_one_ping(ping_socket, dest_addr, template, user_data, sequence)  # 发送ping请求并记录发送时间
+    except OSError as e:
+        console(thread_color + f"发送失败: {e}")
+        return None
 
-    sock.close()  # 关闭套接字
+    try:
+        delay = receive_one_ping(probe, timeout, template.payload, time_sent, thread_color)  # 等待ping回复
+    finally:
+        ping_socket.unregister(probe)
     return delay
 
 
+# 获取一个地址的 RTT 统计对象，第一次使用时创建
+def get_rtt_stats(dest_addr):
+    stats = rtt_data.get(dest_addr)
+    if stats is None:
+        stats = rtt_data.setdefault(dest_addr, RttStats(window=PLOT_WINDOW))
+    return stats
+
+
+# 保存一次成功探测的 RTT，供实时绘图、统计和日志使用
+def record_rtt(dest_addr, delay, sequence=None):
+    get_rtt_stats(dest_addr).add(delay)
+    emit('probe', dest_addr, seq=sequence, status='reply', rtt_ms=round(delay, 3))
+
+    results_logger.info("%s RTT: %.3f ms", dest_addr, delay)
+    store_result(dest_addr, sequence, delay)
+
+
+# 记录一次没有收到回复的探测
+def record_loss(dest_addr, sequence=None):
+    get_rtt_stats(dest_addr).add_loss()
+    emit('probe', dest_addr, seq=sequence, status='timeout', rtt_ms=None)
+    store_result(dest_addr, sequence, None)
+
+
+# 给出 --store 时把探测结果交给后台线程写入时间序列库，测量线程不做磁盘 I/O
+def store_result(dest_addr, sequence, delay):
+    if store is None:
+        return
+    if log_writer is not None:
+        store_logger.info('', extra={'payload': (dest_addr, sequence, delay, time.time_ns())})
+    else:
+        store.append(dest_addr, sequence, delay)
+
+
+def _round_ms(value):
+    return None if value is None else round(value, 3)
+
+
+# 输出一个目标的 ping 统计结果
+def print_statistics(dest_addr, stats, thread_color):
+    """
+    输出一个目标的丢包率、往返时间最小/平均/最大值、mdev、抖动和分位数。
+
+    :param dest_addr: 目标主机地址
+    :param stats: 目标的 RttStats 对象
+    :param thread_color: 输出颜色
+    """
+    if json_output:
+        received = stats.received
+        emit('summary', dest_addr, sent=stats.sent, received=received, loss_pct=round(stats.loss, 1),
+             min_ms=_round_ms(stats.min), avg_ms=_round_ms(stats.mean if received else None),
+             max_ms=_round_ms(stats.max), mdev_ms=_round_ms(stats.mdev if received else None),
+             jitter_ms=_round_ms(stats.jitter if received else None),
+             p50_ms=_round_ms(stats.percentile(0.5)), p90_ms=_round_ms(stats.percentile(0.9)),
+             p99_ms=_round_ms(stats.percentile(0.99)))
+    header = thread_color + f"\n--- {dest_addr} ping 统计 ---\n"
+    if stats.received:
+        console(header +
+                thread_color + f"{stats.sent} 个数据包已发送，{stats.received} 个收到回复，丢失率 {stats.loss:.1f}%\n" +
+                thread_color + f"往返时间最小/平均/最大:\n"
+                               f"{stats.min:.3f} ms\n"
+                               f"{stats.mean:.3f} ms\n"
+                               f"{stats.max:.3f} ms\n" +
+                thread_color + f"mdev/抖动: {stats.mdev:.3f} ms / {stats.jitter:.3f} ms\n" +
+                thread_color + f"p50/p90/p99: {stats.percentile(0.5):.3f} / {stats.percentile(0.9):.3f} / "
+                               f"{stats.percentile(0.99):.3f} ms", VERBOSITY_QUIET)
+    else:
+        console(header + thread_color + "没有收到任何回复。", VERBOSITY_QUIET)
+
+
+# 输出发送调度的统计结果
+def print_schedule_report():
+    """
+    启用限速时，输出实际发送时刻相对调度时刻的偏差（平均、p99、最大），
+    偏差持续增大说明发送线程跟不上设定的速率。
+    """
+    if scheduler is None:
+        return
+    summary = scheduler.drift_summary()
+    if json_output:
+        emit('schedule', None, probes=summary['probes'], rate_pps=scheduler.rate,
+             per_host_rate_pps=scheduler.per_destination_rate,
+             **{key: _round_ms(summary[key]) for key in ('drift_mean_ms', 'drift_p99_ms', 'drift_max_ms')})
+    if summary['probes']:
+        console(f"\n--- 发送调度 ---\n"
+                f"{summary['probes']} 个探测，发送时刻偏差 平均/p99/最大: "
+                f"{summary['drift_mean_ms']:.3f} / {summary['drift_p99_ms']:.3f} / {summary['drift_max_ms']:.3f} ms",
+                VERBOSITY_QUIET)
+
+
+# 流水线模式下一个目标的会话状态
+class PingSession:
+    """
+    流水线模式下一个目标的探测状态。发送线程按固定间隔发出序列号递增的请求，
+    接收线程根据序列号和数据部分携带的 perf_counter_ns 时间戳计算 RTT，
+    并识别超时之后才到达的迟到应答和重复应答。
+    """
+
+    def __init__(self, template, timeout, dest_addr=None):
+        self.template = template
+        self.packet_id = template.packet_id
+        self.peer = packed_address(dest_addr)  # 只接受来自这个目标的应答
+        self.user_data = template.payload
+        self.timeout_ns = int(timeout * 1e9)
+        self.transmitted = 0
+        self.received = 0
+        self.duplicates = 0
+        self.late = 0
+        self.events = queue.Queue()  # 接收线程产生的 (类型, 序列号, RTT)，由发送线程输出
+        self._outstanding = {}  # 序列号 -> 超时时刻（perf_counter_ns）
+        self._expired = set()
+        self._answered = set()
+        self._lock = threading.Lock()
+
+    def sent(self, sequence, time_sent_ns):
+        with self._lock:
+            # 序列号回绕后会被复用，先清除旧状态
+            self._expired.discard(sequence)
+            self._answered.discard(sequence)
+            self._outstanding[sequence] = time_sent_ns + self.timeout_ns
+            self.transmitted += 1
+
+    def deliver(self, sequence, recv_packet, received_ns):
+        """
+        处理一个属于本会话的应答，由 PingSocket 的接收线程调用。
+        """
+        ihl = (recv_packet[0] & 0x0F) * 4
+        # 差错报文不带时间戳，对应的探测按超时处理
+        if recv_packet[ihl] != 0 or len(recv_packet) < ihl + 16 or recv_packet[ihl + 16:] != self.user_data:
+            return
+
+        time_sent_ns, = struct.unpack_from('!Q', recv_packet, ihl + 8)
+        rtt = (received_ns - time_sent_ns) / 1e6
+
+        with self._lock:
+            deadline = self._outstanding.pop(sequence, None)
+            if sequence in self._answered:
+                self.duplicates += 1
+                kind = 'duplicate'
+            elif deadline is not None and received_ns <= deadline:
+                self._answered.add(sequence)
+                self.received += 1
+                kind = 'reply'
+            elif deadline is not None or sequence in self._expired:
+                if deadline is not None:
+                    # 超时时刻之后才到达，发送线程还没来得及标记超时
+                    self.events.put(('timeout', sequence, None))
+                self._expired.discard(sequence)
+                self._answered.add(sequence)
+                self.late += 1
+                kind = 'late'
+            else:
+                return
+        self.events.put((kind, sequence, rtt))
+
+    def expire(self, now_ns):
+        """
+        把已经过了超时时刻仍未应答的序列号标记为超时。
+
+        :return: 本次新超时的序列号列表
+        """
+        with self._lock:
+            expired = [seq for seq, deadline in self._outstanding.items() if deadline <= now_ns]
+            for seq in expired:
+                del self._outstanding[seq]
+                self._expired.add(seq)
+        return expired
+
+    def has_outstanding(self):
+        with self._lock:
+            return bool(self._outstanding)
+
+
+# 流水线模式：按固定间隔发送，应答异步匹配
+def ping_pipelined(dest_addr, thread_color, timeout=1, count=4, user_data="Ping", interval=1):
+    """
+    以类似 ping -i 的方式对目标发送 count 个回显请求。每个请求携带递增的序列号和
+    发送时刻的 perf_counter_ns 时间戳，发送节奏只由 interval 决定，与 RTT 无关；
+    应答由共享套接字的接收线程异步匹配，迟到和重复的应答会被单独统计。
+
+    :param dest_addr: 目标主机地址
+    :param thread_color: 输出颜色
+    :param timeout: 每个请求的超时时间
+    :param count: 发送ping请求的次数
+    :param user_data: 用户自定义的字符串，将作为数据部分发送
+    :param interval: 相邻两次发送之间的间隔（秒）
+    """
+    try:
+        dest_ip = resolver.resolve(dest_addr)
+        source_ip = resolver.resolve(socket.gethostname())
+    except socket.gaierror:
+        console(thread_color + f"无法解析主机 {dest_addr}。请检查地址后重试。", VERBOSITY_QUIET)
+        emit('error', dest_addr, error='unresolved')
+        return
+
+    try:
+        ping_socket = get_ping_socket(reply_buffer_size(user_data.encode('utf-8')))
+    except Exception as e:
+        console(thread_color + f"创建套接字失败: {e}", VERBOSITY_QUIET)
+        return
+
+    console(thread_color + f"\n---------------------------------------- Pinging {dest_ip} from {source_ip} with {len(user_data)} bytes of data every {interval}s ----------------------------------------")
+
+    session = PingSession(create_icmp_template(allocate_packet_id(), user_data), timeout, dest_ip)
+
+    def report(kind, sequence, rtt):
+        if kind == 'reply':
+            console(thread_color + f"来自 {dest_ip} 的回复：seq={sequence} 时间={rtt:.3f}ms")
+            record_rtt(dest_addr, rtt, sequence)
+        elif kind == 'timeout':
+            console(thread_color + f"seq={sequence} 请求超时。")
+            record_loss(dest_addr, sequence)
+        else:
+            if kind == 'duplicate':
+                console(thread_color + f"来自 {dest_ip} 的回复：seq={sequence} 时间={rtt:.3f}ms (DUP!)")
+            else:
+                console(thread_color + f"来自 {dest_ip} 的迟到回复：seq={sequence} 时间={rtt:.3f}ms（已超时）")
+            emit('probe', dest_addr, seq=sequence, status=kind, rtt_ms=round(rtt, 3))
+
+    def wait_until(deadline_ns, until_idle=False):
+        # 等待期间输出接收线程送来的结果，并检查超时
+        while True:
+            for sequence in session.expire(time.perf_counter_ns()):
+                report('timeout', sequence, None)
+            remaining = deadline_ns - time.perf_counter_ns()
+            if remaining <= 0 or (until_idle and not session.has_outstanding()):
+                return
+            try:
+                report(*session.events.get(timeout=min(remaining / 1e9, 0.1)))
+            except queue.Empty:
+                continue
+
+    ping_socket.register_session(session)
+    try:
+        interval_ns = int(interval * 1e9)
+        start_ns = time.perf_counter_ns()
+        for i in range(count):
+            if stop_flag:  # 检查是否应该终止
+                console(thread_color + "Ping 操作被终止。", VERBOSITY_QUIET)
+                break
+
+            sequence = (i + 1) & 0xFFFF
+            slot = scheduler.wait(dest_ip) if scheduler is not None else None
+            time_sent_ns = time.perf_counter_ns()
+            packet = session.template.build(sequence, time_sent_ns)
+            session.sent(sequence, time_sent_ns)
+            try:
+                ping_socket.send(packet, dest_ip)
+            except OSError as e:
+                console(thread_color + f"发送失败: {e}")
+            if slot is not None:
+                scheduler.record_send(slot, time_sent_ns)
+
+            # 按绝对时刻安排下一次发送，避免输出和调度的误差累积
+            if i < count - 1:
+                wait_until(start_ns + (i + 1) * interval_ns)
+
+        # 最后一个请求发出后，最多再等待一个超时时间
+        wait_until(time.perf_counter_ns() + session.timeout_ns, until_idle=True)
+        # 处理在等待结束前刚好到达的结果
+        while not session.events.empty():
+            report(*session.events.get())
+    finally:
+        ping_socket.unregister_session(session)
+
+    print_statistics(dest_addr, get_rtt_stats(dest_addr), thread_color)
+    if session.duplicates or session.late:
+        console(thread_color + f"重复应答 {session.duplicates} 个，迟到应答 {session.late} 个", VERBOSITY_QUIET)
+
+
 # Ping函数，进行多次ping并统计结果
-def ping(dest_addr, timeout=1, count=4, user_data="Ping", retries=2):
+def ping(dest_addr, timeout=1, count=4, user_data="Ping", retries=2, interval=None):
     """
     对目标主机进行多次ping操作，并显示统计结果。
 
@@ -260,77 +931,70 @@ def ping(dest_addr, timeout=1, count=4, user_data="Ping", retries=2):
     :param timeout: 每次ping的超时时间
     :param count: 发送ping请求的次数
     :param user_data: 用户自定义的字符串，将作为数据部分发送
+    :param retries: 超时后的重试次数（流水线模式下不重试）
+    :param interval: 给出时使用流水线模式，每隔 interval 秒发送一次，不等待上一次应答
     :return: None
     """
     global stop_flag
-    thread_colors = [Fore.RED, Fore.GREEN, Fore.YELLOW, Fore.CYAN, Fore.MAGENTA]
     thread_color = random.choice(thread_colors)
 
+    if interval is not None:
+        ping_pipelined(dest_addr, thread_color, timeout, count, user_data, interval)
+        return
+
     try:
-        # 将主机名解析为IP地址
-        dest_ip = socket.gethostbyname(dest_addr)
-        source_ip = socket.gethostbyname(socket.gethostname())
+        # 将主机名解析为IP地址（结果由共享解析器缓存，重复运行不再查询 DNS）
+        dest_ip = resolver.resolve(dest_addr)
+        source_ip = resolver.resolve(socket.gethostname())
 
-        print(thread_color + f"\n---------------------------------------- Pinging {dest_ip} from {source_ip} with {len(user_data)} bytes of data ----------------------------------------")
+        console(thread_color + f"\n---------------------------------------- Pinging {dest_ip} from {source_ip} with {len(user_data)} bytes of data ----------------------------------------")
         # print(f"\n----- Pinging {dest_ip} from {source_ip} with {len(user_data)} bytes of data -----")
 
-        rtt_list = []  # 用于存储每次ping的往返时间
+        template = create_icmp_template(allocate_packet_id(), user_data)  # 每个目标使用独立的标识符和模板
+        sequence = 0  # 每次发送（包括重试）递增的序列号
         for i in range(count):
             if stop_flag:  # 检查是否应该终止
-                print(thread_color + "Ping 操作被终止。")
+                console(thread_color + "Ping 操作被终止。", VERBOSITY_QUIET)
                 break
 
-            print(thread_color + f"\n-------------------------------------------------- Ping {i + 1} --------------------------------------------------")
-            delay = do_one_ping(dest_ip, thread_color, timeout, user_data)
+            console(thread_color + f"\n-------------------------------------------------- Ping {i + 1} --------------------------------------------------", VERBOSITY_DEBUG)
+            sequence = (sequence + 1) & 0xFFFF
+            delay = do_one_ping(dest_ip, thread_color, timeout, user_data, template, sequence)
 
             # 超时重试逻辑
             attempts = 0
             while delay is None and attempts < retries:
-                print(thread_color + f"第 {attempts + 1} 次重试...")
-                delay = do_one_ping(dest_ip, thread_color, timeout, user_data)
+                console(thread_color + f"第 {attempts + 1} 次重试...")
+                sequence = (sequence + 1) & 0xFFFF
+                delay = do_one_ping(dest_ip, thread_color, timeout, user_data, template, sequence)
                 attempts += 1
 
 
             if delay is None:
-                print(thread_color + "请求超时。")
+                console(thread_color + "请求超时。")
+                record_loss(dest_addr, sequence)
             else:
-                print(thread_color + f"来自 {dest_ip} 的回复：时间={delay:.3f}ms")
-                rtt_list.append(delay)
-                # 保存 RTT 数据
-                if dest_addr in rtt_data:
-                    rtt_data[dest_addr].append(delay)
-                else:
-                    rtt_data[dest_addr] = [delay]
-
-                logging.info(f"{dest_addr} RTT: {delay:.3f} ms")
+                console(thread_color + f"来自 {dest_ip} 的回复：时间={delay:.3f}ms")
+                record_rtt(dest_addr, delay, sequence)
 
 
             time.sleep(1)
 
-        if rtt_list:
-            print(thread_color + f"\n--- {dest_addr} ping 统计 ---")
-            print(
-                thread_color + f"{count} 个数据包已发送，{len(rtt_list)} 个收到回复，丢失率 {((count - len(rtt_list)) / count) * 100:.1f}%")
-            print(thread_color + f"往返时间最小/平均/最大:\n"
-                                 f"{min(rtt_list):.3f} ms\n"
-                                 f"{sum(rtt_list) / len(rtt_list):.3f} ms\n"
-                                 f"{max(rtt_list):.3f} ms")
-        else:
-            print(thread_color + f"\n--- {dest_addr} ping 统计 ---")
-            print(thread_color + "没有收到任何回复。")
+        print_statistics(dest_addr, get_rtt_stats(dest_addr), thread_color)
 
     except socket.gaierror:
-        print(thread_color + f"无法解析主机 {dest_addr}。请检查地址后重试。")
+        console(thread_color + f"无法解析主机 {dest_addr}。请检查地址后重试。", VERBOSITY_QUIET)
+        emit('error', dest_addr, error='unresolved')
 
 # 并发控制：线程池来限制并发的数量
-def worker_thread(address_queue, timeout, count):
+def worker_thread(address_queue, timeout, count, user_data="Ping", interval=None):
     global stop_flag
     while not address_queue.empty() and not stop_flag:
         addr = address_queue.get()
-        ping(addr, timeout=timeout, count=count)
+        ping(addr, timeout=timeout, count=count, user_data=user_data, interval=interval)
         address_queue.task_done()
 
-def ping_multiple_addresses(addresses, timeout=1, count=4, max_threads=5):
+def ping_multiple_addresses(addresses, timeout=1, count=4, max_threads=5, user_data="Ping", interval=None):
     """
     并行ping多个地址，交替输出ping结果。
     """
@@ -341,6 +1005,9 @@ def ping_multiple_addresses(addresses, timeout=1, count=4, max_threads=5):
     for addr in addresses:
         address_queue.put((addr))
 
+    # 在后台线程池中并发解析所有目标，工作线程取到目标时结果通常已在缓存中
+    resolver.prefetch(addresses)
+
 
     # for i, addr in enumerate(addresses):
     #     # import ipdb;ipdb.set_trace()
@@ -351,7 +1018,7 @@ def ping_multiple_addresses(addresses, timeout=1, count=4, max_threads=5):
 
 
     for i in range(min(max_threads, address_queue.qsize())):
-        thread = threading.Thread(target=worker_thread, args=(address_queue, timeout, count))
+        thread = threading.Thread(target=worker_thread, args=(address_queue, timeout, count, user_data, interval))
         thread.start()
         threads.append(thread)
 
@@ -362,20 +1029,462 @@ def ping_multiple_addresses(addresses, timeout=1, count=4, max_threads=5):
     for thread in threads:
         thread.join()
 
+    print_schedule_report()
+
+
+# asyncio 批量 ping 引擎
+class AsyncPinger:
+    """
+    基于 asyncio 的批量 ping 引擎。整个事件循环只使用一个非阻塞原始套接字，
+    通过 loop.add_reader 在套接字可读时按 (标识符, 序列号) 唤醒对应的探测，
+    用信号量限制同时在途的探测数量，从而可以一次扫描成千上万个目标。
+    """
+
+    def __init__(self, concurrency=1000, buffer_size=RECV_BUFFER_SIZE):
+        """
+        :param concurrency: 同时在途（已发送、尚未应答或超时）的最大探测数
+        :param buffer_size: 接收缓冲区大小，见 reply_buffer_size()
+        """
+        self.loop = asyncio.get_running_loop()
+        self.sock = transport.icmp_socket()
+        self.sock.setblocking(False)
+        self.kernel_timestamps = enable_rx_timestamps(self.sock)
+        # 每个在途探测最多持有一个缓冲区，再加上接收用的一个，一次读空大量应答时也不再分配
+        self._buffers = BufferPool(buffer_size, concurrency + 1)
+        self._buffer = self._buffers.acquire()
+        self._pending = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.loop.add_reader(self.sock.fileno(), self._on_readable)
+
+    def _on_readable(self):
+        # 一次读空接收缓冲区，减少事件循环的唤醒次数
+        while True:
+            try:
+                nbytes, addr, time_received = recv_into_timestamped(self.sock, self._buffer,
+                                                                    self.kernel_timestamps)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            recv_packet = memoryview(self._buffer)[:nbytes]
+
+            key = parse_reply_key(recv_packet)
+            pending = self._pending.get(key) if key is not None else None
+            if pending is None:
+                continue
+            future, peer = pending
+            if peer not in (None, reply_peer(recv_packet)):
+                continue  # 发往其他主机的探测的应答
+            del self._pending[key]
+            if not future.done():
+                # 缓冲区交给等待的探测，由它处理完后归还
+                future.set_result((recv_packet, time_received, self._buffer))
+                self._buffer = self._buffers.acquire()
+
+    async def _sendto(self, packet, dest_ip):
+        # 发送缓冲区已满时等待套接字可写后重试
+        while True:
+            try:
+                self.sock.sendto(packet, (dest_ip, 1))
+                return
+            except (BlockingIOError, InterruptedError):
+                # 模板缓冲区可能在等待期间被同一目标的其他探测改写，先复制一份
+                packet = bytes(packet)
+                writable = self.loop.create_future()
+                self.loop.add_writer(self.sock.fileno(), writable.set_result, None)
+                try:
+                    await writable
+                finally:
+                    self.loop.remove_writer(self.sock.fileno())
+
+    async def ping_once(self, dest_ip, template, sequence, timeout):
+        """
+        发送一个回显请求并等待应答。
+
+        :return: 往返时间（毫秒），超时、出错或数据不匹配时返回 None
+        """
+        key = (template.packet_id, sequence)
+
+        async with self._semaphore:
+            future = self.loop.create_future()
+            self._pending[key] = (future, packed_address(dest_ip))
+            try:
+                slot = await scheduler.wait_async(dest_ip) if scheduler is not None else None
+                time_sent = time.perf_counter_ns()
+                await self._sendto(template.build(sequence, time_sent), dest_ip)
+                if slot is not None:
+                    scheduler.record_send(slot, time_sent)
+                recv_packet, time_received, buffer = await asyncio.wait_for(future, timeout)
+            except (asyncio.TimeoutError, OSError):
+                return None
+            finally:
+                self._pending.pop(key, None)
+
+        try:
+            ihl = (recv_packet[0] & 0x0F) * 4
+            # 只有数据一致的回显应答才算成功，差错报文视为丢失
+            if recv_packet[ihl] != 0 or recv_packet[ihl + 16:] != template.payload:
+                return None
+            return (time_received - time_sent) / 1e6
+        finally:
+            self._buffers.release(buffer)
+
+    async def ping_host(self, dest_addr, timeout=1, count=4, user_data="Ping", retries=2, interval=1,
+                        on_reply=record_rtt, on_loss=record_loss):
+        """
+        对一个目标执行 count 次 ping，行为与 ping() 一致（超时重试、间隔发送），
+        但每次探测作为独立任务进行，不会阻塞其他目标。
+
+        结果默认记录在 rtt_data 中该目标的 RttStats 里。
+
+        :param on_reply: 探测成功时调用 on_reply(dest_addr, rtt, sequence)
+        :param on_loss: 探测（包括重试）全部超时时调用 on_loss(dest_addr, sequence)
+        :return: 目标 IP；无法解析时返回 None
+        """
+        try:
+            dest_ip = await asyncio.wrap_future(resolver.resolve_async(dest_addr))
+        except socket.gaierror:
+            return None
+
+        template = create_icmp_template(allocate_packet_id(), user_data)
+        sequences = itertools.count(1)
+
+        async def probe():
+            for _ in range(retries + 1):
+                sequence = next(sequences) & 0xFFFF
+                delay = await self.ping_once(dest_ip, template, sequence, timeout)
+                if delay is not None:
+                    on_reply(dest_addr, delay, sequence)
+                    return
+            on_loss(dest_addr, sequence)
+
+        tasks = []
+        for i in range(count):
+            if stop_flag:
+                break
+            if i:
+                await asyncio.sleep(interval)
+            tasks.append(asyncio.ensure_future(probe()))
+
+        await asyncio.gather(*tasks)
+        return dest_ip
+
+    def close(self):
+        self.loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+
+
+async def _async_ping_all(addresses, timeout, count, user_data, retries, interval, concurrency):
+    pinger = AsyncPinger(concurrency, reply_buffer_size(user_data.encode('utf-8')))
+
+    async def run(dest_addr):
+        dest_ip = await pinger.ping_host(dest_addr, timeout, count, user_data, retries, interval)
+        thread_color = random.choice(thread_colors)
+        if dest_ip is None:
+            console(thread_color + f"无法解析主机 {dest_addr}。请检查地址后重试。", VERBOSITY_QUIET)
+            emit('error', dest_addr, error='unresolved')
+        else:
+            print_statistics(dest_addr, get_rtt_stats(dest_addr), thread_color)
+
+    try:
+        await asyncio.gather(*(run(addr) for addr in addresses))
+    finally:
+        pinger.close()
+
+
+def async_ping_multiple_addresses(addresses, timeout=1, count=4, user_data="Ping", retries=2, interval=1,
+                                  concurrency=1000):
+    """
+    使用 asyncio 引擎并发 ping 多个地址，每个目标完成后输出与 ping() 相同的统计结果。
+
+    :param addresses: 目标主机名或IP地址列表
+    :param timeout: 每次ping的超时时间
+    :param count: 每个目标发送ping请求的次数
+    :param user_data: 用户自定义的字符串，将作为数据部分发送
+    :param retries: 超时后的重试次数
+    :param interval: 同一目标两次ping之间的间隔（秒）
+    :param concurrency: 同时在途的最大探测数
+    """
+    asyncio.run(_async_ping_all(addresses, timeout, count, user_data, retries, interval, concurrency))
+    print_schedule_report()
+
+
+# 多进程模式下子进程发给父进程的探测结果：目标序号、序列号、状态、RTT（毫秒）
+SHARD_RECORD = struct.Struct('<IHBf')
+SHARD_REPLY, SHARD_LOSS, SHARD_UNRESOLVED, SHARD_DONE = range(4)
+
+# 子进程积累到这么多字节，或距上次发送超过 SHARD_FLUSH_INTERVAL 秒，就把结果发给父进程
+SHARD_BATCH_BYTES = 4096
+SHARD_FLUSH_INTERVAL = 0.1
+
+
+def _shard_packet_ids(shard_index, processes):
+    """
+    为一个分片生成ICMP标识符：所有标识符模 processes 都等于 shard_index，
+    各进程的标识符互不重复，内核可以按标识符把应答只交给对应的进程。
+    """
+    per_shard = 0x10000 // processes
+    start = random.randrange(per_shard)
+    for i in itertools.count(start):
+        yield (i % per_shard) * processes + shard_index
+
+
+def _shard_worker(conn, shard_index, processes, shard, timeout, count, user_data, retries, interval, concurrency,
+                  rate, per_host_rate, burst):
+    """
+    子进程入口：用 asyncio 引擎 ping 分到的目标，把结果编码成 SHARD_RECORD 批量写入管道。
+
+    :param conn: 只写的管道连接
+    :param shard: [(目标序号, 目标地址), ...]
+    :param rate: 全局速率上限，按进程数平分；None 表示不限制
+    """
+    global headless, scheduler, _packet_ids
+    headless = True  # 子进程不输出，统计和绘图都由父进程完成
+    _packet_ids = _shard_packet_ids(shard_index, processes)
+    if rate or per_host_rate:
+        scheduler = ProbeScheduler(rate / processes if rate else None, per_host_rate, burst)
+
+    try:
+        asyncio.run(_shard_main(conn, shard_index, processes, shard, timeout, count, user_data, retries, interval,
+                                concurrency))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+
+
+async def _shard_main(conn, shard_index, processes, shard, timeout, count, user_data, retries, interval, concurrency):
+    pinger = AsyncPinger(concurrency, reply_buffer_size(user_data.encode('utf-8')))
+    # 只接收本进程标识符的回显应答，其他进程的应答由内核直接丢弃
+    attach_filter(pinger.sock, echo_reply_filter(processes, shard_index))
+    batch = bytearray()
+
+    def flush():
+        if batch:
+            conn.send_bytes(batch)
+            batch.clear()
+
+    def send(index, sequence, status, rtt=0.0):
+        batch.extend(SHARD_RECORD.pack(index, sequence, status, rtt))
+        if len(batch) >= SHARD_BATCH_BYTES:
+            flush()
+
+    async def flush_periodically():
+        while True:
+            await asyncio.sleep(SHARD_FLUSH_INTERVAL)
+            flush()
+
+    async def run(index, dest_addr):
+        dest_ip = await pinger.ping_host(
+            dest_addr, timeout, count, user_data, retries, interval,
+            on_reply=lambda _, delay, sequence: send(index, sequence, SHARD_REPLY, delay),
+            on_loss=lambda _, sequence: send(index, sequence, SHARD_LOSS))
+        send(index, 0, SHARD_DONE if dest_ip is not None else SHARD_UNRESOLVED)
+
+    flusher = asyncio.ensure_future(flush_periodically())
+    try:
+        await asyncio.gather(*(run(index, addr) for index, addr in shard))
+    finally:
+        flusher.cancel()
+        pinger.close()
+        flush()
+
+
+def sharded_ping_multiple_addresses(addresses, timeout=1, count=4, user_data="Ping", retries=2, interval=1,
+                                    concurrency=1000, processes=None):
+    """
+    把目标列表分片到多个子进程，每个进程使用自己的原始套接字和 asyncio 事件循环，
+    探测、校验和与报文解析不再争用同一个 GIL。子进程把每次探测的结果编码成定长记录
+    批量写入管道，父进程汇总到 rtt_data，输出与其他引擎相同的统计结果并驱动实时绘图。
+
+    :param addresses: 目标主机名或IP地址列表
+    :param timeout: 每次ping的超时时间
+    :param count: 每个目标发送ping请求的次数
+    :param user_data: 用户自定义的字符串，将作为数据部分发送
+    :param retries: 超时后的重试次数
+    :param interval: 同一目标两次ping之间的间隔（秒）
+    :param concurrency: 每个进程同时在途的最大探测数
+    :param processes: 子进程数，默认等于CPU核数
+    """
+    processes = max(1, min(processes or os.cpu_count() or 1, len(addresses)))
+    limits = (scheduler.rate, scheduler.per_destination_rate, scheduler.burst) if scheduler else (None, None, 1)
+
+    # 使用 spawn 启动，避免 fork 复制父进程中正在运行的接收和日志线程的锁状态
+    context = multiprocessing.get_context('spawn')
+    workers = {}
+    for shard_index in range(processes):
+        shard = [(index, addresses[index]) for index in range(shard_index, len(addresses), processes)]
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_shard_worker, daemon=True,
+                                  args=(sender, shard_index, processes, shard, timeout, count, user_data, retries,
+                                        interval, concurrency, *limits))
+        process.start()
+        sender.close()
+        workers[receiver] = process
+
+    try:
+        while workers and not stop_flag:
+            for conn in multiprocessing.connection.wait(list(workers), timeout=0.5):
+                try:
+                    data = conn.recv_bytes()
+                except EOFError:
+                    workers.pop(conn).join()
+                    continue
+
+                for index, sequence, status, rtt in SHARD_RECORD.iter_unpack(data):
+                    dest_addr = addresses[index]
+                    if status == SHARD_REPLY:
+                        record_rtt(dest_addr, rtt, sequence)
+                    elif status == SHARD_LOSS:
+                        record_loss(dest_addr, sequence)
+                    elif status == SHARD_DONE:
+                        print_statistics(dest_addr, get_rtt_stats(dest_addr), random.choice(thread_colors))
+                    else:
+                        console(random.choice(thread_colors) + f"无法解析主机 {dest_addr}。请检查地址后重试。",
+                                VERBOSITY_QUIET)
+                        emit('error', dest_addr, error='unresolved')
+    finally:
+        for process in workers.values():
+            process.terminate()
+            process.join()
+
+
+# 按像素列对一条 RTT 曲线做最小/最大值抽取
+class MinMaxDecimator:
+    """
+    增量地把一条曲线压缩到固定数量的桶里。每个桶覆盖相同数量的探测序号，
+    只保留其中 RTT 最小和最大的两个点；桶数超过像素列数时相邻的桶两两合并。
+    因此无论会话运行多久，绘制的点数都不超过像素列数的两倍，尖峰也不会被抽掉。
+    """
+
+    def __init__(self, columns):
+        """
+        :param columns: 桶的最大数量，一般取坐标区的像素宽度
+        """
+        self.columns = max(1, columns)
+        self.bucket_width = 1
+        self.last_x = 0
+        self.y_max = None
+        self._buckets = []  # [桶序号, 最小点x, 最小点y, 最大点x, 最大点y]
+
+    def add(self, x, y):
+        self.last_x = x
+        self.y_max = y if self.y_max is None else max(self.y_max, y)
+
+        index = x // self.bucket_width
+        if self._buckets and self._buckets[-1][0] == index:
+            bucket = self._buckets[-1]
+            if y < bucket[2]:
+                bucket[1], bucket[2] = x, y
+            if y > bucket[4]:
+                bucket[3], bucket[4] = x, y
+        else:
+            self._buckets.append([index, x, y, x, y])
+            if len(self._buckets) > self.columns:
+                self._merge()
+
+    def _merge(self):
+        # 桶宽加倍，把落入同一个新桶的相邻旧桶合并
+        self.bucket_width *= 2
+        merged = []
+        for index, x_min, y_min, x_max, y_max in self._buckets:
+            index //= 2
+            if merged and merged[-1][0] == index:
+                bucket = merged[-1]
+                if y_min < bucket[2]:
+                    bucket[1], bucket[2] = x_min, y_min
+                if y_max > bucket[4]:
+                    bucket[3], bucket[4] = x_max, y_max
+            else:
+                merged.append([index, x_min, y_min, x_max, y_max])
+        self._buckets = merged
+
+    def points(self):
+        """
+        :return: (横坐标列表, RTT 列表)，每个桶按时间顺序给出最小点和最大点
+        """
+        xs, ys = [], []
+        for _, x_min, y_min, x_max, y_max in self._buckets:
+            if x_min == x_max:
+                xs.append(x_min)
+                ys.append(y_min)
+            elif x_min < x_max:
+                xs += (x_min, x_max)
+                ys += (y_min, y_max)
+            else:
+                xs += (x_max, x_min)
+                ys += (y_max, y_min)
+        return xs, ys
+
 
 # 实时绘图，显示每个地址的 RTT
-# 实时绘图，显示每个地址的 RTT
-def animate(i):
-    plt.cla()  # 清空之前的绘图
-    for addr, rtt_list in rtt_data.items():
-        # 动态生成横坐标从 1 开始，并根据数据长度调整
-        x_values = range(1, len(rtt_list) + 1)
-        plt.plot(x_values, rtt_list, label=f'RTT for {addr}')
+class LivePlot:
+    """
+    增量刷新的实时 RTT 图。每个地址只创建一次 Line2D，之后每帧只用 set_data 更新数据，
+    配合 FuncAnimation 的 blit 只重绘曲线和图例；只有坐标范围或图例变化时才整体重绘。
+    图例也是动画对象：blit 缓存的背景只按坐标范围更新，不包含图例，新增地址的图例项才不会被旧背景覆盖。
+    旧数据经 MinMaxDecimator 按像素列抽取，单帧耗时与会话时长和样本数无关。
+    """
 
-    plt.xlabel('Ping Attempts')
-    plt.ylabel('RTT (ms)')
-    plt.legend(loc='upper right')
-    plt.tight_layout()
+    def __init__(self, ax):
+        self.ax = ax
+        self.lines = {}
+        self.decimators = {}
+        self.legend = None
+        self._columns = int(ax.bbox.width) or 1000
+        ax.set_xlabel('Ping Attempts')
+        ax.set_ylabel('RTT (ms)')
+        ax.set_xlim(1, 10)
+        ax.set_ylim(0, 1)
+
+    def init(self):
+        return self._artists()
+
+    def _artists(self):
+        artists = list(self.lines.values())
+        if self.legend is not None:
+            artists.append(self.legend)
+        return artists
+
+    def update(self, frame):
+        redraw = False
+        x_needed, y_needed = 0, 0
+
+        for addr, stats in list(rtt_data.items()):
+            line = self.lines.get(addr)
+            if line is None:
+                line, = self.ax.plot([], [], label=f'RTT for {addr}', animated=True)
+                self.lines[addr] = line
+                self.decimators[addr] = MinMaxDecimator(self._columns)
+                redraw = True
+            decimator = self.decimators[addr]
+
+            # 只取上一帧之后新增的样本
+            x_values, rtt_list = stats.snapshot()
+            for x, rtt in zip(x_values, rtt_list):
+                if x > decimator.last_x:
+                    decimator.add(x, rtt)
+            line.set_data(*decimator.points())
+
+            x_needed = max(x_needed, decimator.last_x)
+            if decimator.y_max is not None:
+                y_needed = max(y_needed, decimator.y_max)
+
+        # 坐标范围按比例留出余量，避免每帧都要整体重绘
+        x_low, x_high = self.ax.get_xlim()
+        if x_needed > x_high:
+            self.ax.set_xlim(x_low, x_needed * 1.5)
+            redraw = True
+        y_low, y_high = self.ax.get_ylim()
+        if y_needed > y_high:
+            self.ax.set_ylim(y_low, y_needed * 1.5)
+            redraw = True
+
+        if redraw:
+            self.legend = self.ax.legend(handles=list(self.lines.values()), loc='upper right')
+            self.legend.set_animated(True)
+            self.ax.figure.canvas.draw()
+        return self._artists()
 
 
 # 监听窗口关闭事件，终止 ping 操作
@@ -392,6 +1501,22 @@ if __name__ == "__main__":
     parser.add_argument('--count', type=int, default=4, help="发送ping的次数，默认4次")
     parser.add_argument('--data', type=str, default="Ping", help="自定义传输的数据")
     parser.add_argument('--max-threads', type=int, default=5, help="同时允许的最大线程数")
+    parser.add_argument('--interval', type=float, default=None,
+                        help="流水线模式：每隔 INTERVAL 秒发送一次，不等待上一次应答（类似 ping -i）")
+    parser.add_argument('--engine', choices=['threads', 'asyncio', 'processes'], default='threads',
+                        help="并发方式：每个目标一个线程，使用 asyncio 批量引擎，或把目标分片到多个进程")
+    parser.add_argument('--concurrency', type=int, default=1000, help="asyncio 引擎（每个进程）同时在途的最大探测数")
+    parser.add_argument('--processes', type=int, default=None, help="processes 引擎的子进程数，默认等于CPU核数")
+    parser.add_argument('--headless', action='store_true',
+                        help="无界面模式：不打开绘图窗口、不导入 matplotlib 和 colorama，只输出 JSON Lines")
+    parser.add_argument('--output', default='-', help="无界面模式下 JSON Lines 的输出文件，默认 '-' 表示标准输出")
+    parser.add_argument('--rate', type=float, default=None, help="所有目标合计每秒最多发送的探测数，默认不限制")
+    parser.add_argument('--per-host-rate', type=float, default=None, help="每个目标每秒最多发送的探测数，默认不限制")
+    parser.add_argument('--burst', type=int, default=1, help="每个目标允许连续发送的探测数（令牌桶容量），默认1")
+    parser.add_argument('--store', default=None,
+                        help="把每次探测的结果追加到该目录下的二进制时间序列库（common/tsstore.py），便于长期查询")
+    parser.add_argument('-v', '--verbose', action='store_true', help="输出每个数据包的调试信息（十六进制内容、数据校验）")
+    parser.add_argument('-q', '--quiet', action='store_true', help="只输出每个目标的统计结果")
 
     args = parser.parse_args()
 
@@ -399,13 +1524,62 @@ if __name__ == "__main__":
     # ping(args.host, args.timeout, args.count, args.data)
     # ping_multiple_addresses(args.hosts, args.timeout, args.count)
 
+    if args.engine == 'asyncio':
+        interval = args.interval if args.interval is not None else 1
+        run = lambda: async_ping_multiple_addresses(args.hosts, args.timeout, args.count, args.data,
+                                                    interval=interval, concurrency=args.concurrency)
+    elif args.engine == 'processes':
+        interval = args.interval if args.interval is not None else 1
+        run = lambda: sharded_ping_multiple_addresses(args.hosts, args.timeout, args.count, args.data,
+                                                      interval=interval, concurrency=args.concurrency,
+                                                      processes=args.processes)
+    else:
+        run = lambda: ping_multiple_addresses(args.hosts, args.timeout, args.count, args.max_threads,
+                                              user_data=args.data, interval=args.interval)
+
+    if args.rate or args.per_host_rate:
+        scheduler = ProbeScheduler(args.rate, args.per_host_rate, args.burst)
+
+    if args.quiet:
+        verbosity = VERBOSITY_QUIET
+    elif args.verbose:
+        verbosity = VERBOSITY_DEBUG
+
+    if args.store:
+        # 只在需要时导入，不使用 --store 时启动更快
+        from common.tsstore import TimeSeriesStore
+        store = TimeSeriesStore(args.store)
+        atexit.register(store.close)
+
+    if args.headless:
+        headless = True
+        output = sys.stdout if args.output == '-' else open(args.output, 'a', encoding='utf-8')
+        start_logging(jsonl_stream=output)
+        try:
+            run()
+        except KeyboardInterrupt:
+            stop_flag = True
+        finally:
+            stop_logging()
+            if output is not sys.stdout:
+                output.close()
+        sys.exit(0)
+
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
+
+    init_colors()
+    start_logging()
+
     # 创建绘图
-    fig = plt.figure()
+    fig, ax = plt.subplots()
     fig.canvas.mpl_connect('close_event', on_close)  # 监听窗口关闭事件
-    ani = animation.FuncAnimation(fig, animate, interval=1000)
+    live_plot = LivePlot(ax)
+    ani = animation.FuncAnimation(fig, live_plot.update, init_func=live_plot.init, interval=1000,
+                                  blit=True, cache_frame_data=False)
 
     # 启动 ping
-    threading.Thread(target=ping_multiple_addresses, args=(args.hosts, args.timeout, args.count, args.max_threads)).start()
+    threading.Thread(target=run).start()
 
     # 显示实时图表
     plt.show()
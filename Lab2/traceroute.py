@@ -18,59 +18,65 @@ import socket
 import struct
 import time
 import os
+import sys
 import argparse
-import threading
 import json
 import csv
-import matplotlib.pyplot as plt
+import itertools
+import random
+import collections
+import concurrent.futures
+import threading
+import logging
 
 from _socket import IPPROTO_IP, IP_TTL
 
-
-from colorama import Fore, Style, init
-from queue import Queue
-from tqdm import tqdm
+# The lab scripts run from their own directory; make the shared helpers importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.buffers import BufferPool
+from common.checksum import calculate_checksum
+from common.hoplog import FORMATS as HOP_LOG_FORMATS, open_writer
+from common.resolver import resolver
+from common.stats import RttStats
+from common.timestamps import enable_rx_timestamps, recv_into_timestamped
+from common.transport import RawSocketTransport
 
 
 
-# Initialization of colorama
-init(autoreset=True)
+# Terminal colors: empty strings until init_colors() loads colorama, so importing this module prints no escape codes
+class _NoColor:
+    def __getattr__(self, name):
+        return ''
 
 
+Fore = Style = _NoColor()
 
 
-# Helper function to calculate checksum
-def calculate_checksum(source_string):
-    count_to = (len(source_string) // 2) * 2
-    checksum = 0
-    count = 0
+def init_colors():
+    """
+    Load colorama and enable colored output. Only the command line calls this;
+    matplotlib and tqdm are likewise imported only when plotting or showing
+    progress, so the module itself imports quickly.
+    """
+    global Fore, Style
+    from colorama import Fore, Style, init
 
-    while count < count_to:
-        # val = (source_string[count]) << 8 + source_string[count + 1]  # 小端序，高字节在后，低字节在前
-        val = source_string[count + 1] * 256 + source_string[count] # 大端序，高字节在前，低字节在后
-        checksum = checksum + val
-        checksum = checksum & 0xffffffff
-        count += 2
+    # Initialization of colorama
+    init(autoreset=True)
 
-    if count_to < len(source_string):
-        checksum += (source_string[len(source_string) - 1])
-        checksum = checksum & 0xffffffff
 
-    checksum = (checksum >> 16) + (checksum & 0xffff)
-    checksum += (checksum >> 16)
-    result = ~checksum
-    result = result & 0xffff
-    result = result >> 8 | (result << 8 & 0xff00)
-    return result
+# One hop of a trace, as yielded by trace_hops and iter_trace
+Hop = collections.namedtuple('Hop', ['ttl', 'address', 'rtts'])
+Hop.__doc__ = """TTL, address that answered (None if none did) and RTTs of the answers in ms."""
 
 
 # Create ICMP Echo Request packet
-def create_icmp_packet(packet_id):
+def create_icmp_packet(packet_id, sequence=1):
     # Hearder is type(8), code(0), checksum,
-    header = struct.pack('!BBHHH', 8, 0, 0, packet_id, 1)
+    header = struct.pack('!BBHHH', 8, 0, 0, packet_id, sequence)
     data = struct.pack('d', time.time())
     checksum = calculate_checksum(header + data)
-    header = struct.pack('!BBHHH', 8, 0, checksum, packet_id, 1)
+    header = struct.pack('!BBHHH', 8, 0, checksum, packet_id, sequence)
     return header + data
 
 
@@ -94,286 +100,844 @@ def create_udp_packet():
     return header + data
 
 
-# Send ICMP packet and return the time it was sent
-def send_packet(sock, dest_addr, packet_id, ttl, dst_port, use_icmp=True):
-    try:
-        # sock.setsockopt(socket.SOL_IP, socket.IP_TTL, ttl) # 不同操作系统，PC可能会出错，【 win Error 10022 】
+# Creates the probe sockets; replace with common.simnet.SimulatedNetwork to run without a network
+transport = RawSocketTransport()
 
-        sock.setsockopt(IPPROTO_IP, IP_TTL, struct.pack("I",ttl))
 
-        if use_icmp:
-            packet = create_icmp_packet(packet_id)
-        else:
-            packet = create_udp_packet()
+# Receive buffers shared by all traces; packets are parsed in place through memoryview
+receive_buffers = BufferPool(1024)
 
-        time_sent = time.time()
 
-        # 用法： sock.sendto(data, (address, port))
+# Destination port of the first UDP probe of a trace; each probe uses the next port
+UDP_BASE_PORT = 33434
 
-        # 1 if use_icmp：当使用 ICMP 协议时，端口号设为 1，这是一个虚拟端口，因 ICMP 协议不需要实际的传输层端口
-        # else dst_port：当使用 UDP 协议时，必须为目标地址提供有效的 UDP 端口号（即 dst_port）。
+# Probe numbers wrap around after this many probes, keeping UDP_BASE_PORT + number a valid port
+PROBE_NUMBERS = 16384
 
-        # sock.sendto(packet, (dest_addr, 1 if use_icmp else 33434))
-        sock.sendto(packet, (dest_addr, 1 if use_icmp else dst_port))
-        #
-        # print(f"Sent packet: {packet} to {dest_addr} with TTL={ttl}")
-        return time_sent
-    except OSError as e:
-        print(f"Send packet failed with error: {e}")
-        return None
+# Going backward, a hop is waited for at most this many times the largest RTT already seen above it,
+# like the NEAR factor of traceroute -w: nearer hops answer sooner, so a silent one need not cost a full timeout
+NEAR_TIMEOUT_FACTOR = 10
 
+# Errors of the probing code; without a configured handler, warnings still reach stderr
+logger = logging.getLogger('traceroute')
 
-# Receive ICMP response and measure RTT
-def receive_packet(sock, packet_id, timeout, send_time, use_icmp):
-    sock.settimeout(timeout)
+# ICMP identifiers of traces, so concurrent traces in one process tell their replies apart; a random start keeps
+# traceroute processes with nearby PIDs from using the same identifiers
+def _new_trace_ids():
+    return itertools.count(random.getrandbits(16))
 
-    try:
-        # start_time = time.time()
-        recv_packet, addr = sock.recvfrom(1024)
-        # [到这里会直接抛出异常，socket_timeout, 即丢包？]
-        # [WinError 10052]
-        # print(f"Received packet from {addr}")
 
+_trace_ids = _new_trace_ids()
 
-        # 记录包的源端口和目的端口
-        src_port, dst_port = struct.unpack('!HH', recv_packet[:4])
-        # 如果端口号为 53，表明是 DNS 数据包，忽略该包
-        if src_port == 53 or dst_port == 53:
-            print(f"Received a DNS packet from {addr}, ignoring...")
-            return None, None
 
-        time_received = time.time()
+# Identify the probe an ICMP message answers
+def parse_probe_reply(packet):
+    """
+    Echo Replies carry the probe's identifier and sequence number themselves.
+    Time Exceeded and Destination Unreachable quote the probe's IP header (its
+    length taken from its own IHL field) followed by the first 8 bytes of the
+    probe's ICMP or UDP header.
 
-        icmp_header = recv_packet[20:28]
-        icmp_type, code, checksum, recv_id, seq = struct.unpack('!BBHHH', icmp_header)
+    :param packet: received IPv4 packet
+    :return: (icmp_type, code, protocol, first, second, destination) or None if it answers no probe;
+             first and second are the identifier and sequence number of an ICMP probe or the source
+             and destination port of a UDP probe, destination is the probe's destination address
+             (4 bytes, None for an Echo Reply)
+    """
+    if len(packet) < 20:
+        return None
+    offset = (packet[0] & 0x0F) * 4
+    if len(packet) < offset + 8:
+        return None
+    icmp_type, code = packet[offset], packet[offset + 1]
+    if icmp_type == 0:
+        identifier, sequence = struct.unpack_from('!HH', packet, offset + 4)
+        return icmp_type, code, socket.IPPROTO_ICMP, identifier, sequence, None
+    if icmp_type not in (3, 11):
+        return None
 
-        # if recv_id == packet_id and (icmp_type == 0 or icmp_type == 11):
-        #     return addr[0], (time.time() - start_time) * 1000
-        # return None, None
+    inner = offset + 8
+    if len(packet) < inner + 20:
+        return None
+    protocol = packet[inner + 9]
+    destination = bytes(packet[inner + 16:inner + 20])
+    quoted = inner + (packet[inner] & 0x0F) * 4
+    if len(packet) < quoted + 8:
+        return None
+    if protocol == socket.IPPROTO_ICMP and packet[quoted] == 8:
+        first, second = struct.unpack_from('!HH', packet, quoted + 4)
+    elif protocol == socket.IPPROTO_UDP:
+        first, second = struct.unpack_from('!HH', packet, quoted)
+    else:
+        return None
+    return icmp_type, code, protocol, first, second, destination
+
+
+# The sockets of one trace
+class ProbeSocket:
+    """
+    Every probe of a trace leaves from the same socket and every reply is
+    read from the same raw ICMP socket (the sending socket itself for ICMP
+    probes), so no socket is created per hop or per retry. Probes are
+    numbered: ICMP probes are Echo Requests with the trace's identifier and
+    the probe number as sequence number, UDP probes go to port
+    ``UDP_BASE_PORT`` + probe number. Replies are matched to probes through
+    ``parse_probe_reply``. Numbers wrap around after ``PROBE_NUMBERS``
+    probes, so a socket can be used for as long as a trace runs.
+    """
+
+    def __init__(self, dest_ip, use_icmp=True, send_interval=0):
+        """
+        :param send_interval: minimum time between two probes in seconds
+        """
+        self.dest_ip = dest_ip
+        self.use_icmp = use_icmp
+        self.send_interval_ns = int(send_interval * 1e9)
+        self.destination = socket.inet_aton(dest_ip)
+        self.probes = {}  # probe number -> (ttl, send time in ns)
+        self.sent = 0
+        self.last_send = 0
+
+        self.recv_sock = transport.icmp_socket()
+        self.send_sock = self.recv_sock if use_icmp else transport.udp_socket()
+        self.buffer = receive_buffers.acquire()
         if use_icmp:
-            if icmp_type == 0 and recv_id == packet_id:
-                # If it's ICMP Echo Reply and ID matches, return RTT and address
-                return addr[0], (time_received - send_time) * 1000
-            elif icmp_type == 11:
-                # If it's TTL Exceeded message, handle without ID check
-                return addr[0], (time_received - send_time) * 1000
-            elif icmp_type == 3:
-                # Destination Unreachable
-                if code == 3:
-                    # Port unreachable (most common case for traceroute using UDP)
-                    return addr[0], (time_received - send_time) * 1000
-                else:
-                    # print(f"ICMP Destination Unreachable received, code: {code}")
-                    print(Fore.RED + f"ICMP Unreachable   ", end='')
-                    return None, None
+            self.packet_id = next(_trace_ids) & 0xFFFF
+        else:
+            self.send_sock.bind(("", 0))
+            self.packet_id = self.send_sock.getsockname()[1]
+        self.kernel_timestamps = enable_rx_timestamps(self.recv_sock)
+
+    def ready_at(self):
+        """
+        :return: perf_counter_ns time from which the next probe may be sent
+        """
+        return self.last_send + self.send_interval_ns
+
+    def send(self, ttl):
+        """
+        Send a probe, waiting for ``ready_at()`` first. Callers that have replies
+        to read should read them until then instead.
+
+        :return: the probe number, or None if the probe could not be sent
+        """
+        delay = self.ready_at() - time.perf_counter_ns()
+        if delay > 0:
+            time.sleep(delay / 1e9)
+
+        number = self.sent % PROBE_NUMBERS
+        self.sent += 1
+        if self.use_icmp:
+            packet, address = create_icmp_packet(self.packet_id, number), (self.dest_ip, 1)
+        else:
+            packet, address = create_udp_packet(), (self.dest_ip, UDP_BASE_PORT + number)
+        # sock.setsockopt(socket.SOL_IP, socket.IP_TTL, ttl) # 不同操作系统，PC可能会出错，【 win Error 10022 】
+        self.send_sock.setsockopt(IPPROTO_IP, IP_TTL, struct.pack("I", ttl))
+        self.last_send = time.perf_counter_ns()
+        self.probes[number] = (ttl, self.last_send)
+        try:
+            self.send_sock.sendto(packet, address)
+        except OSError as e:
+            logger.warning("Send packet failed with error: %s", e)
+            return None
+        return number
+
+    def receive(self, deadline):
+        """
+        Wait for the next reply to one of this trace's probes.
+
+        :param deadline: perf_counter_ns time to give up at
+        :return: (probe number, responder address, RTT in ms, icmp_type, code), or None at the deadline
+        """
+        buffer = self.buffer
+        while True:
+            remaining = deadline - time.perf_counter_ns()
+            if remaining <= 0:
+                return None
+            self.recv_sock.settimeout(remaining / 1e9)
+            try:
+                nbytes, addr, time_received = recv_into_timestamped(self.recv_sock, buffer, self.kernel_timestamps)
+            except socket.timeout:
+                return None
+
+            reply = parse_probe_reply(memoryview(buffer)[:nbytes])
+            if reply is None:
+                continue
+            icmp_type, code, protocol, first, second, quoted_destination = reply
+            if protocol != (socket.IPPROTO_ICMP if self.use_icmp else socket.IPPROTO_UDP) or first != self.packet_id:
+                continue  # another trace's or another program's
+            # An error quotes the probe's destination; an Echo Reply must come from the destination itself
+            if quoted_destination is None:
+                if addr[0] != self.dest_ip:
+                    continue
+            elif quoted_destination != self.destination:
+                continue
+            number = second if self.use_icmp else second - UDP_BASE_PORT
+            if number not in self.probes:
+                continue
+            ttl, time_sent = self.probes[number]
+            return number, addr[0], (time_received - time_sent) / 1e6, icmp_type, code
+
+    def close(self):
+        receive_buffers.release(self.buffer)
+        if self.send_sock is not self.recv_sock:
+            self.send_sock.close()
+        self.recv_sock.close()
+
+
+# Probe every TTL at once from a single socket
+def trace_hops(dest_ip, max_hops=30, timeout=1, retries=3, use_icmp=True, round_interval=None, send_interval=0,
+               probe_socket=None, first_ttl=1):
+    """
+    Probe all TTLs at once from one ``ProbeSocket``, yielding every hop as
+    soon as it resolves.
+
+    The first round sends one probe to every TTL back to back. Each further
+    round (``retries`` in total) follows ``round_interval`` seconds later, or
+    right away once the destination has answered. The smallest TTL at which
+    the destination answered ends the trace: probes above it are no longer
+    sent or waited for. A hop resolves when every probe sent to it has been
+    answered or has timed out, so on a responsive path the trace finishes
+    about one RTT after the destination first answers.
+
+    :param round_interval: seconds between rounds until the destination answers, ``timeout / retries`` by default
+    :param send_interval: minimum time between two probes in seconds
+    :param probe_socket: ``ProbeSocket`` to probe from, kept open afterwards; a new one by default
+    :param first_ttl: lowest TTL to probe
+    :return: iterator of ``Hop`` (ttl, address or None, [rtt, ...]) in TTL order, RTTs in ms, ending at the destination
+    """
+    if round_interval is None:
+        round_interval = timeout / max(1, retries)
+    timeout_ns = int(timeout * 1e9)
+
+    own_socket = probe_socket is None
+    if own_socket:
+        probe_socket = ProbeSocket(dest_ip, use_icmp, send_interval)
+    probes = probe_socket.probes
+    try:
+        pending = {}  # probe number -> deadline in ns, for probes neither answered nor timed out
+        waiting = [0] * (max_hops + 2)  # ttl -> number of pending probes
+        hops = {}  # ttl -> (address, [rtt, ...])
+        horizon = max_hops  # highest TTL still probed: the destination's once it answered
+        reached = False
+        rounds = 0
+        next_round = 0
+        next_ttl = first_ttl
+        unsent = []  # TTLs of the current round still to be sent, highest first
+
+        while next_ttl <= horizon:
+            now = time.perf_counter_ns()
+            if not unsent and rounds < retries and (now >= next_round or reached):
+                unsent = list(range(horizon, first_ttl - 1, -1))
+                rounds += 1
+                next_round = now + int(round_interval * 1e9)
+            if unsent and now >= probe_socket.ready_at():
+                ttl = unsent.pop()
+                number = probe_socket.send(ttl)
+                if number is not None:
+                    pending[number] = probes[number][1] + timeout_ns
+                    waiting[ttl] += 1
+                continue
+
+            for number in [number for number, deadline in pending.items() if deadline <= now]:
+                del pending[number]
+                waiting[probes[number][0]] -= 1
+
+            # Hand out the hops that can no longer change, in TTL order
+            while rounds == retries and not unsent and next_ttl <= horizon and not waiting[next_ttl]:
+                addr, rtt_list = hops.get(next_ttl, (None, []))
+                yield Hop(next_ttl, addr, rtt_list)
+                next_ttl += 1
+            if next_ttl > horizon:
+                break
+
+            wake = min(pending.values(), default=now + timeout_ns)
+            if unsent:
+                wake = min(wake, probe_socket.ready_at())
+            elif rounds < retries:
+                wake = min(wake, next_round)
+            reply = probe_socket.receive(wake)
+            if reply is None:
+                continue
+            number, addr, rtt, icmp_type, code = reply
+            if number not in pending or (icmp_type == 3 and code != 3):
+                continue  # a duplicate, too late, cancelled, or unreachable for another reason
+
+            del pending[number]
+            ttl = probes[number][0]
+            waiting[ttl] -= 1
+            hops.setdefault(ttl, (addr, []))[1].append(rtt)
+
+            if addr == dest_ip and (not reached or ttl < horizon):
+                # The destination is ttl hops away: cancel everything above it
+                reached = True
+                horizon = ttl
+                for number in [number for number in pending if probes[number][0] > horizon]:
+                    del pending[number]
+                unsent = [ttl for ttl in unsent if ttl <= horizon]
+    finally:
+        if own_socket:
+            probe_socket.close()
+
+
+def parallel_trace(dest_ip, max_hops=30, timeout=1, retries=3, use_icmp=True, send_interval=0):
+    """
+    :return: {ttl: (address, [rtt, ...])} for every TTL up to the destination that answered, RTTs in ms
+    """
+    hops = trace_hops(dest_ip, max_hops, timeout, retries, use_icmp, send_interval=send_interval)
+    return {ttl: (addr, rtt_list) for ttl, addr, rtt_list in hops if addr}
+
+
+# Hops already traced in a batch, shared by all of its destinations
+class HopCache:
+    """
+    The stop set of a Doubletree-style batch trace: every (address, TTL) at
+    which some trace of the batch got an answer, with the hops that trace
+    found below it. Paths that share an interface at the same TTL share
+    everything before it, so a trace probing backward can stop there and
+    copy the rest.
+    """
+
+    def __init__(self):
+        self._paths = {}  # (address, ttl) -> [(ttl, address or None, [rtt, ...]), ...] of TTLs 1 to ttl - 1
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def below(self, addr, ttl):
+        """
+        :return: the hops below ``addr`` answering at ``ttl``, or None if it is not known
+        """
+        with self._lock:
+            hops = self._paths.get((addr, ttl))
+            if hops is not None:
+                self.hits += 1
+            return hops
+
+    def add(self, path):
+        """
+        :param path: [(ttl, address or None, [rtt, ...]), ...] of a complete trace, from TTL 1
+        """
+        with self._lock:
+            for index, (ttl, addr, rtt_list) in enumerate(path):
+                if addr:
+                    self._paths.setdefault((addr, ttl), path[:index])
+
+
+# Trace one destination of a batch, reusing the hops other destinations already found
+def doubletree_trace(dest_ip, hop_cache, start_ttl=8, max_hops=30, timeout=1, retries=3, use_icmp=True,
+                     send_interval=0, backward_window=1):
+    """
+    Probe forward from ``start_ttl`` to the destination, all TTLs at once as in
+    ``trace_hops``, then backward toward the source until any answering hop
+    found so far is in ``hop_cache``; the hops below it are taken from the
+    cache, including those that did not answer this trace. Going backward,
+    ``backward_window`` TTLs are probed at once and waited for at most
+    ``NEAR_TIMEOUT_FACTOR`` times the largest RTT seen so far, so a silent hop
+    costs a fraction of ``timeout`` once per window rather than a full
+    ``timeout`` per TTL.
+
+    :return: ([(ttl, address or None, [rtt, ...]), ...] from TTL 1 to the destination, number of probes sent)
+    """
+    start_ttl = max(1, min(start_ttl, max_hops))
+    probe_socket = ProbeSocket(dest_ip, use_icmp, send_interval)
+    try:
+        path = list(trace_hops(dest_ip, max_hops, timeout, retries, use_icmp, probe_socket=probe_socket,
+                               first_ttl=start_ttl))
+        while path[0][0] > 1:
+            # The lowest hop with a cached path below it ends the trace; silent hops are skipped over
+            below = None
+            for index, (ttl, addr, rtt_list) in enumerate(path):
+                below = hop_cache.below(addr, ttl) if addr else None
+                if below is not None:
+                    path = below + path[index:]
+                    break
+            if below is not None:
+                break
+
+            # The probes of a window need no spacing: send them all and wait for the answers
+            last = path[0][0] - 1
+            rtts = [rtt for hop in path for rtt in hop[2]]
+            wait = min(timeout, NEAR_TIMEOUT_FACTOR * max(rtts) / 1000) if rtts else timeout
+            window = list(trace_hops(dest_ip, last, wait, retries, use_icmp, round_interval=0,
+                                     probe_socket=probe_socket, first_ttl=max(1, last - backward_window + 1)))
+            if window[-1][1] == dest_ip:
+                path = window  # the destination is closer than start_ttl
             else:
-                # Handle other ICMP types
-                # print(f"Unhandled ICMP type: {icmp_type}, code: {code}")
-                print(Fore.RED + f"Unhandled ICMP type: {icmp_type}, code: {code}   ", end='')
-                return None, None
+                path = window + path
+        hop_cache.add(path)
+        return path, probe_socket.sent
+    finally:
+        probe_socket.close()
+
+
+# Trace many destinations concurrently with a shared hop cache
+def batch_traceroute(dest_addrs, max_hops=30, timeout=1, retries=3, use_icmp=True, save_format=None, send_interval=0,
+                     start_ttl=8, workers=8, hop_log=None):
+    """
+    Trace every destination in ``dest_addrs`` with ``doubletree_trace``,
+    ``workers`` at a time, printing and saving each one as it finishes.
+
+    :param hop_log: ``common.hoplog.HopWriter`` every hop is also written to
+
+    :return: {destination: [(ttl, address or None, [rtt, ...]), ...]}
+    """
+    resolver.prefetch(dest_addrs)
+    hop_cache = HopCache()
+    results = {}
+    probes = 0
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix='traceroute') as executor:
+        futures = {}
+        for dest_addr in dest_addrs:
+            try:
+                dest_ip = resolver.resolve(dest_addr)
+            except socket.gaierror:
+                print(f'Cannot resolve {dest_addr}, skipping...')
+                continue
+            futures[executor.submit(doubletree_trace, dest_ip, hop_cache, start_ttl, max_hops, timeout, retries,
+                                    use_icmp, send_interval)] = (dest_addr, dest_ip)
+
+        for future in concurrent.futures.as_completed(futures):
+            dest_addr, dest_ip = futures[future]
+            path, sent = future.result()
+            probes += sent
+            results[dest_addr] = path
+            print(f'\nTraceroute to {dest_ip} ({dest_addr}), {sent} probes')
+            saver = ResultSaver(dest_addr, save_format, retries) if save_format else None
+            for ttl, addr, rtt_list in path:
+                if hop_log:
+                    hop_log.write(dest_ip, ttl, addr, rtt_list)
+                if addr:
+                    print(f"{ttl}: {addr} - RTTs: {rtt_list} (Average RTT: {sum(rtt_list) / len(rtt_list):.3f} ms)")
+                    if saver:
+                        saver.add(ttl, addr, rtt_list)
+                else:
+                    print(f"{ttl}: *")
+            if saver:
+                saver.close()
+
+    print(Fore.YELLOW + f"\n{len(results)} destinations traced in {time.perf_counter() - started:.2f} s with {probes} probes, "
+          f"{hop_cache.hits} stopped at a known hop")
+    return results
+
+
+# Probe a few scattered TTLs at once
+def probe_ttls(probe_socket, ttls, timeout=1, retries=3):
+    """
+    Send one probe to each of ``ttls`` at once, then another round to the
+    ones that did not answer, up to ``retries`` rounds.
+
+    :return: {ttl: (address, rtt)} for the TTLs that answered, RTTs in ms
+    """
+    answers = {}
+    for _ in range(retries):
+        pending = {}  # probe number -> ttl
+        for ttl in ttls:
+            if ttl not in answers:
+                number = probe_socket.send(ttl)
+                if number is not None:
+                    pending[number] = ttl
+        deadline = time.perf_counter_ns() + int(timeout * 1e9)
+        while pending:
+            reply = probe_socket.receive(deadline)
+            if reply is None:
+                break
+            number, addr, rtt, icmp_type, code = reply
+            ttl = pending.pop(number, None)
+            if ttl is not None and not (icmp_type == 3 and code != 3):
+                answers[ttl] = (addr, rtt)
+        if len(answers) == len(ttls):
+            break
+    return answers
+
+
+# Load the path saved by the last run with --save-format json
+def load_previous(dest_addr):
+    """
+    :return: {ttl: address} of the hops that answered, or None if there is no usable result file
+    """
+    try:
+        with open(f"traceroute_results_{dest_addr}.json") as file:
+            data = json.load(file)
+        return {hop["hop"]: hop["ip"] for hop in data["hops"] if hop.get("ip")}
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+# Check a stored path and re-probe only the part that changed
+def incremental_trace(dest_ip, previous, max_hops=30, timeout=1, retries=3, use_icmp=True, send_interval=0,
+                      samples=3):
+    """
+    Probe ``samples`` hops spread over the stored path, the last answering hop
+    before the destination and the destination's TTL, all at once. Hops that
+    still answer from the stored address confirm the path around them; the
+    TTLs between the confirmed samples on either side of a mismatch are traced
+    again with ``trace_hops``, and above the last confirmed sample if the
+    destination moved. Without a stored path that reached the destination,
+    everything is traced.
+
+    :param previous: {ttl: address} as returned by ``load_previous``
+    :return: ([(ttl, address or None, [rtt, ...]), ...] from TTL 1 to the destination, number of probes sent,
+             (first, last) TTL traced again or None if the stored path was confirmed); hops that were neither
+             sampled nor traced again keep their stored address and have no RTTs
+    """
+    probe_socket = ProbeSocket(dest_ip, use_icmp, send_interval)
+    try:
+        dest_ttl = min((ttl for ttl, addr in (previous or {}).items() if addr == dest_ip), default=None)
+        if dest_ttl is None:
+            path = list(trace_hops(dest_ip, max_hops, timeout, retries, use_icmp, probe_socket=probe_socket))
+            return path, probe_socket.sent, (1, path[-1][0] if path else max_hops)
+
+        below = sorted(ttl for ttl in previous if ttl < dest_ttl)
+        sampled = set(below[::max(1, len(below) // samples)][:samples]) | set(below[-1:]) | {dest_ttl}
+        answers = probe_ttls(probe_socket, sorted(sampled), timeout, retries)
+        changed = {ttl for ttl in sampled if answers.get(ttl, (None,))[0] != previous[ttl]}
+
+        stored = [(ttl, previous.get(ttl), [answers[ttl][1]] if ttl in sampled and ttl not in changed else [])
+                  for ttl in range(1, dest_ttl + 1)]
+        if not changed:
+            return stored, probe_socket.sent, None
+
+        first = max((ttl for ttl in sampled if ttl < min(changed) and ttl not in changed), default=0) + 1
+        last = min((ttl for ttl in sampled if ttl > max(changed) and ttl not in changed), default=max_hops + 1) - 1
+        segment = list(trace_hops(dest_ip, last, timeout, retries, use_icmp, probe_socket=probe_socket,
+                                  first_ttl=first))
+        path = stored[:first - 1] + segment
+        if not segment or segment[-1][1] != dest_ip:
+            path += stored[last:]  # the destination is still past the segment
+        return path, probe_socket.sent, (first, last)
+    finally:
+        probe_socket.close()
+
+
+def incremental_traceroute(dest_addr, max_hops=30, timeout=1, retries=3, use_icmp=True, send_interval=0, samples=3,
+                           hop_log=None):
+    """
+    Re-trace ``dest_addr`` with ``incremental_trace`` against the result of the
+    previous run and save the new path as ``traceroute_results_<dest>.json``
+    for the next one.
+    """
+    try:
+        dest_ip = resolver.resolve(dest_addr)
+    except socket.gaierror:
+        print(f'Cannot resolve {dest_addr}, aborting...')
+        return None
+
+    previous = load_previous(dest_addr)
+    path, probes, segment = incremental_trace(dest_ip, previous, max_hops, timeout, retries, use_icmp, send_interval,
+                                              samples)
+    print(f'Traceroute to {dest_ip} ({dest_addr}), {probes} probes')
+    saver = ResultSaver(dest_addr, "json")
+    for ttl, addr, rtt_list in path:
+        if hop_log:
+            hop_log.write(dest_ip, ttl, addr, rtt_list)
+        if not addr:
+            print(f"{ttl}: *")
+            continue
+        saver.add(ttl, addr, rtt_list)
+        if rtt_list:
+            print(f"{ttl}: {addr} - RTTs: {rtt_list} (Average RTT: {sum(rtt_list) / len(rtt_list):.3f} ms)")
         else:
-            # For UDP - expect ICMP Destination Unreachable (Type 3, Code 3)
-            if icmp_type == 3 and code == 3:
-                # ICMP Type 3: Destination Unreachable, Code 3: Port Unreachable
-                return addr[0], (time_received - send_time) * 1000
-            elif icmp_type == 11:
-                # ICMP Type 11: TTL Exceeded
-                return addr[0], (time_received - send_time) * 1000
-            elif icmp_type == 1:
-                # ICMP Redirect message
-                # print(f"ICMP Redirect received from {addr[0]}, redirect code: {code}")
-                print(Fore.RED + f"ICMP Redirect received from {addr[0]}, redirect code: {code}   ", end='')
-                return addr[0], (time_received - send_time) * 1000
+            print(f"{ttl}: {addr} (unchanged)")
+    saver.close()
+
+    if previous is None:
+        print(Fore.YELLOW + "No previous result, traced the whole path.")
+    elif segment is None:
+        print(Fore.GREEN + "Path unchanged.")
+    else:
+        print(Fore.YELLOW + f"Path changed, traced TTL {segment[0]} to {min(segment[1], path[-1][0])} again.")
+    return path
+
+
+# Library entry points: no printing, plotting or files
+def iter_trace(destination, max_hops=30, timeout=1, retries=3, use_icmp=True, send_interval=0):
+    """
+    Trace ``destination``, all TTLs at once, yielding each hop as soon as it resolves.
+
+    :param destination: host name or IPv4 address
+    :return: iterator of ``Hop`` from TTL 1, ending at the destination or at ``max_hops``
+    :raises socket.gaierror: if the name does not resolve
+    """
+    return trace_hops(resolver.resolve(destination), max_hops, timeout, retries, use_icmp,
+                      send_interval=send_interval)
+
+
+def trace(destination, max_hops=30, timeout=1, retries=3, use_icmp=True, send_interval=0):
+    """
+    :return: [``Hop``, ...] of the whole path, see ``iter_trace``
+    """
+    return list(iter_trace(destination, max_hops, timeout, retries, use_icmp, send_interval))
+
+
+# Rounds after a path change during which the changed hop stays flagged in the table
+CHANGE_FLAG_ROUNDS = 10
+
+
+# Per-hop statistics of a continuous trace
+class ContinuousTrace:
+    """
+    State of an mtr-style trace: the current path and, for every hop, an
+    ``RttStats`` with its loss and last/avg/best/worst/stddev RTT. Memory
+    does not grow with the number of rounds.
+
+    A path change is a hop answering from a different address than before,
+    or the destination moving to another TTL. The hop's statistics start
+    over, the row is flagged for ``CHANGE_FLAG_ROUNDS`` rounds and the change
+    is kept in a short log.
+    """
+
+    def __init__(self, dest_ip, max_hops=30):
+        self.dest_ip = dest_ip
+        self.max_hops = max_hops
+        self.rounds = 0
+        self.dest_ttl = None  # TTL at which the destination answered in the last round that reached it
+        self.searching = False  # the path got longer: probe up to max_hops until the destination answers again
+        self.hops = {}  # ttl -> [address, RttStats, round of the last change]
+        self.changes = collections.deque(maxlen=5)  # (time, description)
+
+    def horizon(self):
+        """
+        :return: highest TTL to probe in the next round
+        """
+        if self.searching or self.dest_ttl is None:
+            return self.max_hops
+        return self.dest_ttl
+
+    def update(self, round_hops):
+        """
+        Add one round.
+
+        :param round_hops: [(ttl, address or None, [rtt, ...]), ...] as yielded by ``trace_hops``
+        :return: descriptions of the path changes seen in this round
+        """
+        self.rounds += 1
+        changes = []
+        reached = None
+        for ttl, addr, rtt_list in round_hops:
+            hop = self.hops.get(ttl)
+            if addr is None:
+                if hop:
+                    hop[1].add_loss()
+                continue
+            if hop is None:
+                hop = self.hops[ttl] = [addr, RttStats(window=1), None]
+            elif hop[0] != addr:
+                changes.append(f"hop {ttl}: {hop[0]} -> {addr}")
+                hop[:] = [addr, RttStats(window=1), self.rounds]
+            for rtt in rtt_list:
+                hop[1].add(rtt)
+            if addr == self.dest_ip and reached is None:
+                reached = ttl
+
+        if reached is not None:
+            if self.dest_ttl is not None and reached != self.dest_ttl:
+                changes.append(f"destination now {reached} hops away (was {self.dest_ttl})")
+            self.dest_ttl = reached
+            self.searching = False
+            for ttl in [ttl for ttl in self.hops if ttl > reached]:
+                del self.hops[ttl]
+        elif self.dest_ttl is not None and self.hops.get(self.dest_ttl, [None])[0] not in (None, self.dest_ip):
+            # A router answers where the destination did: it moved further away, look past the old TTL
+            self.searching = True
+
+        for change in changes:
+            self.changes.append((time.strftime('%H:%M:%S'), change))
+        return changes
+
+    def render(self):
+        """
+        :return: the statistics table as text
+        """
+        lines = [f"{'Hop':>3}  {'Host':<40} {'Loss%':>6} {'Snt':>5} {'Last':>8} {'Avg':>8} {'Best':>8} "
+                 f"{'Wrst':>8} {'StDev':>8}"]
+        for ttl in range(1, max(self.hops, default=0) + 1):
+            if ttl not in self.hops:
+                lines.append(f"{ttl:>3}. {'???':<40}")
+                continue
+            addr, stats, changed = self.hops[ttl]
+            hostname = resolver.reverse(addr, timeout=0)
+            host = f"{hostname} ({addr})" if hostname and hostname != addr else addr
+            flagged = changed is not None and self.rounds - changed < CHANGE_FLAG_ROUNDS
+            line = (f"{ttl:>3}.{'!' if flagged else ' '}{host[:40]:<40} {stats.loss:>6.1f} {stats.sent:>5} "
+                    f"{stats.last or 0:>8.2f} {stats.mean:>8.2f} {stats.min or 0:>8.2f} {stats.max or 0:>8.2f} "
+                    f"{stats.mdev:>8.2f}")
+            lines.append(Fore.YELLOW + line + Style.RESET_ALL if flagged else line)
+        for when, change in self.changes:
+            lines.append(Fore.RED + f"{when} path change: {change}" + Style.RESET_ALL)
+        return "\n".join(lines)
+
+
+# Continuous (mtr-style) traceroute
+def continuous_traceroute(dest_addr, max_hops=30, timeout=1, use_icmp=True, interval=1.0, rounds=0,
+                          send_interval=0):
+    """
+    Probe every hop of the path once per round, ``interval`` seconds apart,
+    and redraw the statistics table in place after each round until
+    ``rounds`` rounds are done (0: until interrupted).
+    """
+    try:
+        dest_ip = resolver.resolve(dest_addr)
+    except socket.gaierror:
+        print(f'Cannot resolve {dest_addr}, aborting...')
+        return None
+
+    trace = ContinuousTrace(dest_ip, max_hops)
+    probe_socket = ProbeSocket(dest_ip, use_icmp, send_interval)
+    interactive = sys.stdout.isatty()
+    try:
+        while not rounds or trace.rounds < rounds:
+            started = time.perf_counter()
+            round_hops = list(trace_hops(dest_ip, trace.horizon(), timeout, 1, use_icmp, probe_socket=probe_socket))
+            for ttl, addr, rtt_list in round_hops:
+                if addr:
+                    resolver.reverse_async(addr)
+            trace.update(round_hops)
+
+            header = f"Traceroute to {dest_ip} ({dest_addr}), round {trace.rounds}"
+            if interactive:
+                # Move to the top left and clear the screen, then draw the table over the previous one
+                print("\x1b[H\x1b[J" + header + "\n\n" + trace.render(), flush=True)
             else:
-                # print(f"Unhandled ICMP type in UDP mode: {icmp_type}, code: {code}")
-                print(Fore.RED + f"Unhandled ICMP type in UDP mode: {icmp_type}, code: {code}   ", end='')
-                return None, None
-# """"""
-# 不需要对TTL exceeded 的消息做严格的 id 判断
-# """
-        # if icmp_type == 0 and recv_id == packet_id:
-        #     # 如果是 ICMP Echo Reply 并且 ID 匹配，则返回 RTT 和地址
-        #     return addr[0], (time.time() - start_time) * 1000
-        # elif icmp_type == 11:
-        #     # 如果是 TTL Exceeded 消息，不需要检查 ID，直接处理
-        #     return addr[0], (time.time() - start_time) * 1000
-        # else:
-        #     # 其他类型的消息，忽略
-        #     return None, None
-
-
-    except socket.timeout:
-        # print(f"Socket timeout")
-        print(Fore.BLUE + f"Socket timeout       ", end='')
-        return None, None
-    except OSError as e:
-        # print(f"OSError occurred: {e}")  # 捕获其他socket错误
-        print(Fore.BLUE + f"OSError occurred: {e}  ", end='')  # 捕获其他socket错误
-        return None, None
-
-
-
-
-# Threaded traceroute function per TTL
-def traceroute_ttl_thread(dest_ip, ttl, retries, timeout, result_queue, use_icmp):
-    rtt_list = []
-    addr = None
-    for retry in range(retries):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_RAW if use_icmp else socket.SOCK_DGRAM, socket.IPPROTO_ICMP if use_icmp else socket.IPPROTO_UDP)
-        sock.bind(("", 0))
-
-        dst_port = 40000 + ttl  # Dynamic destination port for UDP
-        packet_id = os.getpid() & 0xFFFF
-        send_time = send_packet(sock, dest_ip, packet_id, ttl, dst_port, use_icmp)
-        addr, rtt = receive_packet(sock, packet_id, timeout, send_time, use_icmp)
-        sock.close()
-
-        if addr:
-            rtt_list.append(rtt)
-            if addr == dest_ip:
-                result_queue.put((ttl, addr, rtt_list))
-                return
-        # Retry logic
-        print(f"Retrying TTL {ttl}, attempt {retry + 1}/{retries}")
-
-    # If no valid response after retries, put None
-    result_queue.put((ttl, addr, rtt_list if addr else None))
+                print(header + "\n" + trace.render() + "\n", flush=True)
+
+            if rounds and trace.rounds >= rounds:
+                break
+            time.sleep(max(0.0, interval - (time.perf_counter() - started)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        probe_socket.close()
+    return trace
 
 
 # Main Traceroute function
-def traceroute(dest_addr, max_hops=30, timeout=1, retries=3, use_icmp=True, async_mode=False, save_format=None):
+def traceroute(dest_addr, max_hops=30, timeout=1, retries=3, use_icmp=True, async_mode=False, save_format=None,
+               send_interval=0, hop_log=None, plot=True):
+    """
+    Trace ``dest_addr`` for the command line: print every hop, save and plot
+    the results. Use ``trace`` or ``iter_trace`` to trace without output.
+
+    :return: [(ttl, address or None, [rtt, ...]), ...] of every TTL probed, in either mode, or None if the
+             name does not resolve
+    """
     try:
-        dest_ip = socket.gethostbyname(dest_addr)
+        dest_ip = resolver.resolve(dest_addr)
         print(f'Traceroute to {dest_ip} ({dest_addr}), {max_hops} hops max')
 
-        result_queue = Queue()
-        threads = []
-
-        # Create threads for each TTL (hop) if async_mode is enabled
+        # Probe every TTL in parallel from one socket if async_mode is enabled
         if async_mode:
             avg_rtts_per_hop = []  # 保存每跳的平均 RTT
 
-            pbar = tqdm(total=max_hops, desc=f"Tracing {dest_addr}")
-            # Create threads for each TTL (hop)
-            for ttl in range(1, max_hops + 1):
-                thread = threading.Thread(target=traceroute_ttl_thread, args=(dest_ip, ttl, retries, timeout, result_queue, use_icmp))
-                threads.append(thread)
-                thread.start()
-
-            # Wait for all threads to complete
-            for thread in threads:
-                thread.join()
-                pbar.update(1)
-
-            pbar.close()
+            saver = ResultSaver(dest_addr, save_format, retries) if save_format else None
 
+            # Hops are printed and saved as soon as they resolve
             results = []
-            while not result_queue.empty():
-                ttl, addr, rtt_list = result_queue.get()
+            for ttl, addr, rtt_list in trace_hops(dest_ip, max_hops, timeout, retries, use_icmp,
+                                                  send_interval=send_interval):
+                results.append((ttl, addr, rtt_list))
+                if hop_log:
+                    hop_log.write(dest_ip, ttl, addr, rtt_list)
                 if addr:
-                    if rtt_list:
-                        avg_rtt = sum(rtt_list) / len(rtt_list)
-                        print(f"{ttl}: {addr} - RTTs: {rtt_list} (Average RTT: {avg_rtt:.3f} ms)")
-                    results.append((ttl, addr, rtt_list))
+                    avg_rtt = sum(rtt_list) / len(rtt_list)
+                    print(f"{ttl}: {addr} - RTTs: {rtt_list} (Average RTT: {avg_rtt:.3f} ms)")
                     avg_rtts_per_hop.append(avg_rtt)
+                    if saver:
+                        saver.add(ttl, addr, rtt_list)
                 else:
                     print(f"{ttl}: *")
 
-            if save_format:
-                save_results(results, dest_addr, save_format)
+            if saver:
+                saver.close()
 
             # plot_traceroute_results(results, dest_addr)
 
-            plot_avg_rtt(avg_rtts_per_hop, dest_addr)
+            if plot:
+                plot_avg_rtt(avg_rtts_per_hop, dest_addr)
         else:
             des_flag = False  # destination stop flag
             results = []
+            from tqdm import tqdm
             pbar = tqdm(total=max_hops, desc=f"Tracing {dest_addr}")
 
-            for ttl in range(1, max_hops + 1):
-                rtt_list = []
-                reached_dest = False
-                print(f'\nTTL {ttl:<2}:   ', end='')
-                InitialAddr = None
-                InitialHostname = None
-
-                for retry in range(retries):
-
-                    # sock = socket.socket(socket.AF_INET, socket.SOCK_RAW,
-                    #                      socket.IPPROTO_ICMP if use_icmp else socket.IPPROTO_UDP)
-
-
-                    if use_icmp:#socket.AF_INET：表示使用 IPv4 地址
-                        # ICMP 使用 RAW socket
-                        #socket.SOCK_RAW：表示使用原始套接字，允许手动构造 IP 包
-                        #socket.IPPROTO_ICMP：表示使用 ICMP 协议，通常用于发送 ICMP 请求
-                        sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
-                    else:
-                        # UDP 使用 Datagram (SOCK_DGRAM)
-                        #socket.SOCK_DGRAM：表示使用DGRAM套接字。UDP 是一种无连接的、不可靠的传输层协议，用于发送数据报文（Datagram），因此数据包不保证到达目的地或按顺序到达。
-                        #socket.IPPROTO_UDP：表示使用 UDP 协议。这一参数规定了套接字所使用的底层传输协议为 UDP。
-                        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-
-                    # "" 表示绑定到本地所有可用的网络接口； 0 表示让系统为这个 socket 动态选择一个可用的本地端口
-                    sock.bind(("", 0))  # 动态分配本地端口
-
-                    # dst_port = 33434 + ttl  # 动态目标端口
-                    dst_port = 40000 + ttl  # 动态目标端口
-
-                    packet_id = os.getpid() & 0xFFFF
-
-                    send_time = send_packet(sock, dest_ip, packet_id, ttl, dst_port, use_icmp)
-
-                    addr, rtt = receive_packet(sock, packet_id, timeout, send_time, use_icmp)
-                    sock.close()
-
-
-                    if addr:
-                        try:
-                            hostname = socket.gethostbyaddr(addr)[0]
-                            # hostname: '10.148.0.1'
-                        except socket.herror:
-                            hostname = addr
-                            InitialHostname = hostname
-                            InitialAddr = addr
+            # One socket for the whole trace; replies are matched to probes by the headers they quote
+            probe_socket = ProbeSocket(dest_ip, use_icmp, send_interval)
+            try:
+                for ttl in range(1, max_hops + 1):
+                    rtt_list = []
+                    reached_dest = False
+                    print(f'\nTTL {ttl:<2}:   ', end='')
+                    InitialAddr = None
+                    InitialHostname = None
+
+                    # The probes of a hop leave back to back, or send_interval apart while replies are read
+                    unsent = retries
+                    pending = {}  # probe number -> deadline in ns
+                    while unsent or pending:
+                        now = time.perf_counter_ns()
+                        for number in [number for number, deadline in pending.items() if deadline <= now]:
+                            del pending[number]
+                            print(Fore.BLUE + f"Socket timeout       ", end='')
+                        if unsent and now >= probe_socket.ready_at():
+                            number = probe_socket.send(ttl)
+                            unsent -= 1
+                            if number is not None:
+                                pending[number] = probe_socket.probes[number][1] + int(timeout * 1e9)
+                            continue
+                        wake = min(pending.values(), default=probe_socket.ready_at())
+                        if unsent:
+                            wake = min(wake, probe_socket.ready_at())
+                        reply = probe_socket.receive(wake)
+                        if reply is None:
+                            continue
+                        number, addr, rtt, icmp_type, code = reply
+                        if number not in pending:
+                            continue  # a late reply to an earlier hop
+                        del pending[number]
+                        if icmp_type == 3 and code != 3:
+                            print(Fore.RED + f"ICMP Unreachable   ", end='')
+                            continue
+
+                        # Reverse lookups run in the background so they never delay the next probe
+                        resolver.reverse_async(addr)
+                        InitialAddr = addr
                         # print(f'{ttl} {hostname} ({addr})  rtt={rtt:.3f} ms')
                         print(f'{rtt:10.3f} ms       ', end='')
                         rtt_list.append(rtt)
 
+                    if InitialAddr is not None:
+                        # Use the host name if the lookup has finished by now, the address otherwise
+                        InitialHostname = resolver.reverse(InitialAddr, timeout=0) or InitialAddr
+                    if InitialHostname == None:
+                        print(Fore.YELLOW + 'None          ', end='')
+                    elif InitialHostname == InitialAddr:
+                        print(Fore.GREEN + f'{InitialAddr}', end='')
+                    else:
+                        print(Fore.GREEN + f'{InitialHostname} ({InitialAddr})', end='')
 
+                    print(Fore.YELLOW + f"    Packet loss rate: {((retries - len(rtt_list)) / retries) * 100:.1f}%")
 
-                # if reached_dest:
-                #     break
-
-                    if retry == retries - 1:
-                        if InitialHostname == None:
-                            print(Fore.YELLOW + 'None          ', end='')
-                        elif InitialHostname == InitialAddr:
-                            print(Fore.GREEN + f'{InitialAddr}', end='')
-                        else:
-                            print(Fore.GREEN + f'{InitialHostname} ({InitialAddr})', end='')
-
-                        print(Fore.YELLOW + f"    Packet loss rate: {((retries - len(rtt_list)) / retries) * 100:.1f}%")
-
-                        if InitialAddr == dest_ip:
+                    if InitialAddr == dest_ip:
 
-                            if des_flag is False:
-                                print(Fore.GREEN + "\nWe've reached our destination!")  # 打印“到达终点了！”的提示
-                                des_flag = True
+                        if des_flag is False:
+                            print(Fore.GREEN + "\nWe've reached our destination!")  # 打印“到达终点了！”的提示
+                            des_flag = True
 
-                                pbar.close()
+                            pbar.close()
 
-                            reached_dest = True
+                        reached_dest = True
 
-                results.append((ttl, addr, rtt_list))
+                    results.append((ttl, InitialAddr, rtt_list))
+                    if hop_log:
+                        hop_log.write(dest_ip, ttl, InitialAddr, rtt_list)
 
-                pbar.update(1)
+                    pbar.update(1)
 
-                time.sleep(0.5)
-
-                if reached_dest and retry == retries - 1:
-                    print(Fore.YELLOW + f"\nTraceroute to {dest_ip} ({dest_addr}) over!")
-                    break
+                    if reached_dest:
+                        print(Fore.YELLOW + f"\nTraceroute to {dest_ip} ({dest_addr}) over!")
+                        break
+            finally:
+                probe_socket.close()
 
             if not reached_dest:
                 print(Fore.RED + f"Failed to reach {dest_addr} ({dest_ip}) within {max_hops} hops.")
@@ -381,21 +945,62 @@ def traceroute(dest_addr, max_hops=30, timeout=1, retries=3, use_icmp=True, asyn
             if save_format:
                 save_results(results, dest_addr, save_format)
 
-            plot_traceroute_results(results, dest_addr)
-
+            if plot:
+                plot_traceroute_results(results, dest_addr)
 
+        return results
     except socket.gaierror:
         print(f'Cannot resolve {dest_addr}, aborting...')
 
 
 
+# Write hops to the results file one by one, so a long trace is saved as it goes
+class ResultSaver:
+    def __init__(self, dest_addr, save_format, rtt_columns=3):
+        self.dest_addr = dest_addr
+        self.save_format = save_format
+        self.path = f"traceroute_results_{dest_addr}.{save_format}"
+        if save_format == "csv":
+            self.file = open(self.path, mode='w', newline='')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(csv_header(rtt_columns))
+            self.file.flush()
+        else:
+            self.data = {"destination": dest_addr, "hops": []}
+            self._write_json()
+
+    def add(self, ttl, addr, rtt_list):
+        if self.save_format == "csv":
+            self.writer.writerow([ttl, addr] + rtt_list)
+            self.file.flush()
+        else:
+            # A JSON document cannot be appended to; replace the file so it is always complete
+            self.data["hops"].append({"hop": ttl, "ip": addr, "rtts": rtt_list})
+            self._write_json()
+
+    def _write_json(self):
+        with open(self.path + ".tmp", "w") as file:
+            json.dump(self.data, file, indent=4)
+        os.replace(self.path + ".tmp", self.path)
+
+    def close(self):
+        if self.save_format == "csv":
+            self.file.close()
+        print(Fore.GREEN + f"Results saved to {self.path}")
+
+
+# One RTT per column
+def csv_header(rtt_columns):
+    return ["Hop", "IP Address"] + [f"RTT {index} (ms)" for index in range(1, rtt_columns + 1)]
+
+
 def save_results(results, dest_addr, save_format):
     if save_format == "csv":
         with open(f"traceroute_results_{dest_addr}.csv", mode='w', newline='') as file:
             writer = csv.writer(file)
-            writer.writerow(["Hop", "IP Address", "RTTs (ms)"])
+            writer.writerow(csv_header(max((len(rtt_list) for _, _, rtt_list in results), default=0)))
             for ttl, addr, rtt_list in results:
-                writer.writerow([ttl, addr, rtt_list])
+                writer.writerow([ttl, addr] + rtt_list)
         print(Fore.GREEN + f"Results saved to traceroute_results_{dest_addr}.csv")
     elif save_format == "json":
         data = {"destination": dest_addr, "hops": []}
@@ -406,6 +1011,8 @@ def save_results(results, dest_addr, save_format):
         print(Fore.GREEN + f"Results saved to traceroute_results_{dest_addr}.json")
 
 def plot_avg_rtt(avg_rtts_per_hop, target_ip):
+    import matplotlib.pyplot as plt
+
     hops = list(range(1, len(avg_rtts_per_hop) + 1))  # 创建跳数列表
     plt.figure(figsize=(10, 5))
     plt.plot(hops, avg_rtts_per_hop, marker='o', linestyle='-', color='b')  # 绘制折线图
@@ -415,6 +1022,8 @@ def plot_avg_rtt(avg_rtts_per_hop, target_ip):
     plt.grid(True)
     plt.show()
 def plot_traceroute_results(results, target_ip):
+    import matplotlib.pyplot as plt
+
     ttls = [res[0] for res in results]
     avg_rtts = [sum(res[2]) / len(res[2]) if res[2] else 0 for res in results]
 
@@ -429,18 +1038,57 @@ def plot_traceroute_results(results, target_ip):
 # Command-line argument parser
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Traceroute tool using ICMP or UDP")
-    parser.add_argument('--destination', help="Destination address or hostname")
+    parser.add_argument('--destination', nargs='+', required=True, help="Destination address or hostname; several are traced as a batch")
     parser.add_argument('--max-hops', type=int, default=30, help="Max number of hops to trace")
     parser.add_argument('--timeout', type=float, default=1, help="Timeout for each hop in seconds")
     parser.add_argument('--retries', type=int, default=3, help="Retries per hop")
     parser.add_argument('--protocol', choices=['ICMP', 'UDP'], default='ICMP', help="Use ICMP or UDP for tracing")
     parser.add_argument('--save-format', choices=['csv', 'json'], help="Save results in CSV or JSON format")
     parser.add_argument('--async-mode', action='store_true', help="Enable asynchronous (multi-threaded) mode")
+    parser.add_argument('--continuous', action='store_true',
+                        help="Keep probing every hop in rounds and show running per-hop statistics (like mtr)")
+    parser.add_argument('--interval', type=float, default=1.0, help="Seconds between rounds in --continuous mode")
+    parser.add_argument('--rounds', type=int, default=0, help="Rounds to run in --continuous mode (default 0: until Ctrl+C)")
+    parser.add_argument('--output', help="Append every hop to this file as it resolves, for all destinations")
+    parser.add_argument('--output-format', choices=HOP_LOG_FORMATS,
+                        help="Format of --output (default: from its extension)")
+    parser.add_argument('--output-max-bytes', type=int, default=0,
+                        help="Roll --output over to <file>.1 once it reaches this size (default 0: never)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Check the path saved by the previous run at a few hops and trace only what changed")
+    parser.add_argument('--samples', type=int, default=3, help="Hops checked by --incremental besides the destination")
+    parser.add_argument('--start-ttl', type=int, default=8,
+                        help="TTL a batch trace starts probing from before going back toward the source")
+    parser.add_argument('--workers', type=int, default=8, help="Destinations traced at the same time in a batch")
+    parser.add_argument('--send-interval', type=float, default=0,
+                        help="Minimum time between two probes in seconds (default 0: back to back, like traceroute -z 0)")
 
     args = parser.parse_args()
 
+    init_colors()
     use_icmp = args.protocol == 'ICMP'
-    traceroute(args.destination, args.max_hops, args.timeout, args.retries, use_icmp, async_mode=args.async_mode, save_format=args.save_format)
+    hop_log = None
+    if args.output:
+        try:
+            hop_log = open_writer(args.output, args.output_format, args.output_max_bytes, rtt_columns=args.retries)
+        except ValueError as e:
+            parser.error(str(e))
+    try:
+        if len(args.destination) > 1:
+            batch_traceroute(args.destination, args.max_hops, args.timeout, args.retries, use_icmp, args.save_format,
+                             args.send_interval, args.start_ttl, args.workers, hop_log)
+        elif args.incremental:
+            incremental_traceroute(args.destination[0], args.max_hops, args.timeout, args.retries, use_icmp,
+                                   args.send_interval, args.samples, hop_log)
+        elif args.continuous:
+            continuous_traceroute(args.destination[0], args.max_hops, args.timeout, use_icmp, args.interval, args.rounds,
+                                  args.send_interval)
+        else:
+            traceroute(args.destination[0], args.max_hops, args.timeout, args.retries, use_icmp, async_mode=args.async_mode, save_format=args.save_format,
+                       send_interval=args.send_interval, hop_log=hop_log)
+    finally:
+        if hop_log:
+            hop_log.close()
 
     #python traceroute.py --destination www.youku.com --max-hops 30 --timeout 5 --retries 3 --protocol ICMP --save-format json （单线程)
     #python traceroute.py --destination www.youku.com --max-hops 30 --timeout 5 --retries 3 --protocol ICMP --save-format json --async-mode(多线程)
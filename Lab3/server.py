@@ -1,5 +1,6 @@
 import socket
 import threading
+import queue
 import os
 import logging
 import mimetypes
@@ -19,7 +20,10 @@ config.read('config.ini')
 # Server configuration
 HOST = config['server'].get('host', '127.0.0.1')
 PORT = config['server'].getint('port', 8080)
-MAX_CONNECTIONS = config['server'].getint('max_connections', 5)
+BACKLOG = config['server'].getint('backlog', 128)  # connections the kernel queues before accept()
+WORKER_THREADS = config['server'].getint('worker_threads', 16)  # connections handled at the same time
+QUEUE_SIZE = config['server'].getint('queue_size', 256)  # accepted connections waiting for a worker
+CLIENT_TIMEOUT = config['server'].getfloat('client_timeout', 10.0)  # seconds a worker waits on a slow client
 max_requests = config['rate_limit'].getint('max_requests', 5)
 window = config['rate_limit'].getint('window_seconds', 60)
 
@@ -33,21 +37,19 @@ logging.basicConfig(level=logging.INFO)
 # Rate limit tracking dictionary
 request_times = defaultdict(list)
 
-# Initialize Tkinter GUI
-root = tk.Tk()
-root.title("Server Dashboard")
-root.geometry("800x500")
-
-# Log display area in GUI
-log_area = scrolledtext.ScrolledText(root, width=90, height=20, state='disabled', wrap='word', font=('Courier', 10))
-log_area.pack(pady=10)
+# Accepted connections waiting for a worker; when it is full new connections get a 503
+connection_queue = queue.Queue(maxsize=QUEUE_SIZE)
 
-# Server status label
-status_label = tk.Label(root, text="Server Status: Stopped", font=("Helvetica", 12, "bold"), fg="red")
-status_label.pack(pady=10)
+# Dashboard widgets, created by setup_ui(); without them messages go to the log
+root = None
+log_area = None
+status_label = None
 
 # Function to log messages to the GUI
 def log_message(message, color="black"):
+    if log_area is None:
+        logging.info(message)
+        return
     log_area.config(state='normal')
     log_area.insert(tk.END, message + "\n", ("color",))
     log_area.tag_config("color", foreground=color)
@@ -157,43 +159,103 @@ def handle_request(tcp_socket, client_address):
     finally:
         tcp_socket.close()
 
+# Worker thread: handle queued connections until it gets None
+def worker():
+    while True:
+        connection = connection_queue.get()
+        if connection is None:
+            return
+        try:
+            handle_request(*connection)
+        except OSError:
+            pass  # the client went away before the error response; keep the worker alive
+
+# Answer a connection the workers cannot take in time
+def reject(client_socket, client_address):
+    try:
+        client_socket.settimeout(1.0)
+        client_socket.sendall("HTTP/1.1 503 Service Unavailable\r\nRetry-After: 1\r\nConnection: close\r\n\r\n".encode())
+    except OSError:
+        pass
+    finally:
+        client_socket.close()
+    log_message(f"{client_address[0]} - Server Busy (503)", "orange")
+
 # Server startup function
 def start_server():
     global is_running
-    status_label.config(text="Server Status: Running", fg="green")
+    set_status("Running", "green")
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     server_socket.bind((HOST, PORT))
-    server_socket.listen(MAX_CONNECTIONS)
-    log_message(f"Server started on {HOST}:{PORT}", "blue")
+    server_socket.listen(BACKLOG)
+    server_socket.settimeout(1.0)
+
+    # A fixed pool of workers instead of a thread per connection
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(WORKER_THREADS)]
+    for thread in workers:
+        thread.start()
+    log_message(f"Server started on {HOST}:{PORT} ({WORKER_THREADS} workers, queue {QUEUE_SIZE}, backlog {BACKLOG})", "blue")
 
     try:
         while is_running:
-            server_socket.settimeout(1.0)
             try:
                 client_socket, client_address = server_socket.accept()
-                threading.Thread(target=handle_request, args=(client_socket, client_address)).start()
             except socket.timeout:
                 continue
+            client_socket.settimeout(CLIENT_TIMEOUT)
+            try:
+                connection_queue.put_nowait((client_socket, client_address))
+            except queue.Full:
+                reject(client_socket, client_address)
     finally:
         server_socket.close()
+        # Queued connections are still served, then the workers exit
+        for _ in workers:
+            connection_queue.put(None)
         log_message("Server stopped", "blue")
 
 # Start and stop server control functions
 def start_server_thread():
+    global is_running
+    is_running = True
     threading.Thread(target=start_server).start()
 
 def stop_server():
     global is_running
     is_running = False
-    status_label.config(text="Server Status: Stopped", fg="red")
+    set_status("Stopped", "red")
     log_message("Server stopping...", "red")
 
-# Buttons to start and stop the server
-start_button = tk.Button(root, text="Start Server", command=start_server_thread, bg="green", fg="white")
-start_button.pack(pady=5)
+# Function to show the server status in the GUI
+def set_status(text, color):
+    if status_label is not None:
+        status_label.config(text=f"Server Status: {text}", fg=color)
+
+# Initialize Tkinter GUI
+def setup_ui():
+    global root, log_area, status_label
+    root = tk.Tk()
+    root.title("Server Dashboard")
+    root.geometry("800x500")
+
+    # Log display area in GUI
+    log_area = scrolledtext.ScrolledText(root, width=90, height=20, state='disabled', wrap='word', font=('Courier', 10))
+    log_area.pack(pady=10)
+
+    # Server status label
+    status_label = tk.Label(root, text="Server Status: Stopped", font=("Helvetica", 12, "bold"), fg="red")
+    status_label.pack(pady=10)
+
+    # Buttons to start and stop the server
+    start_button = tk.Button(root, text="Start Server", command=start_server_thread, bg="green", fg="white")
+    start_button.pack(pady=5)
+
+    stop_button = tk.Button(root, text="Stop Server", command=stop_server, bg="red", fg="white")
+    stop_button.pack(pady=5)
 
-stop_button = tk.Button(root, text="Stop Server", command=stop_server, bg="red", fg="white")
-stop_button.pack(pady=5)
+    # Run the GUI main loop
+    root.mainloop()
 
-# Run the GUI main loop
-root.mainloop()
+if __name__ == "__main__":
+    setup_ui()
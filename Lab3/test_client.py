@@ -97,15 +97,15 @@ def send_request(file_path, output_text):
         output_text.insert(tk.END, response.decode() + "\n\n")
 
 # Function for each test case
-def test_valid_request(output_text):
+def run_valid_request(output_text):
     output_text.insert(tk.END, "Test Case 1: Valid Request\n", 'header')
     send_request(DEFAULT_FILE, output_text)
 
-def test_file_not_found(output_text):
+def run_file_not_found(output_text):
     output_text.insert(tk.END, "Test Case 2: File Not Found\n", 'header')
     send_request('/nonexistent.html', output_text)
 
-def test_permission_denied(output_text):
+def run_permission_denied(output_text):
     output_text.insert(tk.END, "Test Case 3: Permission Denied\n", 'header')
     protected_file = 'protected.html'
     with open(protected_file, 'w') as file:
@@ -114,7 +114,7 @@ def test_permission_denied(output_text):
     send_request('/' + protected_file, output_text)
     os.chmod(protected_file, 0o644)  # Restore permissions
 
-def test_invalid_request_format(output_text):
+def run_invalid_request_format(output_text):
     output_text.insert(tk.END, "Test Case 5: Invalid Request Format\n", 'header')
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as client_socket:
         client_socket.connect((SERVER_HOST, SERVER_PORT))
@@ -123,11 +123,11 @@ def test_invalid_request_format(output_text):
         response = client_socket.recv(1024)
         output_text.insert(tk.END, response.decode() + "\n\n")
 
-def test_path_traversal_attack(output_text):
+def run_path_traversal_attack(output_text):
     output_text.insert(tk.END, "Test Case 6: Path Traversal Attack\n", 'header')
     send_request('/../etc/passwd', output_text)
 
-def test_character_encoding_check(output_text):
+def run_character_encoding_check(output_text):
     output_text.insert(tk.END, "Test Case 7: Character Encoding Check\n", 'header')
     send_request('/' + DEFAULT_FILE, output_text)
 
@@ -149,12 +149,12 @@ def setup_ui():
 
     # Styled buttons
     button_style = {"padx": 10, "pady": 5, "font": ("Helvetica", 10, "bold"), "bg": "#4CAF50", "fg": "#ffffff"}
-    btn_valid_request = tk.Button(button_frame, text="Test Case 1: Valid Request", command=lambda: test_valid_request(output_text), **button_style)
-    btn_file_not_found = tk.Button(button_frame, text="Test Case 2: File Not Found", command=lambda: test_file_not_found(output_text), **button_style)
-    btn_permission_denied = tk.Button(button_frame, text="Test Case 3: Permission Denied", command=lambda: test_permission_denied(output_text), **button_style)
-    btn_invalid_request_format = tk.Button(button_frame, text="Test Case 5: Invalid Request Format", command=lambda: test_invalid_request_format(output_text), **button_style)
-    btn_path_traversal_attack = tk.Button(button_frame, text="Test Case 6: Path Traversal Attack", command=lambda: test_path_traversal_attack(output_text), **button_style)
-    btn_character_encoding_check = tk.Button(button_frame, text="Test Case 7: Character Encoding Check", command=lambda: test_character_encoding_check(output_text), **button_style)
+    btn_valid_request = tk.Button(button_frame, text="Test Case 1: Valid Request", command=lambda: run_valid_request(output_text), **button_style)
+    btn_file_not_found = tk.Button(button_frame, text="Test Case 2: File Not Found", command=lambda: run_file_not_found(output_text), **button_style)
+    btn_permission_denied = tk.Button(button_frame, text="Test Case 3: Permission Denied", command=lambda: run_permission_denied(output_text), **button_style)
+    btn_invalid_request_format = tk.Button(button_frame, text="Test Case 5: Invalid Request Format", command=lambda: run_invalid_request_format(output_text), **button_style)
+    btn_path_traversal_attack = tk.Button(button_frame, text="Test Case 6: Path Traversal Attack", command=lambda: run_path_traversal_attack(output_text), **button_style)
+    btn_character_encoding_check = tk.Button(button_frame, text="Test Case 7: Character Encoding Check", command=lambda: run_character_encoding_check(output_text), **button_style)
 
     # Arrange buttons in a grid layout
     btn_valid_request.grid(row=0, column=0, padx=5, pady=5)
@@ -0,0 +1,116 @@
+"""
+Microbenchmark for the shared Internet checksum.
+
+Compares ``common.checksum`` against the per-byte loop that Lab1/ping.py and
+Lab2/traceroute.py used before, after checking that both give identical results.
+Also compares building an ICMP Echo Request from scratch with patching a
+prebuilt ``EchoRequestTemplate`` (incremental checksum, RFC 1624).
+
+Usage:
+    python benchmarks/bench_checksum.py [--number 2000]
+"""
+
+import argparse
+import os
+import random
+import struct
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.checksum import calculate_checksum, calculate_checksums
+from common.icmp import EchoRequestTemplate
+
+
+# The original implementation, kept here as the reference
+def legacy_checksum(source_string):
+    sum = 0
+    count_to = (len(source_string) // 2) * 2
+    count = 0
+
+    while count < count_to:
+        this_val = source_string[count + 1] * 256 + source_string[count]
+        sum += this_val
+        sum &= 0xffffffff
+        count += 2
+
+    if count_to < len(source_string):
+        sum += source_string[len(source_string) - 1]
+        sum &= 0xffffffff
+
+    sum = (sum >> 16) + (sum & 0xffff)
+    sum += (sum >> 16)
+
+    answer = ~sum
+    answer = answer & 0xffff
+
+    answer = answer >> 8 | (answer << 8 & 0xff00)
+    return answer
+
+
+def check_results():
+    samples = [b'', b'\x00', b'\xff', b'\x00' * 64, b'\xff' * 64, b'\xff' * 65]
+    rng = random.Random(0)
+    for length in list(range(1, 70)) + [1472, 1473, 9000, 65507]:
+        samples.append(bytes(rng.getrandbits(8) for _ in range(length)))
+
+    for data in samples:
+        expected = legacy_checksum(data)
+        for view in (data, bytearray(data), memoryview(data)):
+            actual = calculate_checksum(view)
+            assert actual == expected, f"length {len(data)}: {actual:#06x} != {expected:#06x}"
+
+    # Batch API, both with equal and mixed lengths
+    for batch in (samples[6:30], [samples[-2]] * 10, samples):
+        assert calculate_checksums(batch) == [legacy_checksum(data) for data in batch]
+
+    # Incremental updates must agree with a full recomputation
+    for _ in range(2000):
+        template = EchoRequestTemplate(rng.getrandbits(16), os.urandom(rng.randrange(0, 64)))
+        packet = template.build(rng.getrandbits(16), rng.getrandbits(64))
+        stored, = struct.unpack_from('!H', packet, 2)
+        assert calculate_checksum(packet) == 0, f"incremental checksum {stored:#06x} is wrong"
+
+    print(f"Results match the reference implementation on {len(samples)} buffers.")
+
+
+# Build a probe from scratch, the way create_icmp_packet used to
+def full_build(packet_id, sequence, timestamp_ns, payload):
+    header = struct.pack('!BBHHH', 8, 0, 0, packet_id, sequence)
+    data = struct.pack('!Q', timestamp_ns) + payload
+    checksum = calculate_checksum(header + data)
+    return struct.pack('!BBHHH', 8, 0, checksum, packet_id, sequence) + data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Internet checksum implementations")
+    parser.add_argument('--number', type=int, default=2000, help="Calls per measurement")
+    args = parser.parse_args()
+
+    check_results()
+
+    print(f"{'bytes':>8} {'legacy (us)':>12} {'shared (us)':>12} {'speedup':>8}")
+    for length in (12, 64, 512, 1500, 9000, 65507):
+        data = os.urandom(length)
+        legacy = timeit.timeit(lambda: legacy_checksum(data), number=args.number) / args.number * 1e6
+        shared = timeit.timeit(lambda: calculate_checksum(data), number=args.number) / args.number * 1e6
+        print(f"{length:>8} {legacy:>12.2f} {shared:>12.2f} {legacy / shared:>7.1f}x")
+
+    batch = [os.urandom(64) for _ in range(1000)]
+    number = max(1, args.number // 100)
+    loop = timeit.timeit(lambda: [calculate_checksum(p) for p in batch], number=number) / number * 1e3
+    batched = timeit.timeit(lambda: calculate_checksums(batch), number=number) / number * 1e3
+    print(f"\n1000 x 64-byte packets: per-packet loop {loop:.3f} ms, calculate_checksums {batched:.3f} ms")
+
+    print(f"\n{'payload':>8} {'full build (us)':>16} {'template (us)':>14}")
+    for length in (4, 64, 1500, 9000, 65000):
+        payload = os.urandom(length)
+        template = EchoRequestTemplate(0x1234, payload)
+        full = timeit.timeit(lambda: full_build(0x1234, 7, 123456789, payload), number=args.number) / args.number * 1e6
+        patched = timeit.timeit(lambda: template.build(7, 123456789), number=args.number) / args.number * 1e6
+        print(f"{length:>8} {full:>16.2f} {patched:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
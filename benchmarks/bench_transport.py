@@ -0,0 +1,204 @@
+"""
+Benchmark ping and traceroute on the simulated network.
+
+Runs the probing code of Lab1/ping.py and Lab2/traceroute.py against
+``common.simnet.SimulatedNetwork`` instead of raw sockets, so it needs neither
+root nor network access. Each scenario reports probes per second, how far the
+measured RTTs are from the RTTs the simulation scheduled, and the loss the
+tool observed next to what the network actually dropped.
+
+Usage:
+    python benchmarks/bench_transport.py [--hosts 500] [--count 5] [--hops 8]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import queue
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'Lab1'))
+sys.path.insert(0, os.path.join(ROOT, 'Lab2'))
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import ping
+import traceroute
+from common.scheduler import ProbeScheduler
+from common.simnet import SimulatedNetwork
+
+
+def addresses(count):
+    return [f'10.{1 + i // 250}.0.{1 + i % 250}' for i in range(count)]
+
+
+def report(name, network, probes, elapsed, errors, loss):
+    errors = sorted(errors)
+    p99 = errors[min(len(errors) - 1, int(len(errors) * 0.99))] if errors else float('nan')
+    mean = sum(errors) / len(errors) if errors else float('nan')
+    dropped = network.lost + network.rate_limited + network.overflowed
+    print(f"{name:<34} {probes:>7} {elapsed:>8.2f} {probes / elapsed:>9.0f} {mean:>10.3f} {p99:>10.3f} "
+          f"{loss:>8.1f} {dropped / max(1, network.sent) * 100:>8.1f}")
+
+
+def bench_ping(name, network, hosts, run):
+    """
+    :param run: callable that pings ``hosts``
+    """
+    ping.set_transport(network)
+    ping.rtt_data.clear()
+    start = time.perf_counter()
+    run(hosts)
+    elapsed = time.perf_counter() - start
+
+    expected = network.expected_rtt(network.hops)
+    errors, sent, received = [], 0, 0
+    for stats in ping.rtt_data.values():
+        sent += stats.sent
+        received += stats.received
+        _, rtts = stats.snapshot()
+        errors.extend(rtt - expected for rtt in rtts)
+    report(name, network, network.sent, elapsed, errors, (sent - received) / max(1, sent) * 100)
+    ping.set_transport(ping.RawSocketTransport())
+    network.close()
+
+
+def bench_traceroute(name, network, hosts, retries, use_icmp=True, send_interval=0):
+    traceroute.transport = network
+    results = queue.Queue()
+    start = time.perf_counter()
+    # One parallel trace per destination, all running at once
+    threads = [threading.Thread(target=lambda host=host: results.put(
+                   traceroute.parallel_trace(host, network.hops, 1, retries, use_icmp, send_interval)))
+               for host in hosts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    errors, answered = [], 0
+    while not results.empty():
+        for ttl, (addr, rtt_list) in results.get().items():
+            answered += len(rtt_list)
+            errors.extend(rtt - network.expected_rtt(ttl) for rtt in rtt_list)
+    report(name, network, network.sent, elapsed, errors, (network.sent - answered) / max(1, network.sent) * 100)
+    traceroute.transport = traceroute.RawSocketTransport()
+    network.close()
+
+
+def bench_batch(name, network, hosts, retries, workers, start_ttl, send_interval=0):
+    traceroute.transport = network
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = traceroute.batch_traceroute(hosts, network.hops, 1, retries, send_interval=send_interval,
+                                              start_ttl=start_ttl, workers=workers)
+    elapsed = time.perf_counter() - start
+
+    # Hops copied from the hop cache were measured by another trace; they count once
+    errors, answered = [], 0
+    for path in results.values():
+        for ttl, addr, rtt_list in path:
+            answered += len(rtt_list)
+            errors.extend(rtt - network.expected_rtt(ttl) for rtt in rtt_list)
+    report(name, network, network.sent, elapsed, errors, 0.0)
+    traceroute.transport = traceroute.RawSocketTransport()
+    network.close()
+
+
+def bench_retrace(name, network, hosts, retries):
+    traceroute.transport = network
+    previous = {host: {ttl: addr for ttl, (addr, _) in traceroute.parallel_trace(host, 30, 1, retries).items()}
+                for host in hosts}
+    network.sent = 0
+    start = time.perf_counter()
+    errors, answered = [], 0
+    for host in hosts:
+        path, _, _ = traceroute.incremental_trace(host, previous[host], 30, 1, retries)
+        for ttl, addr, rtt_list in path:
+            answered += len(rtt_list)
+            errors.extend(rtt - network.expected_rtt(ttl) for rtt in rtt_list)
+    elapsed = time.perf_counter() - start
+    report(name, network, network.sent, elapsed, errors, 0.0)
+    traceroute.transport = traceroute.RawSocketTransport()
+    network.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ping and traceroute on a simulated network")
+    parser.add_argument('--hosts', type=int, default=500, help="Number of ping destinations")
+    parser.add_argument('--count', type=int, default=5, help="Probes per ping destination")
+    parser.add_argument('--hops', type=int, default=8, help="Distance of every destination")
+    parser.add_argument('--hop-latency', type=float, default=0.001, help="One-way latency per link in seconds")
+    args = parser.parse_args()
+
+    ping.headless = True
+    hosts = addresses(args.hosts)
+    few = hosts[:20]
+
+    def network(**options):
+        return SimulatedNetwork(hops=args.hops, hop_latency=args.hop_latency, seed=0, **options)
+
+    def asyncio_engine(count=args.count, retries=2, interval=0):
+        return lambda targets: ping.async_ping_multiple_addresses(targets, timeout=1, count=count,
+                                                                  retries=retries, interval=interval)
+
+    def pipelined(targets):
+        ping.ping_multiple_addresses(targets, timeout=1, count=args.count, max_threads=len(targets), interval=0.01)
+
+    print(f"{'scenario':<34} {'probes':>7} {'time (s)':>8} {'probes/s':>9} {'err (ms)':>10} {'p99 (ms)':>10} "
+          f"{'loss %':>8} {'drop %':>8}")
+
+    bench_ping(f"ping asyncio, {len(hosts)} hosts", network(), hosts, asyncio_engine())
+    bench_ping(f"ping pipelined, {len(few)} threads", network(), few, pipelined)
+    bench_ping("ping asyncio, 0.5% loss/link", network(loss=0.005, reorder=0.05), hosts,
+               asyncio_engine(retries=0))
+    # Bursts towards one destination trip its ICMP rate limit; pacing them avoids the fake loss
+    bench_ping("ping asyncio, ICMP limit 100/s", network(icmp_rate=100, icmp_burst=5), few,
+               asyncio_engine(count=50, retries=0, interval=0.001))
+    ping.scheduler = ProbeScheduler(per_destination_rate=80, burst=5)
+    bench_ping("  + --per-host-rate 80", network(icmp_rate=100, icmp_burst=5), few,
+               asyncio_engine(count=50, retries=0, interval=0.001))
+    ping.scheduler = None
+
+    bench_traceroute(f"traceroute ICMP, {len(few)} destinations", network(), few, retries=3)
+    bench_traceroute(f"traceroute UDP, {len(few)} destinations", network(), few, retries=3, use_icmp=False)
+    bench_traceroute("traceroute ICMP, ICMP limit 10/s", network(icmp_rate=10, icmp_burst=2), few[:5], retries=3)
+    bench_traceroute("  + --send-interval 0.1", network(icmp_rate=10, icmp_burst=2), few[:5], retries=3,
+                     send_interval=0.1)
+    # The path has not changed since the previous run: only a few hops are checked
+    bench_retrace(f"re-trace, {len(few)} unchanged paths", network(), few, retries=3)
+    # Every simulated destination is reached through the same routers, so a batch probes them only once
+    many = hosts[:200]
+    # --start-ttl 1 traces every destination on its own, from the first hop
+    bench_batch(f"batch traceroute, {len(many)} destinations", network(), many, retries=3, workers=8, start_ttl=1)
+    bench_batch(f"  batch, --start-ttl {args.hops // 2}", network(), many, retries=3, workers=8,
+                start_ttl=args.hops // 2)
+    bench_batch(f"  batch, --start-ttl {args.hops}", network(), many, retries=3, workers=8, start_ttl=args.hops)
+    # Paced probes make the time depend on the number of probes rather than on round trips
+    bench_batch("batch, --send-interval 0.005", network(), many, retries=3, workers=8, start_ttl=1,
+                send_interval=0.005)
+    bench_batch(f"  + --start-ttl {args.hops // 2}", network(), many, retries=3, workers=8,
+                start_ttl=args.hops // 2, send_interval=0.005)
+    # Routers shared by every destination run out of ICMP tokens; probing them once saves the answers
+    bench_batch("batch, ICMP limit 500/s", network(icmp_rate=500, icmp_burst=20), many, retries=3, workers=8,
+                start_ttl=1)
+    bench_batch(f"  + --start-ttl {args.hops // 2}", network(icmp_rate=500, icmp_burst=20), many, retries=3,
+                workers=8, start_ttl=args.hops // 2)
+    # A router that never answers holds every forward trace for the full timeout
+    silent = many[:40]
+    bench_batch(f"batch, silent hop {args.hops - 1}, {len(silent)} dest.", network(silent=[args.hops - 1]),
+                silent, retries=3, workers=8, start_ttl=1)
+    bench_batch(f"  + --start-ttl {args.hops}", network(silent=[args.hops - 1]), silent, retries=3, workers=8,
+                start_ttl=args.hops)
+
+    print("\nerr: mean measured RTT minus the simulated RTT; loss: as seen by the tool (after retries); "
+          "drop: probes the network dropped")
+
+
+if __name__ == '__main__':
+    main()
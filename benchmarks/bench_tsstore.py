@@ -0,0 +1,85 @@
+"""
+Benchmark the RTT time-series store against the text log.
+
+Writes the same synthetic ping history to ``common.tsstore.TimeSeriesStore``
+and to a ``ping_results.log``-style text file, then times per-host aggregates
+over the whole history and over the last 1% of it. The text log has to be
+read and parsed completely for either query; the store memory-maps only the
+columns it needs and binary-searches the time range.
+
+Usage:
+    python benchmarks/bench_tsstore.py [--samples 1000000] [--hosts 100]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.tsstore import TimeSeriesStore
+
+
+def aggregate_log(path, start_ns=None):
+    totals = {}
+    with open(path, encoding='utf-8') as handle:
+        for line in handle:
+            timestamp, host, _, rtt, _ = line.split()
+            if start_ns is not None and int(timestamp) < start_ns:
+                continue
+            rtt = float(rtt)
+            count, total, low, high = totals.get(host, (0, 0.0, rtt, rtt))
+            totals[host] = (count + 1, total + rtt, min(low, rtt), max(high, rtt))
+    return totals
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the RTT time-series store")
+    parser.add_argument('--samples', type=int, default=1000000, help="Number of RTT samples")
+    parser.add_argument('--hosts', type=int, default=100, help="Number of distinct hosts")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    hosts = [f'10.0.{i // 250}.{i % 250 + 1}' for i in range(args.hosts)]
+    start_ns = time.time_ns()
+
+    with tempfile.TemporaryDirectory() as directory:
+        log_path = os.path.join(directory, 'ping_results.log')
+        store = TimeSeriesStore(os.path.join(directory, 'store'))
+        with open(log_path, 'w', encoding='utf-8') as log:
+            for i in range(args.samples):
+                timestamp = start_ns + i * 1000000
+                host, rtt = hosts[i % args.hosts], rng.uniform(1, 100)
+                store.append(host, i, rtt, timestamp)
+                log.write(f"{timestamp} {host} RTT: {rtt:.3f} ms\n")
+        store.flush()
+        recent = start_ns + int(args.samples * 0.99) * 1000000
+
+        log_size = os.path.getsize(log_path)
+        store_size = sum(os.path.getsize(os.path.join(store.path, name)) for name in os.listdir(store.path))
+        print(f"{args.samples} samples, {args.hosts} hosts: text log {log_size / 1e6:.1f} MB, "
+              f"store {store_size / 1e6:.1f} MB")
+
+        print(f"{'query':<28} {'text log (ms)':>14} {'store (ms)':>12}")
+        for name, since in (("aggregate, all", None), ("aggregate, last 1%", recent)):
+            log_totals, log_ms = timed(aggregate_log, log_path, since)
+            store_totals, store_ms = timed(store.aggregate, since)
+            assert all(store_totals[host]['received'] == log_totals[host][0] for host in log_totals)
+            print(f"{name:<28} {log_ms:>14.1f} {store_ms:>12.1f}")
+
+        _, scan_ms = timed(lambda: sum(1 for _ in store.scan(recent, target=hosts[0])))
+        print(f"{'scan one host, last 1%':<28} {'':>14} {scan_ms:>12.1f}")
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
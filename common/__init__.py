@@ -0,0 +1,6 @@
+"""
+Helpers shared by the lab tools (ping, traceroute).
+
+The lab scripts are run directly from their own directory, so each of them
+puts the repository root on ``sys.path`` before importing from this package.
+"""
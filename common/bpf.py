@@ -0,0 +1,65 @@
+"""
+Classic BPF socket filters for raw ICMP sockets.
+
+Every raw ICMP socket receives a copy of every ICMP message delivered to the
+host. When several processes ping at once, each of them would otherwise wake
+up for, and parse, the replies meant for all the others. A socket filter lets
+the kernel drop those replies before they are queued.
+"""
+
+import ctypes
+import socket
+import struct
+import sys
+
+# Linux value, not exported by the socket module
+SO_ATTACH_FILTER = 26
+
+# Instruction encodings (linux/filter.h)
+_LDX_B_MSH = 0xb1  # x = 4 * (packet[k] & 0x0f), the IP header length
+_LD_B_IND = 0x50   # a = packet[x + k], one byte
+_LD_H_IND = 0x48   # a = packet[x + k], two bytes, big-endian
+_ALU_MOD_K = 0x94  # a = a % k
+_JEQ_K = 0x15      # jump jt if a == k, else jf
+_RET_K = 0x06      # accept k bytes of the packet (0 drops it)
+
+_INSTRUCTION = struct.Struct('=HBBI')
+
+
+def echo_reply_filter(modulus, remainder):
+    """
+    Build a program that drops Echo Replies whose identifier is not
+    congruent to ``remainder`` modulo ``modulus``. Other ICMP messages
+    (errors, requests) are always accepted.
+
+    :return: list of (code, jt, jf, k) instructions
+    """
+    return [
+        (_LDX_B_MSH, 0, 0, 0),
+        (_LD_B_IND, 0, 0, 0),           # ICMP type
+        (_JEQ_K, 0, 3, 0),              # not an Echo Reply: accept
+        (_LD_H_IND, 0, 0, 4),           # ICMP identifier
+        (_ALU_MOD_K, 0, 0, modulus),
+        (_JEQ_K, 0, 1, remainder),
+        (_RET_K, 0, 0, 0xFFFF),
+        (_RET_K, 0, 0, 0),
+    ]
+
+
+def attach_filter(sock, program):
+    """
+    Attach a classic BPF program to ``sock``.
+
+    :param program: list of (code, jt, jf, k) instructions
+    :return: True if the kernel accepted the filter, False where socket filters are unavailable
+    """
+    if not sys.platform.startswith('linux'):
+        return False
+    instructions = ctypes.create_string_buffer(b''.join(_INSTRUCTION.pack(*ins) for ins in program))
+    # struct sock_fprog: unsigned short len, struct sock_filter *filter
+    fprog = struct.pack('HP', len(program), ctypes.addressof(instructions))
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+    except OSError:
+        return False
+    return True
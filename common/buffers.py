@@ -0,0 +1,44 @@
+"""
+Reusable receive buffers.
+
+Receiving with ``recv_into`` into a preallocated ``bytearray`` and parsing
+through ``memoryview`` slices avoids creating a new ``bytes`` object, plus
+copies for every slice, for each packet, which keeps allocation and garbage
+collection out of high-rate probing.
+"""
+
+import threading
+
+
+class BufferPool:
+    """
+    Free list of equally sized ``bytearray`` buffers.
+
+    ``acquire`` hands out a buffer that the caller owns until it passes it to
+    ``release``. When the pool is empty a new buffer is allocated; at most
+    ``count`` released buffers are kept, and buffers of another size are
+    dropped. ``allocated`` counts the buffers created so far. Thread-safe.
+    """
+
+    def __init__(self, size, count=16):
+        """
+        :param size: size of each buffer in bytes
+        :param count: number of buffers to preallocate and keep
+        """
+        self.size = size
+        self.count = count
+        self._free = [bytearray(size) for _ in range(count)]
+        self.allocated = count
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            self.allocated += 1
+        return bytearray(self.size)
+
+    def release(self, buffer):
+        with self._lock:
+            if len(buffer) == self.size and len(self._free) < self.count:
+                self._free.append(buffer)
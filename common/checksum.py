@@ -0,0 +1,99 @@
+"""
+Internet checksum (RFC 1071) used by the ICMP and UDP packets of the lab tools.
+
+The whole buffer is summed in one step instead of word by word in Python:
+since 2**16 == 1 (mod 0xFFFF), the buffer read as a single big-endian integer
+is congruent modulo 0xFFFF to the one's-complement sum of its 16-bit words.
+``int.from_bytes`` and the modulo both run in C, which makes this several
+times faster than the old per-byte loop for typical packet sizes.
+"""
+
+import struct
+
+# NumPy only speeds up the batch API; it is imported on first use so that importing this module stays cheap
+_np = False
+
+
+def _numpy():
+    """Return the numpy module, or None if it is not installed."""
+    global _np
+    if _np is False:
+        try:
+            import numpy as _np
+        except ImportError:
+            _np = None
+    return _np
+
+
+def _fold(total):
+    """Return the one's-complement checksum of a 16-bit word sum."""
+    folded = total % 0xFFFF
+    # A non-zero sum that is a multiple of 0xFFFF is 0xFFFF in one's complement
+    if folded == 0 and total:
+        folded = 0xFFFF
+    return ~folded & 0xFFFF
+
+
+def calculate_checksum(data):
+    """
+    Compute the Internet checksum of a buffer.
+
+    :param data: bytes, bytearray or memoryview; odd lengths are padded with a zero byte
+    :return: checksum in host integer form, ready to be packed with ``struct`` as ``'!H'``
+    """
+    total = int.from_bytes(data, 'big')
+    if len(data) % 2:
+        total <<= 8
+    return _fold(total)
+
+
+def calculate_checksums(packets):
+    """
+    Compute the Internet checksum of many packets in one call.
+
+    When NumPy is available and all packets have the same length, the word sums
+    are computed for the whole batch at once; otherwise each packet is handled
+    by ``calculate_checksum``.
+
+    :param packets: sequence of bytes-like packets
+    :return: list of checksums, in the same order as ``packets``
+    """
+    packets = list(packets)
+    np = _numpy() if len(packets) >= 2 else None
+    if np is None:
+        return [calculate_checksum(packet) for packet in packets]
+
+    length = len(packets[0])
+    if any(len(packet) != length for packet in packets):
+        return [calculate_checksum(packet) for packet in packets]
+
+    # Even offsets hold the high byte of each word, odd offsets the low byte;
+    # a trailing odd byte is a high byte padded with zero, as RFC 1071 requires
+    octets = np.frombuffer(b''.join(packets), dtype=np.uint8).reshape(len(packets), length)
+    totals = (octets[:, 0::2].sum(axis=1, dtype=np.uint64) << np.uint64(8)) + octets[:, 1::2].sum(axis=1, dtype=np.uint64)
+    folded = totals % np.uint64(0xFFFF)
+    folded[(folded == 0) & (totals != 0)] = 0xFFFF
+    return (~folded & np.uint64(0xFFFF)).tolist()
+
+
+def update_checksum(checksum, old, new):
+    """
+    Incrementally update a checksum after some 16-bit aligned bytes changed.
+
+    Implements equation 3 of RFC 1624, HC' = ~(~HC + ~m + m'), summed over every
+    changed word, so the cost depends only on the size of the changed field and
+    not on the size of the packet.
+
+    :param checksum: checksum currently stored in the packet
+    :param old: previous contents of the changed field (even length)
+    :param new: new contents of the changed field, same length as ``old``
+    :return: the updated checksum
+    """
+    words = len(old) // 2
+    fmt = f'!{words}H'
+    total = ~checksum & 0xFFFF
+    total += words * 0xFFFF - sum(struct.unpack(fmt, old))
+    total += sum(struct.unpack(fmt, new))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
@@ -0,0 +1,194 @@
+"""
+Incremental writers for traceroute hops.
+
+Every hop is written as one record as soon as it resolves, and the file is
+flushed after each record, so a long run over many destinations keeps
+nothing in memory and loses at most the record being written if it
+crashes. All destinations go to the same file, which is opened for
+appending and optionally rolled over to ``<path>.1``, ``<path>.2``, ...
+once it reaches ``max_bytes``.
+
+Three formats, chosen by name or by the file extension:
+
+    jsonl   one JSON object per line:
+            {"time": ..., "destination": ..., "hop": ..., "ip": ..., "rtts": [...]}
+    csv     time, destination, hop, ip, rtt_1_ms ... rtt_N_ms; a hop with
+            fewer answers leaves the remaining RTT columns empty, a hop
+            with more rolls the file over and starts a wider one
+    bin     little-endian records of
+                int64    time, nanoseconds since the epoch
+                4 bytes  destination IPv4 address
+                4 bytes  hop IPv4 address, 0.0.0.0 for no answer
+                uint8    TTL
+                uint8    number of RTTs
+                float32  RTT in milliseconds, repeated
+            read back with ``read_binary``
+
+``time`` is when the hop was written, in seconds since the epoch for the
+text formats.
+"""
+
+import csv
+import json
+import os
+import socket
+import struct
+import time
+
+FORMATS = ('jsonl', 'csv', 'bin')
+
+_RECORD = struct.Struct('<q4s4sBB')
+_NO_ADDRESS = bytes(4)
+
+
+class HopWriter:
+    """Base class: appends records to ``path`` and rolls it over at ``max_bytes``."""
+
+    binary = False
+
+    def __init__(self, path, max_bytes=0, backup_count=5):
+        """
+        :param max_bytes: size after which the file is rolled over, 0 to let it grow
+        :param backup_count: rolled-over files kept
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.file = None
+        self._open()
+
+    def _open(self):
+        if self.binary:
+            self.file = open(self.path, 'ab')
+        else:
+            self.file = open(self.path, 'a', newline='', encoding='utf-8')
+        if self.file.tell() == 0:
+            self._start()
+
+    def _start(self):
+        """Write whatever a new file begins with."""
+
+    def write(self, destination, ttl, addr, rtt_list):
+        """
+        :param destination: destination IP address of the trace
+        :param addr: address that answered at ``ttl``, None if none did
+        :param rtt_list: RTTs of the answers in ms
+        """
+        self._write(destination, ttl, addr, rtt_list)
+        self.file.flush()
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            self._roll_over()
+
+    def _write(self, destination, ttl, addr, rtt_list):
+        raise NotImplementedError
+
+    def _roll_over(self, backup_count=None):
+        """
+        :param backup_count: rolled-over files kept, ``self.backup_count`` by default
+        """
+        if backup_count is None:
+            backup_count = self.backup_count
+        self.file.close()
+        if backup_count:
+            for index in range(backup_count - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{index}"):
+                    os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def close(self):
+        self.file.close()
+
+
+class JsonLinesWriter(HopWriter):
+    def _write(self, destination, ttl, addr, rtt_list):
+        record = {"time": round(time.time(), 6), "destination": destination, "hop": ttl, "ip": addr,
+                  "rtts": rtt_list}
+        self.file.write(json.dumps(record) + "\n")
+
+
+class CsvWriter(HopWriter):
+    def __init__(self, path, max_bytes=0, backup_count=5, rtt_columns=3):
+        """
+        :param rtt_columns: number of RTT columns of a new file, the probes sent per hop
+        """
+        self.rtt_columns = rtt_columns
+        existing = None
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, newline='', encoding='utf-8') as file:
+                existing = max(0, len(next(csv.reader(file), [])) - 4)
+        super().__init__(path, max_bytes, backup_count)
+        if existing is not None:
+            if existing >= rtt_columns:
+                self.rtt_columns = existing  # keep the layout of the file being appended to
+            else:
+                self._widen(rtt_columns)
+
+    def _open(self):
+        super()._open()
+        self.writer = csv.writer(self.file)
+
+    def _start(self):
+        csv.writer(self.file).writerow(["time", "destination", "hop", "ip"] +
+                                       [f"rtt_{index}_ms" for index in range(1, self.rtt_columns + 1)])
+
+    def _widen(self, rtt_columns):
+        # A file with too few RTT columns is rolled over, never truncated: keep it even without backups
+        self.rtt_columns = rtt_columns
+        self._roll_over(max(1, self.backup_count))
+
+    def _write(self, destination, ttl, addr, rtt_list):
+        if len(rtt_list) > self.rtt_columns:
+            self._widen(len(rtt_list))
+        rtts = [f"{rtt:.3f}" for rtt in rtt_list]
+        self.writer.writerow([f"{time.time():.6f}", destination, ttl, addr or ""] +
+                             rtts + [""] * (self.rtt_columns - len(rtts)))
+
+
+class BinaryWriter(HopWriter):
+    binary = True
+
+    def _write(self, destination, ttl, addr, rtt_list):
+        rtt_list = rtt_list[:255]
+        # One write per record: a crash can only cut off the last one
+        self.file.write(_RECORD.pack(time.time_ns(), socket.inet_aton(destination),
+                                     socket.inet_aton(addr) if addr else _NO_ADDRESS, ttl, len(rtt_list))
+                        + struct.pack(f'<{len(rtt_list)}f', *rtt_list))
+
+
+def read_binary(path):
+    """
+    :return: iterator of (time in ns, destination, ttl, address or None, [rtt, ...]) from a ``bin`` file;
+             a record cut off at the end of the file is skipped
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    offset = 0
+    while offset + _RECORD.size <= len(data):
+        timestamp, destination, addr, ttl, count = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        if offset + 4 * count > len(data):
+            break
+        rtt_list = list(struct.unpack_from(f'<{count}f', data, offset))
+        offset += 4 * count
+        yield (timestamp, socket.inet_ntoa(destination), ttl,
+               socket.inet_ntoa(addr) if addr != _NO_ADDRESS else None, rtt_list)
+
+
+def open_writer(path, fmt=None, max_bytes=0, backup_count=5, rtt_columns=3):
+    """
+    :param fmt: one of ``FORMATS``, taken from the extension of ``path`` by default
+    :param rtt_columns: RTT columns of a new CSV file
+    :return: a ``HopWriter`` appending to ``path``
+    """
+    if fmt is None:
+        fmt = os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt == 'jsonl':
+        return JsonLinesWriter(path, max_bytes, backup_count)
+    if fmt == 'csv':
+        return CsvWriter(path, max_bytes, backup_count, rtt_columns)
+    if fmt == 'bin':
+        return BinaryWriter(path, max_bytes, backup_count)
+    raise ValueError(f"unknown hop log format {fmt!r}, expected one of {', '.join(FORMATS)}")
@@ -0,0 +1,58 @@
+"""
+ICMP packet construction shared by the lab tools.
+"""
+
+import struct
+
+from common.checksum import calculate_checksum
+
+ICMP_ECHO_REQUEST = 8
+
+_HEADER = struct.Struct('!BBHHH')
+# Checksum, identifier, sequence number and send timestamp are adjacent, so one probe is a single pack_into
+_PATCH = struct.Struct('!HHHQ')
+_PATCH_OFFSET = 2
+
+
+class EchoRequestTemplate:
+    """
+    ICMP Echo Request built once per target and patched for every probe.
+
+    Layout: type, code, checksum, identifier, sequence (8 bytes), then an 8-byte
+    big-endian send timestamp in nanoseconds, then the user payload. ``build``
+    rewrites only the sequence and timestamp and updates the checksum
+    incrementally (RFC 1624) from their integer values, so building a probe
+    costs the same whatever the payload size.
+    """
+
+    def __init__(self, packet_id, payload=b''):
+        """
+        :param packet_id: ICMP identifier of the target
+        :param payload: user data placed after the timestamp
+        """
+        self.packet_id = packet_id
+        self.payload = bytes(payload)
+        self.packet = bytearray(_HEADER.pack(ICMP_ECHO_REQUEST, 0, 0, packet_id, 0) + bytes(8) + self.payload)
+        self.checksum = calculate_checksum(self.packet)
+        struct.pack_into('!H', self.packet, 2, self.checksum)
+        self._field = 0  # sequence + timestamp currently in the packet
+
+    def build(self, sequence, timestamp_ns=0):
+        """
+        Patch the template for one probe.
+
+        The returned buffer is the template itself: send it before the next call.
+
+        :param sequence: 16-bit sequence number
+        :param timestamp_ns: send time to embed in the payload
+        :return: the packet as a bytearray
+        """
+        # RFC 1624 eqn. 3 on integers: 2**16 is 1 modulo 0xFFFF, so the one's complement sum of the sequence
+        # word and the four timestamp words is sequence + timestamp modulo 0xFFFF. A zero sum is kept as
+        # 0xFFFF, as a full computation gives.
+        field = sequence + timestamp_ns
+        total = (0xFFFF - self.checksum + field - self._field) % 0xFFFF or 0xFFFF
+        self.checksum = 0xFFFF - total
+        self._field = field
+        _PATCH.pack_into(self.packet, _PATCH_OFFSET, self.checksum, self.packet_id, sequence, timestamp_ns)
+        return self.packet
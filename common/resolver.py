@@ -0,0 +1,129 @@
+"""
+Shared DNS resolver with a TTL-bounded cache.
+
+``socket.gethostbyname`` and ``socket.gethostbyaddr`` block the calling thread
+for as long as the resolver takes, and the tools used to repeat the same
+lookups on every run, every hop and every retry. ``Resolver`` runs forward
+and reverse lookups on a small thread pool, merges concurrent requests for
+the same name into one lookup, and caches both answers and failures
+(negative caching), each for its own TTL.
+
+The standard library does not expose the TTL of DNS records, so cache
+lifetimes are fixed by the caller.
+"""
+
+import collections
+import concurrent.futures
+import socket
+import threading
+import time
+
+
+class Resolver:
+    """Forward and reverse lookups, cached and run in the background."""
+
+    def __init__(self, ttl=300.0, negative_ttl=30.0, max_entries=4096, max_workers=8):
+        """
+        :param ttl: seconds a successful answer is cached
+        :param negative_ttl: seconds a failed lookup is cached
+        :param max_entries: cache size; the least recently used entries are dropped beyond it
+        :param max_workers: number of lookup threads
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix='resolver')
+        self._cache = collections.OrderedDict()  # (kind, name) -> (expiry, answer, error)
+        self._pending = {}  # (kind, name) -> Future
+        self._lock = threading.RLock()  # a lookup that finishes at once stores its result on the submitting thread
+
+    def _submit(self, kind, name, lookup):
+        key = (kind, name)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                self._cache.move_to_end(key)
+                future = concurrent.futures.Future()
+                if entry[2] is not None:
+                    future.set_exception(type(entry[2])(*entry[2].args))
+                else:
+                    future.set_result(entry[1])
+                return future
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor.submit(lookup, name)
+                self._pending[key] = future
+                future.add_done_callback(lambda done: self._store(key, done))
+            return future
+
+    def _store(self, key, future):
+        error = future.exception()
+        ttl = self.ttl if error is None else self.negative_ttl
+        with self._lock:
+            self._pending.pop(key, None)
+            if error is not None and not isinstance(error, OSError):
+                return
+            self._cache[key] = (time.monotonic() + ttl, None if error is not None else future.result(), error)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    @staticmethod
+    def _forward(host):
+        return socket.gethostbyname(host)
+
+    @staticmethod
+    def _reverse(address):
+        return socket.gethostbyaddr(address)[0]
+
+    def resolve_async(self, host):
+        """
+        :return: Future of the IPv4 address of ``host``; fails with ``socket.gaierror``
+        """
+        try:
+            socket.inet_pton(socket.AF_INET, host)
+        except (OSError, TypeError):
+            return self._submit('A', host, self._forward)
+        future = concurrent.futures.Future()
+        future.set_result(host)
+        return future
+
+    def resolve(self, host, timeout=None):
+        """
+        :return: the IPv4 address of ``host``
+        :raises socket.gaierror: if the name does not resolve (also when the failure is cached)
+        """
+        return self.resolve_async(host).result(timeout)
+
+    def prefetch(self, hosts):
+        """Start resolving ``hosts`` in the background."""
+        for host in hosts:
+            self.resolve_async(host)
+
+    def reverse_async(self, address):
+        """
+        :return: Future of the host name of ``address``; fails with ``socket.herror`` when there is none
+        """
+        return self._submit('PTR', address, self._reverse)
+
+    def reverse(self, address, timeout=None):
+        """
+        Look up the host name of ``address`` without raising.
+
+        :param timeout: seconds to wait; 0 returns at once, starting the lookup if it is not cached
+        :return: the host name, or None if there is none or it is not known yet
+        """
+        future = self.reverse_async(address)
+        try:
+            return future.result(timeout)
+        except (OSError, concurrent.futures.TimeoutError):
+            return None
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+# Shared by every tool in the process
+resolver = Resolver()
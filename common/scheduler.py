@@ -0,0 +1,139 @@
+"""
+Central pacing of outgoing probes.
+
+Firing probes at many targets from many threads produces bursts, and routers
+that rate-limit ICMP answer bursts with drops that look like packet loss.
+``ProbeScheduler`` hands every probe a send slot so that the aggregate rate
+stays under a global packets-per-second cap, spaced evenly, and each
+destination stays under its own token-bucket rate. It also records how late
+probes actually left compared with their slots.
+"""
+
+import asyncio
+import bisect
+import threading
+import time
+
+from common.stats import P2Quantile
+
+
+class ProbeScheduler:
+    """
+    Send-slot scheduler with a global rate and a per-destination token bucket.
+
+    Global slots are spaced at least ``1 / rate`` apart. Each destination is
+    a token bucket of ``burst`` tokens refilled at ``per_destination_rate``,
+    implemented as the generic cell rate algorithm (a theoretical arrival
+    time per destination). A probe gets the earliest free global slot at or
+    after the time its destination's bucket allows, so a destination that is
+    held back books a later slot without delaying probes to other
+    destinations. Either limit may be None to disable it.
+    Thread-safe; ``wait`` blocks the calling thread, ``wait_async`` suspends
+    the calling coroutine.
+    """
+
+    def __init__(self, rate=None, per_destination_rate=None, burst=1):
+        """
+        :param rate: global limit in probes per second, None for no limit
+        :param per_destination_rate: limit per destination in probes per second, None for no limit
+        :param burst: number of probes a destination may send back to back
+        """
+        self.rate = rate
+        self.per_destination_rate = per_destination_rate
+        self.burst = max(1, burst)
+        self._global_interval_ns = int(1e9 / rate) if rate else 0
+        self._destination_interval_ns = int(1e9 / per_destination_rate) if per_destination_rate else 0
+        self._tolerance_ns = (self.burst - 1) * self._destination_interval_ns
+        self._slots = []  # sorted global slots reserved from one interval ago on
+        self._arrival_ns = {}  # destination -> theoretical arrival time
+
+        self.scheduled = 0
+        self.sent = 0
+        self.drift_max_ns = 0
+        self._drift_total_ns = 0
+        self._drift_p99 = P2Quantile(0.99)
+        self._lock = threading.Lock()
+
+    def reserve(self, destination):
+        """
+        Reserve the earliest send slot that respects both limits.
+
+        :return: the slot, in ``time.perf_counter_ns``
+        """
+        now = time.perf_counter_ns()
+        with self._lock:
+            slot = now
+            if self._destination_interval_ns:
+                arrival = self._arrival_ns.get(destination, 0)
+                slot = max(slot, arrival - self._tolerance_ns)
+            if self._global_interval_ns:
+                slot = self._take_global_slot(slot, now)
+            if self._destination_interval_ns:
+                self._arrival_ns[destination] = max(arrival, slot) + self._destination_interval_ns
+            self.scheduled += 1
+        return slot
+
+    def _take_global_slot(self, eligible, now):
+        """
+        Reserve the earliest slot at or after ``eligible`` that is at least one
+        global interval away from every reserved slot. Called with the lock held.
+        """
+        interval = self._global_interval_ns
+        slots = self._slots
+        del slots[:bisect.bisect_left(slots, now - interval)]  # slots that can no longer collide
+        slot = eligible
+        index = bisect.bisect_right(slots, slot - interval)
+        while index < len(slots) and slots[index] < slot + interval:
+            slot = max(slot, slots[index] + interval)
+            index += 1
+        slots.insert(index, slot)
+        return slot
+
+    def wait(self, destination):
+        """
+        Reserve a slot and sleep until it.
+
+        :return: the slot, to be passed to ``record_send`` once the probe is sent
+        """
+        slot = self.reserve(destination)
+        delay = slot - time.perf_counter_ns()
+        if delay > 0:
+            time.sleep(delay / 1e9)
+        return slot
+
+    async def wait_async(self, destination):
+        """Coroutine version of ``wait``."""
+        slot = self.reserve(destination)
+        delay = slot - time.perf_counter_ns()
+        if delay > 0:
+            await asyncio.sleep(delay / 1e9)
+        return slot
+
+    def record_send(self, slot, sent_ns=None):
+        """
+        Record when the probe scheduled for ``slot`` actually left.
+
+        :param slot: value returned by ``wait`` or ``wait_async``
+        :param sent_ns: send time in ``time.perf_counter_ns``, now if omitted
+        """
+        drift = (time.perf_counter_ns() if sent_ns is None else sent_ns) - slot
+        with self._lock:
+            self.sent += 1
+            self._drift_total_ns += drift
+            self.drift_max_ns = max(self.drift_max_ns, drift)
+            self._drift_p99.add(drift)
+
+    def drift_summary(self):
+        """
+        :return: dict with the number of probes sent and the mean, p99 and maximum
+                 lateness of their send times in milliseconds (None before the first send)
+        """
+        with self._lock:
+            if not self.sent:
+                return {'probes': 0, 'drift_mean_ms': None, 'drift_p99_ms': None, 'drift_max_ms': None}
+            return {
+                'probes': self.sent,
+                'drift_mean_ms': self._drift_total_ns / self.sent / 1e6,
+                'drift_p99_ms': self._drift_p99.value() / 1e6,
+                'drift_max_ms': self.drift_max_ns / 1e6,
+            }
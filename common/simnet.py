@@ -0,0 +1,276 @@
+"""
+In-process simulated network, a drop-in transport for ping and traceroute.
+
+Every destination sits ``hops`` hops away behind a chain of routers. A probe
+sent with a TTL below that is answered by the router at that hop with an ICMP
+Time Exceeded; a probe that reaches the destination gets an Echo Reply (ICMP)
+or a Port Unreachable (UDP). Replies are real IPv4 packets, so the tools parse
+them exactly as they parse packets from a raw socket.
+
+Each link adds ``hop_latency`` seconds in each direction and may drop the
+packet with probability ``loss``. Replies can be reordered by delaying them an
+extra ``reorder_delay``, and every router and destination generates at most
+``icmp_rate`` ICMP messages per second (token bucket of ``icmp_burst``), like
+the ICMP rate limiting of real routers. Routers at the ``silent`` TTLs never
+answer at all, and a reply is delivered twice with probability ``duplicate``.
+
+As with raw sockets in the kernel, every ICMP message is delivered to every
+open ICMP socket of the network, whichever socket sent the probe; UDP
+sockets receive nothing. UDP probes get a real UDP header with the socket's
+source port, which Time Exceeded and Port Unreachable messages quote.
+
+Simulated sockets are backed by a Unix datagram socket pair, so they have a
+real file descriptor and work with timeouts, ``select`` and asyncio readers.
+They do not provide kernel receive timestamps or socket filters; the tools
+fall back to user-space timing.
+"""
+
+import errno
+import heapq
+import itertools
+import random
+import socket
+import struct
+import threading
+import time
+
+from common.checksum import calculate_checksum
+
+_IP_HEADER = struct.Struct('!BBHHHBBH4s4s')
+
+
+class SimulatedSocket:
+    """Socket on a ``SimulatedNetwork``; see ``common.transport`` for the supported API."""
+
+    def __init__(self, network, protocol, port):
+        self.network = network
+        self.protocol = protocol
+        self.port = port
+        self.ttl = 64
+        self._rx, self._tx = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        # Room for bursts of replies; beyond that, like a full receive buffer, replies are dropped
+        for sock, option in ((self._tx, socket.SO_SNDBUF), (self._rx, socket.SO_RCVBUF)):
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, option, 1 << 22)
+            except OSError:
+                pass
+        self._tx.setblocking(False)
+
+    def setsockopt(self, level, option, value):
+        if level == socket.IPPROTO_IP and option == socket.IP_TTL:
+            self.ttl = value if isinstance(value, int) else struct.unpack('I', value)[0]
+            return
+        raise OSError(errno.ENOPROTOOPT, "option not supported by the simulated network")
+
+    def settimeout(self, timeout):
+        self._rx.settimeout(timeout)
+
+    def setblocking(self, flag):
+        self._rx.setblocking(flag)
+
+    def bind(self, address):
+        pass
+
+    def getsockname(self):
+        return self.network.source, self.port
+
+    def fileno(self):
+        return self._rx.fileno()
+
+    def sendto(self, data, address):
+        payload = bytes(data)
+        if self.protocol == socket.IPPROTO_UDP:
+            payload = struct.pack('!HHHH', self.port, address[1], 8 + len(payload), 0) + payload
+        self.network.transmit(self, payload, address[0], address[1])
+        return len(data)
+
+    @staticmethod
+    def _source(packet):
+        return socket.inet_ntoa(bytes(packet[12:16])), 0
+
+    def recvfrom(self, bufsize):
+        packet = self._rx.recv(bufsize)
+        return packet, self._source(packet)
+
+    def recvfrom_into(self, buffer, nbytes=0):
+        nbytes = self._rx.recv_into(buffer, nbytes)
+        return nbytes, self._source(memoryview(buffer)[:nbytes])
+
+    def recvmsg_into(self, buffers, ancbufsize=0, flags=0):
+        nbytes = self._rx.recv_into(buffers[0])
+        return nbytes, [], 0, self._source(memoryview(buffers[0])[:nbytes])
+
+    def _deliver(self, packet):
+        try:
+            self._tx.send(packet)
+            return True
+        except OSError:
+            return False
+
+    def close(self):
+        with self.network._cond:
+            self.network._sockets.discard(self)
+        self._rx.close()
+        self._tx.close()
+
+
+class SimulatedNetwork:
+    """
+    Transport whose sockets talk to simulated routers and hosts.
+
+    Counters ``sent``, ``delivered``, ``lost``, ``rate_limited`` and
+    ``overflowed`` (receive queue full) describe what happened to the probes.
+    """
+
+    def __init__(self, hops=8, hop_latency=0.001, jitter=0.0, loss=0.0, reorder=0.0, reorder_delay=0.005,
+                 icmp_rate=None, icmp_burst=10, silent=(), duplicate=0.0, source='10.0.0.1', seed=None):
+        """
+        :param hops: distance of every destination in hops
+        :param hop_latency: one-way latency of each link in seconds
+        :param jitter: maximum random delay added to each reply in seconds
+        :param loss: probability that a link drops a packet, applied per link in each direction
+        :param reorder: probability that a reply is delayed by ``reorder_delay`` seconds
+        :param icmp_rate: ICMP messages each node may generate per second, None for no limit
+        :param icmp_burst: token bucket size for ``icmp_rate``
+        :param silent: TTLs whose routers never send Time Exceeded, like routers that do not answer traceroute
+        :param duplicate: probability that a reply is delivered twice, the copy one ``hop_latency`` later
+        :param source: address of the probing host, quoted in ICMP errors
+        :param seed: seed for the random number generator
+        """
+        self.hops = hops
+        self.hop_latency = hop_latency
+        self.jitter = jitter
+        self.loss = loss
+        self.reorder = reorder
+        self.reorder_delay = reorder_delay
+        self.icmp_rate = icmp_rate
+        self.icmp_burst = icmp_burst
+        self.silent = frozenset(silent)
+        self.duplicate = duplicate
+        self.source = source
+
+        self.sent = 0
+        self.delivered = 0
+        self.lost = 0
+        self.rate_limited = 0
+        self.overflowed = 0
+
+        self._random = random.Random(seed)
+        self._ports = itertools.count(40000)
+        self._sockets = set()  # open ICMP sockets, each receives every ICMP message
+        self._buckets = {}  # node address -> [tokens, time of last refill]
+        self._queue = []  # heap of (delivery time, counter, packet)
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._deliver_loop, name='SimulatedNetwork', daemon=True)
+        self._thread.start()
+
+    def icmp_socket(self):
+        sock = SimulatedSocket(self, socket.IPPROTO_ICMP, 0)
+        with self._cond:
+            self._sockets.add(sock)
+        return sock
+
+    def udp_socket(self):
+        return SimulatedSocket(self, socket.IPPROTO_UDP, next(self._ports))
+
+    def hop_address(self, destination, ttl):
+        """
+        :return: address of the node that answers a probe to ``destination`` sent with ``ttl``
+        """
+        return destination if ttl >= self.hops else f'172.16.{ttl}.1'
+
+    def expected_rtt(self, ttl):
+        """
+        :return: round-trip time in milliseconds of a probe answered at ``ttl``, without jitter or reordering
+        """
+        return 2 * min(ttl, self.hops) * self.hop_latency * 1000
+
+    def transmit(self, sock, payload, destination, port):
+        now = time.perf_counter_ns()
+        ttl = sock.ttl
+        distance = min(ttl, self.hops)
+        responder = self.hop_address(destination, ttl)
+
+        with self._cond:
+            self.sent += 1
+            rng = self._random
+            if self.loss and any(rng.random() < self.loss for _ in range(2 * distance)):
+                self.lost += 1
+                return
+            if ttl < self.hops and ttl in self.silent:
+                return
+            if not self._take_token(responder, now):
+                self.rate_limited += 1
+                return
+
+            reply = self._reply(sock.protocol, payload, destination, responder, ttl >= self.hops)
+            if reply is None:
+                return
+
+            delay = 2 * distance * self.hop_latency
+            if self.jitter:
+                delay += rng.uniform(0, self.jitter)
+            if self.reorder and rng.random() < self.reorder:
+                delay += self.reorder_delay
+            heapq.heappush(self._queue, (now + int(delay * 1e9), next(self._counter), reply))
+            if self.duplicate and rng.random() < self.duplicate:
+                heapq.heappush(self._queue, (now + int((delay + self.hop_latency) * 1e9), next(self._counter), reply))
+            self._cond.notify()
+
+    def _take_token(self, node, now):
+        if not self.icmp_rate:
+            return True
+        tokens, last = self._buckets.get(node, (self.icmp_burst, now))
+        tokens = min(self.icmp_burst, tokens + (now - last) * self.icmp_rate / 1e9)
+        if tokens < 1:
+            self._buckets[node] = (tokens, now)
+            return False
+        self._buckets[node] = (tokens - 1, now)
+        return True
+
+    def _ip_packet(self, protocol, source, destination, payload, ttl=64):
+        header = _IP_HEADER.pack(0x45, 0, 20 + len(payload), 0, 0, ttl, protocol, 0,
+                                 socket.inet_aton(source), socket.inet_aton(destination))
+        checksum = calculate_checksum(header)
+        return header[:10] + struct.pack('!H', checksum) + header[12:] + payload
+
+    def _icmp(self, icmp_type, code, rest_of_header, data):
+        message = bytearray(struct.pack('!BBH', icmp_type, code, 0) + rest_of_header + data)
+        struct.pack_into('!H', message, 2, calculate_checksum(message))
+        return bytes(message)
+
+    def _reply(self, protocol, payload, destination, responder, reached):
+        if reached and protocol == socket.IPPROTO_ICMP:
+            if len(payload) < 8 or payload[0] != 8:
+                return None
+            message = self._icmp(0, 0, payload[4:8], payload[8:])
+        else:
+            # Time Exceeded on the way, Port Unreachable from the destination; both quote the probe
+            quoted = self._ip_packet(protocol, self.source, destination, payload[:8], ttl=1)
+            message = self._icmp(3, 3, b'\x00' * 4, quoted) if reached else self._icmp(11, 0, b'\x00' * 4, quoted)
+        return self._ip_packet(socket.IPPROTO_ICMP, responder, self.source, message)
+
+    def _deliver_loop(self):
+        with self._cond:
+            while not self._closed:
+                if not self._queue:
+                    self._cond.wait()
+                    continue
+                delay = self._queue[0][0] - time.perf_counter_ns()
+                if delay > 0:
+                    self._cond.wait(delay / 1e9)
+                    continue
+                _, _, packet = heapq.heappop(self._queue)
+                for sock in list(self._sockets):
+                    if sock._deliver(packet):
+                        self.delivered += 1
+                    else:
+                        self.overflowed += 1
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
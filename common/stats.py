@@ -0,0 +1,179 @@
+"""
+Streaming RTT statistics with bounded memory.
+
+``RttStats`` keeps running counters and estimates that are updated in O(1)
+per sample, plus a fixed-size ring buffer of the most recent samples for
+plotting, so a probe session can run for hours without its memory growing.
+"""
+
+import math
+import threading
+from collections import deque
+
+
+class P2Quantile:
+    """
+    Streaming quantile estimate using the P-square algorithm (Jain & Chlamtac, 1985).
+
+    Five markers track the minimum, the p/2, p and (1+p)/2 quantiles and the
+    maximum; their heights are adjusted with piecewise-parabolic interpolation,
+    so memory is constant however many samples are added.
+    """
+
+    def __init__(self, p):
+        """
+        :param p: quantile to estimate, between 0 and 1
+        """
+        self.p = p
+        self._initial = []
+        self._heights = None
+        self._positions = [0, 1, 2, 3, 4]
+        self._desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        if self._heights is None:
+            self._initial.append(x)
+            if len(self._initial) == 5:
+                self._heights = sorted(self._initial)
+                self._initial = None
+            return
+
+        q, n = self._heights, self._positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self._heights, self._positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self):
+        """
+        :return: current estimate, None if empty; while fewer than five samples were added, the exact quantile
+                 interpolated between them, as ``statistics.quantiles(method='inclusive')`` computes it
+        """
+        if self._heights is not None:
+            return self._heights[2]
+        if not self._initial:
+            return None
+        ordered = sorted(self._initial)
+        position = self.p * (len(ordered) - 1)
+        lower = int(position)
+        upper = min(lower + 1, len(ordered) - 1)
+        return ordered[lower] + (position - lower) * (ordered[upper] - ordered[lower])
+
+
+class RttStats:
+    """
+    Running statistics of one probe target.
+
+    Tracks sent/received counts, min, mean, max, mdev (standard deviation,
+    via Welford's method), RFC 3550 interarrival jitter and streaming p50,
+    p90 and p99 estimates. The last ``window`` samples are kept in a ring
+    buffer, numbered by probe, for plotting. All methods are thread-safe.
+    """
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, window=300):
+        """
+        :param window: number of recent samples kept for plotting
+        """
+        self.window = window
+        self.sent = 0
+        self.received = 0
+        self.min = None
+        self.max = None
+        self.mean = 0.0
+        self.jitter = 0.0
+        self._m2 = 0.0
+        self._last = None
+        self._samples = deque(maxlen=window)
+        self._quantiles = {p: P2Quantile(p) for p in self.QUANTILES}
+        self._lock = threading.Lock()
+
+    def add(self, rtt):
+        """Record a probe that was answered after ``rtt`` milliseconds."""
+        with self._lock:
+            self.sent += 1
+            self.received += 1
+            self._samples.append((self.sent, rtt))
+
+            self.min = rtt if self.min is None else min(self.min, rtt)
+            self.max = rtt if self.max is None else max(self.max, rtt)
+            delta = rtt - self.mean
+            self.mean += delta / self.received
+            self._m2 += delta * (rtt - self.mean)
+
+            # RFC 3550: J = J + (|D| - J) / 16
+            if self._last is not None:
+                self.jitter += (abs(rtt - self._last) - self.jitter) / 16
+            self._last = rtt
+
+            for estimator in self._quantiles.values():
+                estimator.add(rtt)
+
+    def add_loss(self):
+        """Record a probe that was not answered."""
+        with self._lock:
+            self.sent += 1
+
+    @property
+    def last(self):
+        """RTT of the most recent answered probe, None before the first."""
+        return self._last
+
+    @property
+    def lost(self):
+        return self.sent - self.received
+
+    @property
+    def loss(self):
+        """Packet loss in percent."""
+        return self.lost / self.sent * 100 if self.sent else 0.0
+
+    @property
+    def mdev(self):
+        return math.sqrt(self._m2 / self.received) if self.received else 0.0
+
+    def percentile(self, p):
+        """
+        :param p: one of ``RttStats.QUANTILES``
+        :return: streaming estimate of the quantile, or None before the first sample
+        """
+        with self._lock:
+            return self._quantiles[p].value()
+
+    def snapshot(self):
+        """
+        :return: (probe numbers, RTTs) of the samples in the ring buffer
+        """
+        with self._lock:
+            samples = list(self._samples)
+        return [x for x, _ in samples], [y for _, y in samples]
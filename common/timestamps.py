@@ -0,0 +1,71 @@
+"""
+Kernel receive timestamps for raw sockets.
+
+With ``SO_TIMESTAMPNS`` enabled, Linux attaches the time at which the network
+stack received each datagram as ancillary data. Reading the clock after
+``recvfrom`` returns instead adds thread scheduling and GIL contention to
+every RTT, and that error grows with the number of hosts probed at once.
+
+The kernel stamp is wall-clock time (CLOCK_REALTIME). ``recv_into_timestamped``
+converts it to the ``time.perf_counter_ns`` timeline, so it can be compared
+with a monotonic send time; where kernel stamps are unavailable the time of
+return from ``recvmsg_into`` is used.
+"""
+
+import socket
+import struct
+import sys
+import time
+
+# Linux socket option and control message type, not exported by the socket module
+SO_TIMESTAMPNS = getattr(socket, 'SO_TIMESTAMPNS', 35)
+
+# struct timespec: seconds and nanoseconds as native longs
+_TIMESPEC = struct.Struct('@ll')
+_ANCILLARY_SIZE = socket.CMSG_SPACE(_TIMESPEC.size) if hasattr(socket, 'CMSG_SPACE') else 0
+
+# Older stamps are treated as invalid, e.g. after the wall clock was stepped
+_MAX_AGE_NS = 60 * 10 ** 9
+
+
+def enable_rx_timestamps(sock):
+    """
+    Ask the kernel to timestamp packets received on ``sock``.
+
+    :return: True if kernel timestamps are enabled, False if only user-space timing is available
+    """
+    if not sys.platform.startswith('linux') or not _ANCILLARY_SIZE:
+        return False
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+    except OSError:
+        return False
+    return True
+
+
+def recv_into_timestamped(sock, buffer, kernel_timestamps=True):
+    """
+    Receive one datagram into ``buffer`` together with its receive time.
+
+    :param sock: socket, with ``enable_rx_timestamps`` applied if ``kernel_timestamps`` is set
+    :param buffer: writable buffer, e.g. a ``bytearray`` from ``common.buffers.BufferPool``
+    :param kernel_timestamps: read the kernel stamp from the ancillary data
+    :return: (number of bytes received, address, received_ns), received_ns on the
+             ``time.perf_counter_ns`` timeline
+    """
+    if not kernel_timestamps:
+        nbytes, addr = sock.recvfrom_into(buffer)
+        return nbytes, addr, time.perf_counter_ns()
+
+    nbytes, ancdata, _, addr = sock.recvmsg_into([buffer], _ANCILLARY_SIZE)
+    received_ns = time.perf_counter_ns()
+    wall_ns = time.time_ns()
+    for level, kind, payload in ancdata:
+        if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS and len(payload) >= _TIMESPEC.size:
+            seconds, nanoseconds = _TIMESPEC.unpack_from(payload)
+            # How long ago the kernel received the packet, moved onto the monotonic timeline
+            age = wall_ns - (seconds * 1_000_000_000 + nanoseconds)
+            if 0 <= age < _MAX_AGE_NS:
+                received_ns -= age
+            break
+    return nbytes, addr, received_ns
@@ -0,0 +1,25 @@
+"""
+Transports that create the sockets the probing tools send and receive on.
+
+``RawSocketTransport`` opens real sockets (raw ICMP needs root).
+``common.simnet.SimulatedNetwork`` provides the same two methods in process,
+so ping and traceroute can be exercised and benchmarked without privileges
+or network access.
+
+A transport has ``icmp_socket()`` and ``udp_socket()``. The objects they return
+support the subset of the socket API the tools use: ``sendto``, ``recvfrom``,
+``recvfrom_into``, ``recvmsg_into``, ``setsockopt``, ``settimeout``,
+``setblocking``, ``bind``, ``getsockname``, ``fileno`` and ``close``.
+"""
+
+import socket
+
+
+class RawSocketTransport:
+    """The real network."""
+
+    def icmp_socket(self):
+        return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+
+    def udp_socket(self):
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
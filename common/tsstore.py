@@ -0,0 +1,302 @@
+"""
+Append-only, column-oriented store for RTT samples.
+
+A store is a directory with one file per column, each an array of
+fixed-width little-endian values:
+
+    timestamp.i64   receive time, nanoseconds since the epoch
+    target.u32      target id, the line number in targets.txt
+    seq.u32         probe sequence number
+    rtt.f32         RTT in milliseconds, NaN for a lost probe
+
+Row ``i`` is the ``i``-th value of every column. Appends are buffered and
+written in batches; reads memory-map the column files, so range scans and
+aggregates over months of samples touch only the columns they need and no
+text is parsed. Timestamps are kept non-decreasing, which lets range scans
+binary-search the timestamp column. numpy is used for aggregates when it is
+installed; it is imported on the first aggregate, so opening a store to append
+to it stays cheap.
+"""
+
+import array
+import bisect
+import math
+import mmap
+import os
+import sys
+import threading
+import time
+
+# numpy, imported by the first aggregate; False until then, None if it is not installed
+_np = False
+
+
+def _numpy():
+    global _np
+    if _np is False:
+        try:
+            import numpy as _np
+        except ImportError:  # pragma: no cover - numpy is optional
+            _np = None
+    return _np
+
+
+# column name -> (file name, array typecode)
+COLUMNS = {
+    'timestamp': ('timestamp.i64', 'q'),
+    'target': ('target.u32', 'I'),
+    'seq': ('seq.u32', 'I'),
+    'rtt': ('rtt.f32', 'f'),
+}
+TARGETS_FILE = 'targets.txt'
+
+
+class _MappedColumns:
+    """Read-only memory maps of the column files, released by ``close``."""
+
+    def __init__(self, path, rows):
+        self.rows = rows
+        self._files = []
+        self._maps = []
+        self.views = {}
+        for name, (filename, typecode) in COLUMNS.items():
+            if rows == 0:
+                self.views[name] = memoryview(array.array(typecode))
+                continue
+            handle = open(os.path.join(path, filename), 'rb')
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            self._files.append(handle)
+            self._maps.append(mapped)
+            width = array.array(typecode).itemsize
+            self.views[name] = memoryview(mapped)[:rows * width].cast(typecode)
+
+    def close(self):
+        for view in self.views.values():
+            view.release()
+        for mapped in self._maps:
+            mapped.close()
+        for handle in self._files:
+            handle.close()
+
+
+class TimeSeriesStore:
+    """
+    RTT history of many targets in one directory. ``append`` may be called
+    from several threads; queries see everything appended so far.
+    """
+
+    def __init__(self, path, batch_size=4096, flush_interval=1.0):
+        """
+        :param path: directory of the store, created if missing
+        :param batch_size: number of buffered rows that triggers a write
+        :param flush_interval: seconds after which buffered rows are written at the next append
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        os.makedirs(path, exist_ok=True)
+
+        self._targets = []
+        self._target_ids = {}
+        targets_path = os.path.join(path, TARGETS_FILE)
+        if os.path.exists(targets_path):
+            with open(targets_path, encoding='utf-8') as handle:
+                for line in handle:
+                    self._add_target(line.rstrip('\n'))
+        self._targets_file = open(targets_path, 'a', encoding='utf-8')
+
+        # A crash can leave the columns with different lengths; keep only complete rows
+        self._rows = min(self._column_rows(name) for name in COLUMNS)
+        self._files = {}
+        for name, (filename, typecode) in COLUMNS.items():
+            handle = open(os.path.join(path, filename), 'ab')
+            handle.truncate(self._rows * array.array(typecode).itemsize)
+            self._files[name] = handle
+
+        self._last_timestamp = 0
+        if self._rows:
+            columns = _MappedColumns(path, self._rows)
+            self._last_timestamp = columns.views['timestamp'][-1]
+            columns.close()
+
+        self._buffers = {name: array.array(typecode) for name, (_, typecode) in COLUMNS.items()}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _column_rows(self, name):
+        filename, typecode = COLUMNS[name]
+        try:
+            size = os.path.getsize(os.path.join(self.path, filename))
+        except OSError:
+            return 0
+        return size // array.array(typecode).itemsize
+
+    def _add_target(self, name):
+        self._target_ids[name] = len(self._targets)
+        self._targets.append(name)
+
+    def target_id(self, name):
+        """
+        :return: the id of target ``name``, registering it on first use
+        """
+        target = self._target_ids.get(name)
+        if target is None:
+            with self._lock:
+                target = self._target_ids.get(name)
+                if target is None:
+                    self._add_target(name)
+                    self._targets_file.write(name + '\n')
+                    self._targets_file.flush()
+                    target = self._target_ids[name]
+        return target
+
+    @property
+    def targets(self):
+        return list(self._targets)
+
+    def append(self, target, seq, rtt_ms, timestamp_ns=None):
+        """
+        Add one probe result.
+
+        :param target: target name
+        :param seq: probe sequence number, None for 0
+        :param rtt_ms: RTT in milliseconds, None for a lost probe
+        :param timestamp_ns: receive time, now if omitted
+        """
+        target = self.target_id(target)
+        timestamp = time.time_ns() if timestamp_ns is None else timestamp_ns
+        with self._lock:
+            timestamp = max(timestamp, self._last_timestamp)
+            self._last_timestamp = timestamp
+            self._buffers['timestamp'].append(timestamp)
+            self._buffers['target'].append(target)
+            self._buffers['seq'].append(seq or 0)
+            self._buffers['rtt'].append(math.nan if rtt_ms is None else rtt_ms)
+            if (len(self._buffers['timestamp']) >= self.batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        buffered = len(self._buffers['timestamp'])
+        if not buffered:
+            return
+        for name, values in self._buffers.items():
+            if sys.byteorder == 'big':
+                values.byteswap()
+            self._files[name].write(values.tobytes())
+            self._files[name].flush()
+            del values[:]
+        self._rows += buffered
+
+    def __len__(self):
+        with self._lock:
+            return self._rows + len(self._buffers['timestamp'])
+
+    def _map(self):
+        self.flush()
+        return _MappedColumns(self.path, self._rows)
+
+    @staticmethod
+    def _bounds(timestamps, start_ns, end_ns):
+        low = 0 if start_ns is None else bisect.bisect_left(timestamps, start_ns)
+        high = len(timestamps) if end_ns is None else bisect.bisect_left(timestamps, end_ns)
+        return low, max(low, high)
+
+    def scan(self, start_ns=None, end_ns=None, target=None):
+        """
+        Iterate over the samples received in [start_ns, end_ns).
+
+        :param target: only samples of this target name
+        :return: iterator of (timestamp_ns, target name, seq, RTT in ms or None for a loss)
+        """
+        target_id = self._target_ids.get(target) if target is not None else None
+        if target is not None and target_id is None:
+            return
+        columns = self._map()
+        try:
+            views = columns.views
+            low, high = self._bounds(views['timestamp'], start_ns, end_ns)
+            for row in range(low, high):
+                row_target = views['target'][row]
+                if target_id is not None and row_target != target_id:
+                    continue
+                rtt = views['rtt'][row]
+                yield (views['timestamp'][row], self._targets[row_target], views['seq'][row],
+                       None if rtt != rtt else rtt)
+        finally:
+            columns.close()
+
+    def aggregate(self, start_ns=None, end_ns=None):
+        """
+        Per-target statistics of the samples received in [start_ns, end_ns).
+
+        :return: {target name: {'sent', 'received', 'loss_pct', 'min_ms', 'avg_ms', 'max_ms'}}
+        """
+        columns = self._map()
+        try:
+            views = columns.views
+            low, high = self._bounds(views['timestamp'], start_ns, end_ns)
+            if _numpy() is not None:
+                totals = self._aggregate_numpy(views, low, high)
+            else:
+                totals = self._aggregate_python(views, low, high)
+        finally:
+            columns.close()
+
+        result = {}
+        for target, (sent, received, total, low_rtt, high_rtt) in totals.items():
+            result[self._targets[target]] = {
+                'sent': sent,
+                'received': received,
+                'loss_pct': (sent - received) / sent * 100,
+                'min_ms': low_rtt if received else None,
+                'avg_ms': total / received if received else None,
+                'max_ms': high_rtt if received else None,
+            }
+        return result
+
+    @staticmethod
+    def _aggregate_numpy(views, low, high):
+        np = _numpy()
+        targets = np.asarray(views['target'][low:high], dtype=np.int64)
+        rtts = np.asarray(views['rtt'][low:high], dtype=np.float64)
+        totals = {}
+        if not len(targets):
+            return totals
+        count = int(targets.max()) + 1
+        answered = ~np.isnan(rtts)
+        sent = np.bincount(targets, minlength=count)
+        received = np.bincount(targets[answered], minlength=count)
+        total = np.bincount(targets[answered], weights=rtts[answered], minlength=count)
+        low_rtt = np.full(count, np.inf)
+        high_rtt = np.full(count, -np.inf)
+        np.minimum.at(low_rtt, targets[answered], rtts[answered])
+        np.maximum.at(high_rtt, targets[answered], rtts[answered])
+        for target in np.nonzero(sent)[0]:
+            totals[int(target)] = (int(sent[target]), int(received[target]), float(total[target]),
+                                   float(low_rtt[target]), float(high_rtt[target]))
+        return totals
+
+    @staticmethod
+    def _aggregate_python(views, low, high):
+        totals = {}
+        target_view, rtt_view = views['target'], views['rtt']
+        for row in range(low, high):
+            target, rtt = target_view[row], rtt_view[row]
+            sent, received, total, low_rtt, high_rtt = totals.get(target, (0, 0, 0.0, math.inf, -math.inf))
+            if rtt == rtt:
+                totals[target] = (sent + 1, received + 1, total + rtt, min(low_rtt, rtt), max(high_rtt, rtt))
+            else:
+                totals[target] = (sent + 1, received, total, low_rtt, high_rtt)
+        return totals
+
+    def close(self):
+        self.flush()
+        for handle in self._files.values():
+            handle.close()
+        self._targets_file.close()
@@ -0,0 +1,56 @@
+import csv
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.hoplog import CsvWriter
+
+
+def rows(path):
+    with open(path, newline='', encoding='utf-8') as file:
+        return list(csv.reader(file))
+
+
+class CsvWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'hops.csv')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_appending_keeps_a_wide_enough_layout(self):
+        CsvWriter(self.path, rtt_columns=3).close()
+        writer = CsvWriter(self.path, rtt_columns=2)
+        writer.write('10.0.0.1', 1, '172.16.1.1', [1.0, 2.0])
+        writer.close()
+        header, row = rows(self.path)
+        self.assertEqual(len(header), 7)
+        self.assertEqual(row[4:], ['1.000', '2.000', ''])
+
+    def test_more_rtts_than_the_file_has_columns_start_a_new_file(self):
+        writer = CsvWriter(self.path, backup_count=0, rtt_columns=2)
+        writer.write('10.0.0.1', 1, '172.16.1.1', [1.0, 2.0])
+        writer.write('10.0.0.1', 2, '172.16.2.1', [1.0, 2.0, 3.0])
+        writer.close()
+        self.assertEqual(len(rows(self.path + '.1')), 2)
+        header, row = rows(self.path)
+        self.assertEqual(header[-1], 'rtt_3_ms')
+        self.assertEqual(row[4:], ['1.000', '2.000', '3.000'])
+
+    def test_appending_more_columns_than_the_file_has_starts_a_new_file(self):
+        writer = CsvWriter(self.path, rtt_columns=2)
+        writer.write('10.0.0.1', 1, '172.16.1.1', [1.0])
+        writer.close()
+        writer = CsvWriter(self.path, rtt_columns=4)
+        writer.write('10.0.0.1', 1, '172.16.1.1', [1.0, 2.0, 3.0, 4.0])
+        writer.close()
+        self.assertEqual(rows(self.path + '.1')[1][4:], ['1.000', ''])
+        self.assertEqual(rows(self.path)[1][4:], ['1.000', '2.000', '3.000', '4.000'])
+
+
+if __name__ == '__main__':
+    unittest.main()
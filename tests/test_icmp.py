@@ -0,0 +1,34 @@
+import os
+import random
+import struct
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.checksum import calculate_checksum
+from common.icmp import EchoRequestTemplate
+
+
+class EchoRequestTemplateTest(unittest.TestCase):
+    def test_checksum_matches_a_full_computation(self):
+        rng = random.Random(0)
+        for _ in range(2000):
+            payload = bytes(rng.getrandbits(8) for _ in range(rng.randrange(9)))
+            template = EchoRequestTemplate(rng.getrandbits(16), payload)
+            for _ in range(3):
+                sequence = rng.choice([0, 0xFFFF, rng.getrandbits(16)])
+                timestamp = rng.choice([0, 2 ** 64 - 1, rng.getrandbits(64)])
+                packet = bytearray(template.build(sequence, timestamp))
+                stored, = struct.unpack_from('!H', packet, 2)
+                packet[2:4] = bytes(2)
+                self.assertEqual(stored, calculate_checksum(packet))
+
+    def test_fields(self):
+        packet = EchoRequestTemplate(0x1234, b'Ping').build(7, 123456789)
+        self.assertEqual(struct.unpack_from('!BBxxHHQ', packet), (8, 0, 0x1234, 7, 123456789))
+        self.assertEqual(packet[16:], b'Ping')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,235 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'Lab1'))
+
+import ping
+from common.simnet import SimulatedNetwork
+
+try:
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.animation as animation
+    import matplotlib.pyplot as plt
+    import numpy as np
+except ImportError:  # matplotlib is only needed by the live plot
+    plt = None
+
+
+class ReplyMatchingTest(unittest.TestCase):
+    def setUp(self):
+        self.network = SimulatedNetwork(hops=2, hop_latency=0.001, seed=0)
+        ping.set_transport(self.network)
+        self.ping_socket = ping.get_ping_socket()
+
+    def tearDown(self):
+        ping.set_transport(ping.RawSocketTransport())
+        self.network.close()
+
+    def test_reply_to_another_hosts_probe_with_the_same_id_is_ignored(self):
+        template = ping.create_icmp_template(0x1234, "Ping")
+        probe = self.ping_socket.register(0x1234, 1, '10.1.0.1')
+        # Another process on the host probes a different destination with the same identifier and sequence
+        other = self.network.icmp_socket()
+        try:
+            other.sendto(template.build(1, time.perf_counter_ns()), ('10.2.0.1', 1))
+            self.assertFalse(probe.event.wait(0.1))
+
+            self.ping_socket.send(template.build(1, time.perf_counter_ns()), '10.1.0.1')
+            self.assertTrue(probe.event.wait(1))
+            self.assertEqual(probe.addr[0], '10.1.0.1')
+        finally:
+            other.close()
+            self.ping_socket.unregister(probe)
+
+    def test_error_reply_is_matched_by_the_quoted_destination(self):
+        template = ping.create_icmp_template(0x4321, "Ping")
+        probe = self.ping_socket.register(0x4321, 7, '10.1.0.1')
+        try:
+            self.ping_socket.sock.setsockopt(ping.socket.IPPROTO_IP, ping.socket.IP_TTL, 1)
+            self.ping_socket.send(template.build(7, time.perf_counter_ns()), '10.1.0.1')
+            self.assertTrue(probe.event.wait(1))
+        finally:
+            self.ping_socket.sock.setsockopt(ping.socket.IPPROTO_IP, ping.socket.IP_TTL, 64)
+            self.ping_socket.unregister(probe)
+
+    def test_identifiers_do_not_start_at_the_pid(self):
+        packet_ids = ping._packet_ids
+        try:
+            starts = set()
+            for _ in range(8):
+                ping._packet_ids = ping._new_packet_ids()
+                starts.add(ping.allocate_packet_id())
+        finally:
+            ping._packet_ids = packet_ids
+        self.assertGreater(len(starts), 1)
+        self.assertNotEqual(starts, {os.getpid() & 0xFFFF})
+
+
+class PingSessionTest(unittest.TestCase):
+    def tearDown(self):
+        ping.set_transport(ping.RawSocketTransport())
+        self.network.close()
+
+    def run_session(self, timeout, count=5, **options):
+        """Send ``count`` probes the way ping_pipelined does and collect the session's events."""
+        self.network = SimulatedNetwork(hops=2, hop_latency=0.001, seed=0, **options)
+        ping.set_transport(self.network)
+        ping_socket = ping.get_ping_socket()
+        session = ping.PingSession(ping.create_icmp_template(ping.allocate_packet_id(), "Ping"), timeout, '10.1.0.1')
+        ping_socket.register_session(session)
+        try:
+            for sequence in range(1, count + 1):
+                time_sent_ns = time.perf_counter_ns()
+                session.sent(sequence, time_sent_ns)
+                ping_socket.send(session.template.build(sequence, time_sent_ns), '10.1.0.1')
+            end = time.perf_counter() + 0.3
+            while time.perf_counter() < end:
+                session.expire(time.perf_counter_ns())
+                time.sleep(0.005)
+        finally:
+            ping_socket.unregister_session(session)
+        events = []
+        while not session.events.empty():
+            events.append(session.events.get()[0])
+        return session, events
+
+    def test_duplicates_are_counted_once_as_received(self):
+        session, events = self.run_session(timeout=1, duplicate=1.0)
+        self.assertEqual((session.transmitted, session.received, session.duplicates, session.late), (5, 5, 5, 0))
+        self.assertEqual(events.count('reply'), 5)
+        self.assertEqual(events.count('duplicate'), 5)
+
+    def test_replies_after_the_timeout_are_late(self):
+        session, events = self.run_session(timeout=0.02, reorder=1.0, reorder_delay=0.1)
+        self.assertEqual((session.transmitted, session.received, session.duplicates, session.late), (5, 0, 0, 5))
+        self.assertEqual(events.count('late'), 5)
+
+    def test_late_and_duplicate_replies_together(self):
+        session, events = self.run_session(timeout=0.02, count=40, reorder=0.5, reorder_delay=0.1, duplicate=0.5)
+        self.assertEqual(session.transmitted, 40)
+        self.assertEqual(session.received + session.late, 40)
+        self.assertGreater(session.late, 0)
+        self.assertGreater(session.received, 0)
+        self.assertGreater(session.duplicates, 0)
+        self.assertEqual(events.count('duplicate'), session.duplicates)
+
+
+# Runs ping.py --headless as a script on a simulated network, then reports the modules it imported on stderr
+HEADLESS_SCRIPT = '''
+import json, runpy, sys
+root, script = sys.argv[1:]
+sys.path[:0] = [root]
+import common.transport
+from common.simnet import SimulatedNetwork
+network = SimulatedNetwork(hops=2, hop_latency=0.001, seed=0)
+common.transport.RawSocketTransport = lambda: network
+sys.argv = [script, '--hosts', '10.1.0.1', '10.2.0.1', '--count', '3', '--interval', '0.01', '--headless']
+try:
+    runpy.run_path(script, run_name='__main__')
+except SystemExit:
+    pass
+sys.stderr.write(json.dumps(sorted(sys.modules)))
+'''
+
+
+class HeadlessTest(unittest.TestCase):
+    def test_headless_run_writes_jsonl_without_ui_modules(self):
+        with tempfile.TemporaryDirectory() as directory:
+            command = [sys.executable, '-c', HEADLESS_SCRIPT, ROOT, os.path.join(ROOT, 'Lab1', 'ping.py')]
+            result = subprocess.run(command, cwd=directory, capture_output=True, text=True, timeout=60)
+        modules = json.loads(result.stderr.strip().splitlines()[-1])
+        for name in ('matplotlib', 'colorama', 'numpy'):
+            self.assertNotIn(name, modules)
+
+        records = [json.loads(line) for line in result.stdout.splitlines()]
+        probes = [record for record in records if record['type'] == 'probe']
+        summaries = {record['host']: record for record in records if record['type'] == 'summary'}
+        self.assertEqual(len(probes), 6)
+        for record in probes:
+            self.assertEqual(set(record), {'type', 'time', 'host', 'seq', 'status', 'rtt_ms'})
+            self.assertEqual(record['status'], 'reply')
+            self.assertGreater(record['rtt_ms'], 0)
+        self.assertEqual(set(summaries), {'10.1.0.1', '10.2.0.1'})
+        for record in summaries.values():
+            self.assertEqual(set(record), {'type', 'time', 'host', 'sent', 'received', 'loss_pct', 'min_ms', 'avg_ms',
+                                           'max_ms', 'mdev_ms', 'jitter_ms', 'p50_ms', 'p90_ms', 'p99_ms'})
+            self.assertEqual((record['sent'], record['received'], record['loss_pct']), (3, 3, 0.0))
+
+
+class AsyncPingerBufferTest(unittest.TestCase):
+    def setUp(self):
+        self.network = SimulatedNetwork(hops=2, hop_latency=0.001, seed=0)
+        ping.set_transport(self.network)
+
+    def tearDown(self):
+        ping.set_transport(ping.RawSocketTransport())
+        self.network.close()
+
+    def test_a_burst_of_replies_does_not_grow_the_pool(self):
+        replies = []
+
+        async def run():
+            pinger = ping.AsyncPinger(concurrency=50)
+            try:
+                await asyncio.gather(*(pinger.ping_host(f'10.1.0.{i}', count=2, retries=0, interval=0,
+                                                        on_reply=lambda *reply: replies.append(reply),
+                                                        on_loss=lambda *loss: None)
+                                       for i in range(1, 201)))
+            finally:
+                pinger.close()
+            return pinger._buffers
+
+        buffers = asyncio.run(run())
+        self.assertEqual(len(replies), 400)
+        self.assertLessEqual(buffers.size, ping.RECV_BUFFER_SIZE)
+        self.assertEqual(buffers.allocated, 51)
+
+    def test_buffers_fit_a_long_payload(self):
+        self.assertGreaterEqual(ping.reply_buffer_size(bytes(4000)), 60 + 16 + 4000)
+
+
+@unittest.skipIf(plt is None, "matplotlib is not installed")
+class LivePlotTest(unittest.TestCase):
+    def setUp(self):
+        ping.rtt_data.clear()
+        self.figure, ax = plt.subplots()
+        self.plot = ping.LivePlot(ax)
+        self.animation = animation.FuncAnimation(self.figure, self.plot.update, init_func=self.plot.init,
+                                                 interval=1000, blit=True, cache_frame_data=False)
+        self.figure.canvas.draw()
+
+    def tearDown(self):
+        plt.close(self.figure)
+        ping.rtt_data.clear()
+
+    def frame(self):
+        self.animation._draw_next_frame(0, blit=True)
+        return np.asarray(self.figure.canvas.buffer_rgba()).copy()
+
+    def test_legend_of_a_new_host_survives_the_next_blitted_frame(self):
+        ping.record_rtt('10.0.0.1', 0.5, 1)
+        ping.record_rtt('10.0.0.1', 0.6, 2)
+        self.frame()
+        before = self.frame()
+        # A new host whose samples fit in the current axis limits
+        ping.record_rtt('10.0.0.2', 0.4, 1)
+        self.frame()
+        after = self.frame()
+
+        box = self.figure.axes[0].get_legend().get_window_extent()
+        height = before.shape[0]
+        region = (slice(int(height - box.y1), int(height - box.y0)), slice(int(box.x0), int(box.x1)))
+        self.assertTrue((before[region] != after[region]).any())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.resolver import Resolver
+
+
+class FakeResolver(Resolver):
+    """Resolver whose lookups come from ``answers`` instead of DNS, counting the calls and their threads."""
+
+    def __init__(self, answers, **options):
+        super().__init__(**options)
+        self.answers = answers
+        self.calls = []
+        self.threads = set()
+        self.release = threading.Event()
+        self.release.set()
+
+    def _lookup(self, name):
+        self.calls.append(name)
+        self.threads.add(threading.current_thread().name)
+        self.release.wait(5)
+        answer = self.answers.get(name)
+        if isinstance(answer, BaseException):
+            raise answer
+        if answer is None:
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        return answer
+
+    _forward = _reverse = _lookup
+
+
+class ResolverTest(unittest.TestCase):
+    def test_answers_are_cached(self):
+        resolver = FakeResolver({'example.com': '192.0.2.1'})
+        self.assertEqual(resolver.resolve('example.com'), '192.0.2.1')
+        self.assertEqual(resolver.resolve('example.com'), '192.0.2.1')
+        self.assertEqual(resolver.calls, ['example.com'])
+
+    def test_addresses_are_not_looked_up(self):
+        resolver = FakeResolver({})
+        self.assertEqual(resolver.resolve('192.0.2.7'), '192.0.2.7')
+        self.assertEqual(resolver.calls, [])
+
+    def test_failures_are_cached_for_the_negative_ttl(self):
+        resolver = FakeResolver({}, negative_ttl=0.1)
+        for _ in range(2):
+            with self.assertRaises(socket.gaierror):
+                resolver.resolve('missing.example')
+        self.assertEqual(len(resolver.calls), 1)
+        time.sleep(0.15)
+        with self.assertRaises(socket.gaierror):
+            resolver.resolve('missing.example')
+        self.assertEqual(len(resolver.calls), 2)
+
+    def test_answers_expire_after_the_ttl(self):
+        resolver = FakeResolver({'example.com': '192.0.2.1'}, ttl=0.1)
+        resolver.resolve('example.com')
+        resolver.answers['example.com'] = '192.0.2.2'
+        self.assertEqual(resolver.resolve('example.com'), '192.0.2.1')
+        time.sleep(0.15)
+        self.assertEqual(resolver.resolve('example.com'), '192.0.2.2')
+        self.assertEqual(len(resolver.calls), 2)
+
+    def test_errors_other_than_lookup_failures_are_not_cached(self):
+        resolver = FakeResolver({'example.com': ValueError('bug')})
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                resolver.resolve('example.com')
+        self.assertEqual(len(resolver.calls), 2)
+
+    def test_concurrent_requests_share_one_lookup_on_the_pool(self):
+        resolver = FakeResolver({'example.com': '192.0.2.1'})
+        resolver.release.clear()
+        futures = [resolver.resolve_async('example.com') for _ in range(5)]
+        self.assertTrue(all(future is futures[0] for future in futures))
+        # Nothing blocks the caller while the lookup waits
+        self.assertIsNone(resolver.reverse('192.0.2.1', timeout=0))
+        resolver.release.set()
+        self.assertEqual(futures[0].result(5), '192.0.2.1')
+        self.assertEqual(resolver.calls.count('example.com'), 1)
+        self.assertTrue(all(name.startswith('resolver') for name in resolver.threads))
+
+    def test_reverse_lookup(self):
+        resolver = FakeResolver({'192.0.2.1': 'host.example'})
+        self.assertEqual(resolver.reverse('192.0.2.1', timeout=5), 'host.example')
+        self.assertIsNone(resolver.reverse('192.0.2.9', timeout=5))
+
+    def test_least_recently_used_entries_are_dropped(self):
+        resolver = FakeResolver({'a': '192.0.2.1', 'b': '192.0.2.2', 'c': '192.0.2.3'}, max_entries=2)
+        resolver.resolve('a')
+        resolver.resolve('b')
+        resolver.resolve('a')
+        resolver.resolve('c')  # drops b, used less recently than a
+        resolver.resolve('a')
+        resolver.resolve('b')
+        self.assertEqual(resolver.calls, ['a', 'b', 'c', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
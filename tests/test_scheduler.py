@@ -0,0 +1,44 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.scheduler import ProbeScheduler
+
+MS = 1000000
+
+
+class ProbeSchedulerTest(unittest.TestCase):
+    def offsets(self, scheduler, destinations):
+        slots = [scheduler.reserve(destination) for destination in destinations]
+        return [(slot - slots[0]) / MS for slot in slots]
+
+    def test_global_slots_are_spaced_by_the_rate(self):
+        offsets = self.offsets(ProbeScheduler(rate=1000), 'ABCD')
+        for earlier, later in zip(offsets, offsets[1:]):
+            self.assertGreaterEqual(later - earlier, 1)
+        self.assertLess(offsets[-1], 5)
+
+    def test_held_back_destination_does_not_delay_others(self):
+        # A's second probe waits a second for its token; B and C must not wait behind it
+        a1, a2, b, c = self.offsets(ProbeScheduler(rate=1000, per_destination_rate=1), 'AABC')
+        self.assertGreaterEqual(a2, 1000)
+        self.assertLess(b, 3)
+        self.assertLess(c, 3)
+        self.assertGreaterEqual(abs(c - b), 1)
+
+    def test_slots_around_a_held_back_probe_keep_the_global_spacing(self):
+        scheduler = ProbeScheduler(rate=1000, per_destination_rate=1)
+        slots = sorted(scheduler.reserve(destination) for destination in ['A', 'A'] + [f'H{i}' for i in range(20)])
+        for earlier, later in zip(slots, slots[1:]):
+            self.assertGreaterEqual(later - earlier, MS)
+
+    def test_per_destination_burst(self):
+        a1, a2, a3 = self.offsets(ProbeScheduler(per_destination_rate=10, burst=2), 'AAA')
+        self.assertLess(a2, 5)
+        self.assertGreaterEqual(a3, 95)
+
+
+if __name__ == '__main__':
+    unittest.main()
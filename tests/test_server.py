@@ -0,0 +1,146 @@
+import importlib
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'Lab3'))
+
+CONFIG = """\
+[server]
+host = 127.0.0.1
+port = {port}
+backlog = 16
+worker_threads = 1
+queue_size = 1
+client_timeout = {client_timeout}
+
+[security]
+whitelist = 127.0.0.1
+blacklist =
+
+[rate_limit]
+max_requests = 1000
+window_seconds = 60
+"""
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def read_all(client):
+    response = b''
+    while True:
+        data = client.recv(4096)
+        if not data:
+            return response.decode()
+        response += data
+
+
+class AdmissionTest(unittest.TestCase):
+    """One worker and a queue of one: the third concurrent connection is turned away."""
+
+    CLIENT_TIMEOUT = 1.0
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.cwd = os.getcwd()
+        cls.port = free_port()
+        with open(os.path.join(cls.directory.name, 'config.ini'), 'w') as handle:
+            handle.write(CONFIG.format(port=cls.port, client_timeout=cls.CLIENT_TIMEOUT))
+        with open(os.path.join(cls.directory.name, 'index.html'), 'w') as handle:
+            handle.write('<html><body>index</body></html>')
+        # server.py reads config.ini and serves files from the working directory
+        os.chdir(cls.directory.name)
+        sys.modules.pop('server', None)
+        cls.server = importlib.import_module('server')
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+        sys.modules.pop('server', None)
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.server.is_running = True
+        self.server.request_times.clear()
+        self.thread = threading.Thread(target=self.server.start_server)
+        self.thread.start()
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.server.is_running = False
+        self.thread.join(5)
+
+    def connect(self):
+        deadline = time.monotonic() + 5
+        while True:
+            try:
+                client = socket.create_connection(('127.0.0.1', self.port), timeout=5)
+                break
+            except ConnectionRefusedError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.01)
+        self.clients.append(client)
+        return client
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def fill(self):
+        # The worker takes the first connection and waits for its request; the second one is queued
+        busy = self.connect()
+        self.wait_for(lambda: len(self.server.request_times['127.0.0.1']) == 1)
+        queued = self.connect()
+        self.wait_for(self.server.connection_queue.full)
+        return busy, queued
+
+    @staticmethod
+    def get(client, path='/'):
+        client.sendall(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n'.encode())
+        return read_all(client)
+
+    def test_config(self):
+        self.assertEqual(self.server.WORKER_THREADS, 1)
+        self.assertEqual(self.server.QUEUE_SIZE, 1)
+        self.assertEqual(self.server.CLIENT_TIMEOUT, self.CLIENT_TIMEOUT)
+        self.assertEqual(self.server.BACKLOG, 16)
+        self.assertEqual(self.server.connection_queue.maxsize, 1)
+
+    def test_full_queue_gets_503(self):
+        busy, queued = self.fill()
+
+        response = read_all(self.connect())
+        self.assertTrue(response.startswith('HTTP/1.1 503 Service Unavailable\r\n'), response)
+        self.assertIn('\r\nRetry-After: 1\r\n', response)
+
+        # The admitted connections are still served, in order
+        self.assertTrue(self.get(busy).startswith('HTTP/1.1 200 OK\r\n'))
+        self.assertTrue(self.get(queued).startswith('HTTP/1.1 200 OK\r\n'))
+
+    def test_idle_client_frees_the_worker(self):
+        busy, queued = self.fill()
+        started = time.monotonic()
+
+        # The idle client is dropped after client_timeout and the queued one gets the worker
+        read_all(busy)
+        self.assertGreaterEqual(time.monotonic() - started, self.CLIENT_TIMEOUT * 0.9)
+        self.assertTrue(self.get(queued).startswith('HTTP/1.1 200 OK\r\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
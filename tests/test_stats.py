@@ -0,0 +1,80 @@
+import os
+import random
+import statistics
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.stats import P2Quantile, RttStats
+
+
+def exact_quantile(samples, p):
+    """Quantile with linear interpolation between order statistics, the P-square target."""
+    return statistics.quantiles(samples, n=1000, method='inclusive')[round(p * 1000) - 1]
+
+
+class P2QuantileTest(unittest.TestCase):
+    def test_estimates_follow_the_exact_quantiles(self):
+        rng = random.Random(0)
+        samples = [rng.lognormvariate(3, 0.5) for _ in range(20000)]
+        for p in (0.5, 0.9, 0.99):
+            estimator = P2Quantile(p)
+            for x in samples:
+                estimator.add(x)
+            exact = exact_quantile(samples, p)
+            self.assertAlmostEqual(estimator.value(), exact, delta=0.02 * exact)
+
+    def test_fewer_than_five_samples_are_exact(self):
+        rng = random.Random(2)
+        for p in (0.5, 0.9, 0.99):
+            estimator = P2Quantile(p)
+            self.assertIsNone(estimator.value())
+            samples = []
+            for _ in range(4):
+                samples.append(rng.uniform(1, 100))
+                estimator.add(samples[-1])
+                exact = exact_quantile(samples, p) if len(samples) > 1 else samples[0]
+                self.assertAlmostEqual(estimator.value(), exact)
+
+    def test_five_samples_give_the_median(self):
+        estimator = P2Quantile(0.5)
+        for x in (5.0, 4.0, 1.0, 3.0, 2.0):
+            estimator.add(x)
+        self.assertEqual(estimator.value(), 3.0)
+
+
+class RttStatsTest(unittest.TestCase):
+    def test_running_values_match_the_statistics_module(self):
+        rng = random.Random(1)
+        samples = [rng.uniform(10, 50) for _ in range(1000)]
+        stats = RttStats(window=100)
+        for rtt in samples:
+            stats.add(rtt)
+        stats.add_loss()
+
+        self.assertEqual((stats.sent, stats.received, stats.lost), (1001, 1000, 1))
+        self.assertAlmostEqual(stats.loss, 100 / 1001)
+        self.assertEqual((stats.min, stats.max, stats.last), (min(samples), max(samples), samples[-1]))
+        self.assertAlmostEqual(stats.mean, statistics.fmean(samples), places=9)
+        self.assertAlmostEqual(stats.mdev, statistics.pstdev(samples), places=9)
+        self.assertAlmostEqual(stats.percentile(0.5), statistics.median(samples), delta=1)
+
+        numbers, rtts = stats.snapshot()
+        self.assertEqual(rtts, samples[-100:])
+        self.assertEqual(numbers, list(range(901, 1001)))
+
+    def test_few_samples(self):
+        stats = RttStats()
+        self.assertEqual((stats.mdev, stats.loss), (0.0, 0.0))
+        self.assertIsNone(stats.percentile(0.9))
+        for rtt in (2.0, 4.0):
+            stats.add(rtt)
+        self.assertEqual(stats.mean, 3.0)
+        self.assertEqual(stats.mdev, statistics.pstdev([2.0, 4.0]))
+        self.assertEqual(stats.percentile(0.5), 3.0)
+        self.assertEqual(stats.jitter, 2.0 / 16)
+
+
+if __name__ == '__main__':
+    unittest.main()
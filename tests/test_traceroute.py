@@ -0,0 +1,221 @@
+import contextlib
+import io
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'Lab2'))
+
+import traceroute
+from common.simnet import SimulatedNetwork
+
+DEST = '10.9.9.9'
+
+
+def path(length, **changed):
+    """Hops of a path ``length`` hops long; ``changed`` maps 'h<ttl>' to another address."""
+    return [(ttl, changed.get(f'h{ttl}', DEST if ttl == length else f'172.16.{ttl}.1'), [1.0])
+            for ttl in range(1, length + 1)]
+
+
+class ContinuousTraceTest(unittest.TestCase):
+    def test_probes_up_to_the_destination_once_found(self):
+        trace = traceroute.ContinuousTrace(DEST, max_hops=30)
+        self.assertEqual(trace.horizon(), 30)
+        trace.update(path(4))
+        self.assertEqual(trace.horizon(), 4)
+
+    def test_longer_path_is_found_again(self):
+        trace = traceroute.ContinuousTrace(DEST, max_hops=30)
+        trace.update(path(4))
+        # The destination moved to TTL 6: the round stops at the old TTL 4 where a router now answers
+        trace.update(path(6)[:4])
+        self.assertEqual(trace.horizon(), 30)
+        changes = trace.update(path(6))
+        self.assertIn('destination now 6 hops away (was 4)', changes)
+        self.assertEqual(trace.horizon(), 6)
+
+    def test_shorter_path(self):
+        trace = traceroute.ContinuousTrace(DEST, max_hops=30)
+        trace.update(path(6))
+        changes = trace.update(path(3))
+        self.assertIn('destination now 3 hops away (was 6)', changes)
+        self.assertEqual(sorted(trace.hops), [1, 2, 3])
+
+    def test_lost_destination_probe_is_not_a_path_change(self):
+        trace = traceroute.ContinuousTrace(DEST, max_hops=30)
+        trace.update(path(4))
+        self.assertEqual(trace.update(path(4)[:3] + [(4, None, [])]), [])
+        self.assertEqual(trace.horizon(), 4)
+
+
+class DoubletreeTraceTest(unittest.TestCase):
+    def setUp(self):
+        # The router at TTL 4 never answers
+        self.network = SimulatedNetwork(hops=5, hop_latency=0.001, silent=[4], seed=0)
+        traceroute.transport = self.network
+
+    def tearDown(self):
+        traceroute.transport = traceroute.RawSocketTransport()
+        self.network.close()
+
+    def test_silent_hop_costs_less_than_the_timeout(self):
+        hop_cache = traceroute.HopCache()
+        traceroute.doubletree_trace('10.1.0.1', hop_cache, start_ttl=1, max_hops=5)
+
+        start = time.perf_counter()
+        path, probes = traceroute.doubletree_trace('10.2.0.1', hop_cache, start_ttl=5, max_hops=5)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual([addr for ttl, addr, rtt_list in path],
+                         ['172.16.1.1', '172.16.2.1', '172.16.3.1', None, '10.2.0.1'])
+        self.assertEqual(probes, 9)
+
+
+class TraceHopsTest(unittest.TestCase):
+    def setUp(self):
+        self.network = SimulatedNetwork(hops=4, hop_latency=0.001, seed=0)
+        traceroute.transport = self.network
+
+    def tearDown(self):
+        traceroute.transport = traceroute.RawSocketTransport()
+        self.network.close()
+
+    def test_rounds_after_the_destination_answered_stop_at_it(self):
+        start = time.perf_counter()
+        hops = list(traceroute.trace_hops('10.1.0.1', max_hops=30, timeout=1, retries=3))
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual([hop.ttl for hop in hops], [1, 2, 3, 4])
+        self.assertEqual(hops[-1].address, '10.1.0.1')
+        # The first round leaves before any answer; the other two only go up to the destination
+        self.assertEqual(self.network.sent, 30 + 2 * 4)
+
+    def test_unsent_probes_above_the_destination_are_cancelled(self):
+        # Paced probes: the destination answers while the first round is still being sent
+        hops = list(traceroute.trace_hops('10.1.0.1', max_hops=30, timeout=1, retries=3, send_interval=0.005))
+        self.assertEqual(hops[-1].address, '10.1.0.1')
+        self.assertLessEqual(self.network.sent, 3 * 4 + 3)
+
+
+class ReroutedNetwork(SimulatedNetwork):
+    """Simulated network whose routers from TTL ``rerouted_from`` on are replaced by other ones."""
+
+    rerouted_from = None
+
+    def hop_address(self, destination, ttl):
+        if ttl < self.hops and self.rerouted_from is not None and ttl >= self.rerouted_from:
+            return f'172.17.{ttl}.1'
+        return super().hop_address(destination, ttl)
+
+
+class IncrementalTraceTest(unittest.TestCase):
+    def setUp(self):
+        self.network = ReroutedNetwork(hops=8, hop_latency=0.001, seed=0)
+        traceroute.transport = self.network
+
+    def tearDown(self):
+        traceroute.transport = traceroute.RawSocketTransport()
+        self.network.close()
+
+    def trace(self, previous):
+        return traceroute.incremental_trace('10.1.0.1', previous, max_hops=30, timeout=0.2, retries=3)
+
+    def test_unchanged_path_is_only_sampled(self):
+        path, probes, segment = self.trace(None)
+        # The first round probes every TTL, the other two only up to the destination
+        self.assertEqual((probes, segment), (30 + 2 * 8, (1, 8)))
+        path, probes, segment = self.trace({ttl: addr for ttl, addr, rtt_list in path})
+        self.assertIsNone(segment)
+        self.assertEqual(probes, 5)
+
+    def test_path_changed_partway_is_traced_again_from_the_divergence(self):
+        path, _, _ = self.trace(None)
+        previous = {ttl: addr for ttl, addr, rtt_list in path}
+        self.network.rerouted_from = 4
+
+        path, probes, segment = self.trace(previous)
+        # TTLs 1, 3, 5, 7 and 8 are sampled: 5 and 7 changed, 3 and 8 did not
+        self.assertEqual(segment, (4, 7))
+        self.assertEqual([addr for ttl, addr, rtt_list in path],
+                         ['172.16.1.1', '172.16.2.1', '172.16.3.1', '172.17.4.1', '172.17.5.1', '172.17.6.1',
+                          '172.17.7.1', '10.1.0.1'])
+        self.assertTrue(all(rtt_list for ttl, addr, rtt_list in path[3:7]))
+        self.assertEqual(probes, 5 + 4 * 3)
+
+    def test_longer_path_is_traced_to_the_new_destination(self):
+        path, _, _ = self.trace(None)
+        previous = {ttl: addr for ttl, addr, rtt_list in path}
+        self.network.hops = 10
+        self.network.rerouted_from = 6
+
+        path, probes, segment = self.trace(previous)
+        self.assertEqual(segment[0], 6)
+        self.assertEqual([ttl for ttl, addr, rtt_list in path], list(range(1, 11)))
+        self.assertEqual(path[-1][1], '10.1.0.1')
+        self.assertEqual(path[5][1], '172.17.6.1')
+
+
+class TraceroutePathTest(unittest.TestCase):
+    def setUp(self):
+        self.network = SimulatedNetwork(hops=4, hop_latency=0.001, silent=[2], seed=0)
+        traceroute.transport = self.network
+
+    def tearDown(self):
+        traceroute.transport = traceroute.RawSocketTransport()
+        self.network.close()
+
+    def test_both_modes_return_every_hop(self):
+        paths = []
+        for async_mode in (True, False):
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                results = traceroute.traceroute('10.1.0.1', max_hops=6, timeout=0.2, retries=2,
+                                                async_mode=async_mode, plot=False)
+            paths.append([(ttl, addr) for ttl, addr, rtt_list in results])
+        self.assertEqual(paths[0], [(1, '172.16.1.1'), (2, None), (3, '172.16.3.1'), (4, '10.1.0.1')])
+        self.assertEqual(paths[0], paths[1])
+
+    def test_send_failure_is_logged_not_printed(self):
+        probe_socket = traceroute.ProbeSocket('10.1.0.1')
+        try:
+            with mock.patch.object(probe_socket.send_sock, 'sendto', side_effect=OSError('no buffer space')), \
+                    contextlib.redirect_stdout(io.StringIO()) as stdout, \
+                    self.assertLogs('traceroute', 'WARNING'):
+                self.assertIsNone(probe_socket.send(1))
+            self.assertEqual(stdout.getvalue(), '')
+        finally:
+            probe_socket.close()
+
+
+class ProbeSocketTest(unittest.TestCase):
+    def setUp(self):
+        self.network = SimulatedNetwork(hops=3, hop_latency=0.001, silent=[1], seed=0)
+        traceroute.transport = self.network
+
+    def tearDown(self):
+        traceroute.transport = traceroute.RawSocketTransport()
+        self.network.close()
+
+    def test_echo_reply_from_another_destination_is_ignored(self):
+        mine = traceroute.ProbeSocket('10.1.0.1')
+        other = traceroute.ProbeSocket('10.2.0.1')
+        try:
+            # Another trace uses the same identifier; probe 0 of this trace is still waiting at a silent hop
+            mine.packet_id = other.packet_id
+            self.assertEqual(mine.send(1), 0)
+            self.assertEqual(other.send(5), 0)
+            self.assertIsNone(mine.receive(time.perf_counter_ns() + 200000000))
+            self.assertEqual(other.receive(time.perf_counter_ns() + 200000000)[1], '10.2.0.1')
+        finally:
+            mine.close()
+            other.close()
+
+    def test_identifiers_do_not_start_at_the_pid(self):
+        starts = {next(traceroute._new_trace_ids()) for _ in range(8)}
+        self.assertGreater(len(starts), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import math
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.tsstore import TimeSeriesStore
+
+SECOND = 1000000000
+
+
+class TimeSeriesStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'store')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def fill(self, rows=10):
+        """Rows i at second i: target a on even seconds, b on odd ones, every third one lost."""
+        store = TimeSeriesStore(self.path, batch_size=4)
+        for i in range(rows):
+            store.append('a' if i % 2 == 0 else 'b', i + 1, None if i % 3 == 2 else 10.0 + i, i * SECOND)
+        return store
+
+    def test_scan(self):
+        store = self.fill()
+        try:
+            self.assertEqual(len(store), 10)
+            rows = list(store.scan())
+            self.assertEqual(rows[0], (0, 'a', 1, 10.0))
+            self.assertEqual(rows[2], (2 * SECOND, 'a', 3, None))
+            self.assertEqual([row[0] for row in store.scan(3 * SECOND, 6 * SECOND)],
+                             [3 * SECOND, 4 * SECOND, 5 * SECOND])
+            self.assertEqual([row[2] for row in store.scan(target='b')], [2, 4, 6, 8, 10])
+            self.assertEqual(list(store.scan(target='c')), [])
+        finally:
+            store.close()
+
+    def test_timestamps_never_go_back(self):
+        store = TimeSeriesStore(self.path)
+        try:
+            store.append('a', 1, 1.0, 5 * SECOND)
+            store.append('a', 2, 1.0, 4 * SECOND)
+            self.assertEqual([row[0] for row in store.scan()], [5 * SECOND, 5 * SECOND])
+        finally:
+            store.close()
+
+    def test_aggregate(self):
+        store = self.fill()
+        try:
+            result = store.aggregate()
+            self.assertAlmostEqual(result['a'].pop('avg_ms'), 40 / 3, places=5)
+            self.assertEqual(result, {
+                'a': {'sent': 5, 'received': 3, 'loss_pct': 40.0, 'min_ms': 10.0, 'max_ms': 16.0},
+                'b': {'sent': 5, 'received': 4, 'loss_pct': 20.0, 'min_ms': 11.0, 'avg_ms': 15.0, 'max_ms': 19.0},
+            })
+            # The pure Python path gives the same totals as numpy
+            columns = store._map()
+            try:
+                python = store._aggregate_python(columns.views, 0, columns.rows)
+                self.assertEqual(python, store._aggregate_numpy(columns.views, 0, columns.rows))
+            finally:
+                columns.close()
+            self.assertEqual(python, {0: (5, 3, 40.0, 10.0, 16.0), 1: (5, 4, 60.0, 11.0, 19.0)})
+            self.assertEqual(store.aggregate(4 * SECOND, 5 * SECOND)['a']['sent'], 1)
+            self.assertEqual(store.aggregate(20 * SECOND), {})
+        finally:
+            store.close()
+
+    def test_reopen_keeps_rows_and_targets(self):
+        self.fill().close()
+        store = TimeSeriesStore(self.path)
+        try:
+            self.assertEqual(len(store), 10)
+            self.assertEqual(store.targets, ['a', 'b'])
+            store.append('b', 11, 1.0, SECOND)  # clamped to the last stored timestamp
+            self.assertEqual(list(store.scan())[-1], (9 * SECOND, 'b', 11, 1.0))
+        finally:
+            store.close()
+
+    def test_record_cut_in_the_middle_is_dropped(self):
+        self.fill().close()
+        # A crash wrote the last RTT only partly and the last two sequence numbers not at all
+        with open(os.path.join(self.path, 'rtt.f32'), 'r+b') as handle:
+            handle.truncate(9 * 4 + 2)
+        with open(os.path.join(self.path, 'seq.u32'), 'r+b') as handle:
+            handle.truncate(8 * 4)
+
+        store = TimeSeriesStore(self.path)
+        try:
+            self.assertEqual(len(store), 8)
+            store.append('a', 99, 2.5, 20 * SECOND)
+            rows = list(store.scan())
+            self.assertEqual(len(rows), 9)
+            self.assertEqual(rows[7], (7 * SECOND, 'b', 8, 17.0))
+            self.assertEqual(rows[8], (20 * SECOND, 'a', 99, 2.5))
+        finally:
+            store.close()
+        for filename in ('timestamp.i64', 'target.u32', 'seq.u32', 'rtt.f32'):
+            width = 8 if filename.endswith('i64') else 4
+            self.assertEqual(os.path.getsize(os.path.join(self.path, filename)), 9 * width)
+
+    def test_lost_probes_are_nan_on_disk(self):
+        store = TimeSeriesStore(self.path)
+        try:
+            store.append('a', 1, None, SECOND)
+            columns = store._map()
+            try:
+                self.assertTrue(math.isnan(columns.views['rtt'][0]))
+            finally:
+                columns.close()
+        finally:
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()